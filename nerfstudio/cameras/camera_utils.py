@@ -17,11 +17,13 @@ Camera transformation helper code.
 """
 
 import math
-from typing import List, Literal, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Literal, Optional, Tuple, Union
 
 import numpy as np
 import torch
-from jaxtyping import Float
+from jaxtyping import Float, Int
 from numpy.typing import NDArray
 from torch import Tensor
 
@@ -847,3 +849,241 @@ def fisheye624_unproject(coords: torch.Tensor, distortion_params: torch.Tensor)
     dirs[..., 1] = -dirs[..., 1]
     dirs[..., 2] = -dirs[..., 2]
     return dirs
+
+
+def get_angular_error(rays_a: Float[Tensor, "*batch 2"], rays_b: Float[Tensor, "*batch 2"]) -> Float[Tensor, "*batch"]:
+    """Returns the angle in radians between rays given by their (x, y) coordinates on the z = 1 plane."""
+    rays_a = torch.cat([rays_a, torch.ones_like(rays_a[..., :1])], dim=-1)
+    rays_b = torch.cat([rays_b, torch.ones_like(rays_b[..., :1])], dim=-1)
+    cross = torch.linalg.norm(torch.linalg.cross(rays_a, rays_b, dim=-1), dim=-1)
+    return torch.atan2(cross, torch.sum(rays_a * rays_b, dim=-1))
+
+
+class UndistortionMap:
+    """An undistortion function tabulated on a regular grid of coordinates and bilinearly interpolated.
+
+    The function maps coordinates to rays given by their (x, y) coordinates on the z = 1 plane, e.g. normalized
+    distorted coordinates to undistorted ones. Coordinates outside of the grid are undistorted with the function.
+
+    Args:
+        undistort: The undistortion function, mapping coordinates of shape (N, 2) to rays of shape (N, 2).
+        lower: Smallest (x, y) coordinates of the grid.
+        upper: Largest (x, y) coordinates of the grid.
+        spacing: Largest spacing of the grid along x and y.
+    """
+
+    def __init__(
+        self,
+        undistort: Callable[[Tensor], Tensor],
+        lower: Tuple[float, float],
+        upper: Tuple[float, float],
+        spacing: Tuple[float, float],
+        device: Union[torch.device, str] = "cpu",
+    ):
+        self.undistort = undistort
+        self.num_points = [max(math.ceil((upper[i] - lower[i]) / spacing[i]), 1) + 1 for i in range(2)]
+        self.lower = torch.tensor(lower, dtype=torch.float32, device=device)
+        self.spacing = (torch.tensor(upper, dtype=torch.float32, device=device) - self.lower) / torch.tensor(
+            [n - 1 for n in self.num_points], dtype=torch.float32, device=device
+        )
+        self.values = undistort(self._grid_coords(0.0)).reshape(self.num_points[1], self.num_points[0], 2)
+
+    def _grid_coords(self, offset: float) -> Float[Tensor, "num_points 2"]:
+        """Coordinates of the grid points, or of the points offset by a fraction of the spacing from them."""
+        ys, xs = torch.meshgrid(
+            torch.arange(self.num_points[1], dtype=torch.float32, device=self.lower.device),
+            torch.arange(self.num_points[0], dtype=torch.float32, device=self.lower.device),
+            indexing="ij",
+        )
+        if offset != 0.0:
+            # Offset points past the last grid point are outside of the grid.
+            ys, xs = ys[:-1, :-1] + offset, xs[:-1, :-1] + offset
+        return (torch.stack([xs, ys], dim=-1) * self.spacing + self.lower).reshape(-1, 2)
+
+    def __call__(self, coords: Float[Tensor, "num_coords 2"]) -> Float[Tensor, "num_coords 2"]:
+        """Undistorts coordinates by interpolating the tabulated function."""
+        position = (coords - self.lower) / self.spacing
+        max_position = torch.tensor([n - 1 for n in self.num_points], dtype=position.dtype, device=position.device)
+        inside = torch.all((position >= 0) & (position <= max_position), dim=-1)
+        cell = torch.minimum(position.floor(), max_position - 1).clamp(min=0)
+        weights = position - cell
+        ix, iy = cell.long().unbind(-1)
+        index = iy * self.num_points[0] + ix
+        values = self.values.reshape(-1, 2)
+        wx, wy = weights[..., :1], weights[..., 1:]
+        top = torch.lerp(values[index], values[index + 1], wx)
+        bottom = torch.lerp(values[index + self.num_points[0]], values[index + self.num_points[0] + 1], wx)
+        rays = torch.lerp(top, bottom, wy)
+        if not torch.all(inside):
+            rays[~inside] = self.undistort(coords[~inside])
+        return rays
+
+    def get_max_angular_error(self) -> float:
+        """Returns the largest angle in radians between the interpolated rays and the rays of the undistortion
+        function, measured at the centers of the grid cells where bilinear interpolation is least accurate."""
+        coords = self._grid_coords(0.5)
+        return get_angular_error(self(coords), self.undistort(coords)).max().item()
+
+
+class UndistortionMaps:
+    """Least recently used cache of the undistortion maps of distinct camera models.
+
+    Maps are built with the spacing given here, halved until the angular error of the map is at most
+    max_angular_error. Camera models whose maps don't reach that error keep using the iterative solvers.
+
+    Args:
+        spacing: Spacing of the grids of the maps in pixels.
+        max_angular_error: Largest angular error of the maps, in radians.
+        max_refinements: Largest number of times the spacing is halved.
+        max_maps: Number of maps to keep.
+    """
+
+    def __init__(
+        self,
+        spacing: float = 8.0,
+        max_angular_error: float = 1e-5,
+        max_refinements: int = 3,
+        max_maps: int = 16,
+    ):
+        self.spacing = spacing
+        self.max_angular_error = max_angular_error
+        self.max_refinements = max_refinements
+        self.max_maps = max_maps
+        self._maps: "OrderedDict[Tuple, Optional[UndistortionMap]]" = OrderedDict()
+        # Rays are generated concurrently, e.g. by the viewer and the eval threads.
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Tuple,
+        undistort: Callable[[Tensor], Tensor],
+        lower: Tuple[float, float],
+        upper: Tuple[float, float],
+        pixel_size: Tuple[float, float],
+        device: Union[torch.device, str],
+    ) -> Optional[UndistortionMap]:
+        """Returns the map of a camera model, building it the first time, or None if it is not accurate enough.
+
+        Args:
+            key: Key of the camera model.
+            undistort: Undistortion function of the camera model, see `UndistortionMap`.
+            lower: Smallest coordinates to undistort.
+            upper: Largest coordinates to undistort.
+            pixel_size: Size of a pixel along x and y, in the units of the coordinates.
+            device: Device of the map.
+        """
+        key = key + (str(device),)
+        with self._lock:
+            if key in self._maps:
+                self._maps.move_to_end(key)
+                return self._maps[key]
+        # Maps are built outside of the lock so that other camera models don't wait for them. Threads building the
+        # map of the same camera model concurrently keep the first one stored.
+        undistortion_map = None
+        spacing = self.spacing
+        for _ in range(self.max_refinements + 1):
+            candidate = UndistortionMap(
+                undistort, lower, upper, (spacing * pixel_size[0], spacing * pixel_size[1]), device=device
+            )
+            if not torch.isfinite(candidate.values).all():
+                # The function is not defined everywhere, e.g. fisheye pixels more than 90 degrees off axis.
+                break
+            if candidate.get_max_angular_error() <= self.max_angular_error:
+                undistortion_map = candidate
+                break
+            spacing /= 2
+        with self._lock:
+            if key in self._maps:
+                self._maps.move_to_end(key)
+                return self._maps[key]
+            self._maps[key] = undistortion_map
+            if len(self._maps) > self.max_maps:
+                self._maps.popitem(last=False)
+        return undistortion_map
+
+    def clear(self) -> None:
+        """Removes all maps."""
+        with self._lock:
+            self._maps.clear()
+
+
+UNDISTORTION_MAPS = UndistortionMaps()
+"""Undistortion maps used by `Cameras` ray generation when `use_undistortion_maps` is set."""
+
+
+def radial_and_tangential_undistort_with_maps(
+    coords: Float[Tensor, "3 num_rays 2"],
+    distortion_params: Float[Tensor, "num_rays 6"],
+    intrinsics: Float[Tensor, "num_rays 6"],
+    camera_indices: Int[Tensor, "num_rays"],
+    margin: float = 2.0,
+) -> Float[Tensor, "3 num_rays 2"]:
+    """`radial_and_tangential_undistort` using the undistortion maps of the camera models of the rays, see
+    `UNDISTORTION_MAPS`.
+
+    Args:
+        coords: The distorted normalized coordinates of the rays, and of the rays offset by one pixel in x and in y.
+        distortion_params: The distortion parameters of the camera of each ray.
+        intrinsics: The fx, fy, cx, cy, width and height of the camera of each ray.
+        camera_indices: Flat index of the camera of each ray, rays of a camera share its model.
+        margin: Distance in pixels beyond the image borders covered by the maps.
+    """
+    # Group the rays by camera, then the cameras by model, e.g. images taken with the same camera.
+    unique_cameras, ray_cameras = torch.unique(camera_indices, return_inverse=True)
+    first_rays = torch.empty_like(unique_cameras).scatter_(
+        0, ray_cameras, torch.arange(ray_cameras.shape[0], device=ray_cameras.device)
+    )
+    camera_models = torch.cat([intrinsics[first_rays], distortion_params[first_rays]], dim=-1)
+    unique_models, camera_model_indices = torch.unique(camera_models, dim=0, return_inverse=True)
+    if unique_models.shape[0] > UNDISTORTION_MAPS.max_maps:
+        return radial_and_tangential_undistort(coords, distortion_params)
+    model_indices = camera_model_indices[ray_cameras]
+
+    undistorted = torch.empty_like(coords)
+    for i, model in enumerate(unique_models.tolist()):
+        fx, fy, cx, cy, width, height = model[:6]
+        params = unique_models[i, 6:]
+        selected = model_indices == i if unique_models.shape[0] > 1 else slice(None)
+        undistortion_map = UNDISTORTION_MAPS.get(
+            ("radial_and_tangential",) + tuple(model),
+            lambda c: radial_and_tangential_undistort(c, params),
+            lower=((-margin - cx) / fx, (-margin - cy) / fy),
+            upper=((width + margin - cx) / fx, (height + margin - cy) / fy),
+            pixel_size=(1 / fx, 1 / fy),
+            device=coords.device,
+        )
+        if undistortion_map is None:
+            undistorted[:, selected] = radial_and_tangential_undistort(coords[:, selected], params)
+        else:
+            undistorted[:, selected] = undistortion_map(coords[:, selected].reshape(-1, 2)).reshape(3, -1, 2)
+    return undistorted
+
+
+def fisheye624_unproject_with_maps(
+    coords: Float[Tensor, "num_rays 2"],
+    distortion_params: Float[Tensor, "num_rays 16"],
+    image_size: Tuple[int, int],
+    margin: float = 2.0,
+) -> Float[Tensor, "num_rays 3"]:
+    """`fisheye624_unproject` using the undistortion map of the camera model, see `UNDISTORTION_MAPS`.
+
+    Args:
+        coords: The pixel coordinates of the rays.
+        distortion_params: The parameters of the camera, only the first row is used like `fisheye624_unproject`.
+        image_size: The (width, height) of the image.
+        margin: Distance in pixels beyond the image borders covered by the map.
+    """
+    params = distortion_params[0]
+    undistortion_map = UNDISTORTION_MAPS.get(
+        ("fisheye624",) + tuple(params.tolist()) + tuple(image_size),
+        lambda c: fisheye624_unproject_helper(c.unsqueeze(0), params.unsqueeze(0))[0, :, :2],
+        lower=(-margin, -margin),
+        upper=(image_size[0] + margin, image_size[1] + margin),
+        pixel_size=(1.0, 1.0),
+        device=coords.device,
+    )
+    if undistortion_map is None:
+        return fisheye624_unproject(coords, distortion_params)
+    rays = undistortion_map(coords)
+    # Same camera space conventions as `fisheye624_unproject`.
+    return torch.cat([rays[..., :1], -rays[..., 1:], -torch.ones_like(rays[..., :1])], dim=-1)
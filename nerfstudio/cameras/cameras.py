@@ -18,6 +18,8 @@ Camera Models
 
 import base64
 import math
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum, auto
 from typing import Dict, List, Literal, Optional, Tuple, Union
@@ -69,6 +71,67 @@ CAMERA_MODEL_TO_TYPE = {
 }
 
 
+class RayDirectionsCache:
+    """Least recently used cache of the camera-frame ray directions of full images.
+
+    Generating the rays of a full image is mostly spent turning pixel coordinates into directions (undistorting
+    them for distorted and fisheye cameras), which only depends on the intrinsics, distortion, camera type and
+    resolution of the camera. When rendering many frames with the same intrinsics, e.g. in the viewer, only the
+    camera to world transform then needs to be applied to the cached directions.
+
+    Args:
+        max_bytes: Maximum total size of the cached directions. Set to 0 to disable caching.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024**2):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tensor]" = OrderedDict()
+        self._num_bytes = 0
+        # Rays are generated concurrently, e.g. by the viewer and the eval threads.
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Tensor]:
+        """Returns the directions cached for a key, if any."""
+        with self._lock:
+            directions = self._entries.get(key)
+            if directions is not None:
+                self._entries.move_to_end(key)
+            return directions
+
+    def put(self, key: Tuple, directions: Tensor) -> None:
+        """Caches directions, evicting the least recently used ones to stay within max_bytes."""
+        num_bytes = directions.numel() * directions.element_size()
+        with self._lock:
+            if key in self._entries or num_bytes > self.max_bytes:
+                return
+            while self._entries and self._num_bytes + num_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._num_bytes -= evicted.numel() * evicted.element_size()
+            self._entries[key] = directions
+            self._num_bytes += num_bytes
+
+    def clear(self) -> None:
+        """Removes all cached directions."""
+        with self._lock:
+            self._entries.clear()
+            self._num_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+RAY_DIRECTIONS_CACHE = RayDirectionsCache()
+"""Cache of the ray directions of full images generated by `Cameras.generate_rays`."""
+
+_CACHEABLE_CAMERA_TYPES = (
+    CameraType.PERSPECTIVE.value,
+    CameraType.FISHEYE.value,
+    CameraType.EQUIRECTANGULAR.value,
+    CameraType.FISHEYE624.value,
+)
+"""Camera types whose ray directions don't depend on the camera to world transform."""
+
+
 @dataclass(init=False)
 class Cameras(TensorDataclass):
     """Dataparser outputs for the image dataset and the ray generator.
@@ -318,6 +381,72 @@ class Cameras(TensorDataclass):
             image_coords = torch.stack(image_coords, dim=-1) + pixel_offset  # stored as (y, x) coordinates
         return image_coords
 
+    def get_packed_image_coords(
+        self, camera_indices: Int[Tensor, "num_images num_cameras_batch_dims"], pixel_offset: float = 0.5
+    ) -> Tuple[Float[Tensor, "num_rays 2"], Int[Tensor, "num_rays num_cameras_batch_dims"], Int[Tensor, "num_offsets"]]:
+        """Gets the flattened image coordinates of several cameras of possibly different sizes, concatenated.
+
+        Args:
+            camera_indices: Indices of the cameras, into the batch dimensions of this object.
+            pixel_offset: Offset for each pixel. Defaults to center of pixel (0.5)
+
+        Returns:
+            The (y, x) coordinates of the pixels, the camera index of each pixel, and the offsets of the pixels of
+            each camera, those of camera i being in [offsets[i], offsets[i + 1]).
+        """
+        camera_indices = camera_indices.to(self.device, torch.long)
+        true_indices = tuple(camera_indices[..., i] for i in range(camera_indices.shape[-1]))
+        heights = self.image_height[true_indices].view(-1)
+        widths = self.image_width[true_indices].view(-1)
+        num_pixels = heights * widths
+        offsets = torch.cat([num_pixels.new_zeros(1), torch.cumsum(num_pixels, dim=0)])
+
+        image_ids = torch.repeat_interleave(torch.arange(len(num_pixels), device=self.device), num_pixels)
+        pixel_ids = torch.arange(int(offsets[-1].item()), device=self.device) - offsets[image_ids]
+        image_widths = widths[image_ids]
+        coords = torch.stack([pixel_ids // image_widths, pixel_ids % image_widths], dim=-1) + pixel_offset
+        return coords, camera_indices[image_ids], offsets
+
+    def generate_packed_rays(
+        self,
+        camera_indices: Int[Tensor, "num_images num_cameras_batch_dims"],
+        camera_opt_to_camera: Optional[Float[Tensor, "num_images 3 4"]] = None,
+        disable_distortion: bool = False,
+        aabb_box: Optional[SceneBox] = None,
+        obb_box: Optional[OrientedBox] = None,
+        use_undistortion_maps: bool = False,
+    ) -> Tuple[RayBundle, Int[Tensor, "num_offsets"]]:
+        """Generates the rays of the full images of several cameras of possibly different sizes in one pass.
+
+        Args:
+            camera_indices: Indices of the cameras, into the batch dimensions of this object.
+            camera_opt_to_camera: Optional transform for the camera to world matrix of each camera.
+            disable_distortion: If True, disables distortion.
+            aabb_box: if not None will calculate nears and fars of the ray according to aabb box intersection
+            obb_box: if not None, rays outside of the box are zeroed, see `generate_rays`.
+            use_undistortion_maps: Whether distorted rays are undistorted with precomputed maps, see `generate_rays`.
+
+        Returns:
+            A flat bundle of the rays of every image in row-major order, and the offsets of the rays of each image,
+            those of image i being in [offsets[i], offsets[i + 1]).
+        """
+        coords, ray_camera_indices, offsets = self.get_packed_image_coords(camera_indices)
+        if camera_opt_to_camera is not None:
+            image_ids = torch.repeat_interleave(
+                torch.arange(len(offsets) - 1, device=offsets.device), offsets[1:] - offsets[:-1]
+            )
+            camera_opt_to_camera = camera_opt_to_camera.to(self.device)[image_ids]
+        ray_bundle = self.generate_rays(
+            camera_indices=ray_camera_indices,
+            coords=coords,
+            camera_opt_to_camera=camera_opt_to_camera,
+            disable_distortion=disable_distortion,
+            aabb_box=aabb_box,
+            obb_box=obb_box,
+            use_undistortion_maps=use_undistortion_maps,
+        )
+        return ray_bundle, offsets
+
     def generate_rays(
         self,
         camera_indices: Union[Int[Tensor, "*num_rays num_cameras_batch_dims"], int],
@@ -328,6 +457,7 @@ class Cameras(TensorDataclass):
         disable_distortion: bool = False,
         aabb_box: Optional[SceneBox] = None,
         obb_box: Optional[OrientedBox] = None,
+        use_undistortion_maps: bool = False,
     ) -> RayBundle:
         """Generates rays for the given camera indices.
 
@@ -373,6 +503,9 @@ class Cameras(TensorDataclass):
                 camera_indices and coords tensors (if we can).
             disable_distortion: If True, disables distortion.
             aabb_box: if not None will calculate nears and fars of the ray according to aabb box intersection
+            use_undistortion_maps: If True, the rays of distorted (OpenCV and fisheye624) cameras are undistorted
+                with precomputed lookup tables instead of iterative solvers, see `camera_utils.UNDISTORTION_MAPS`.
+                Ignored when distortion_params_delta is set.
 
         Returns:
             Rays for the given camera indices and coords.
@@ -421,26 +554,26 @@ class Cameras(TensorDataclass):
         # a flat list of coords for each camera and then concatenate otherwise our rays will be jagged.
         # Camera indices, camera_opt, and distortion will also need to be broadcasted accordingly which is non-trivial
         if cameras.is_jagged and coords is None and (keep_shape is None or keep_shape is False):
+            # Need to get the coords of each indexed camera and flatten all coordinate maps and concatenate them
             index_dim = camera_indices.shape[-1]
-            camera_indices = camera_indices.reshape(-1, index_dim)
-            _coords = [cameras.get_image_coords(index=tuple(index)).reshape(-1, 2) for index in camera_indices]
-            camera_indices = torch.cat(
-                [index.unsqueeze(0).repeat(coords.shape[0], 1) for index, coords in zip(camera_indices, _coords)],
-            )
-            coords = torch.cat(_coords, dim=0)
+            coords, camera_indices, _ = cameras.get_packed_image_coords(camera_indices.reshape(-1, index_dim))
             assert coords.shape[0] == camera_indices.shape[0]
-            # Need to get the coords of each indexed camera and flatten all coordinate maps and concatenate them
 
         # The case where we aren't jagged && keep_shape (since otherwise coords is already set) and coords
         # is None. In this case we append (h, w) to the num_rays dimensions for all tensors. In this case,
         # each image in camera_indices has to have the same shape since otherwise we would have error'd when
         # we checked keep_shape is valid or we aren't jagged.
+        directions_cache_key = None
         if coords is None:
             index_dim = camera_indices.shape[-1]
             index = camera_indices.reshape(-1, index_dim)[0]
             coords = cameras.get_image_coords(index=tuple(index))  # (h, w, 2)
             coords = coords.reshape(coords.shape[:2] + (1,) * len(camera_indices.shape[:-1]) + (2,))  # (h, w, 1..., 2)
             coords = coords.expand(coords.shape[:2] + camera_indices.shape[:-1] + (2,))  # (h, w, num_rays, 2)
+            if camera_indices.reshape(-1, index_dim).shape[0] == 1 and distortion_params_delta is None:
+                directions_cache_key = cameras._get_directions_cache_key(
+                    tuple(index.tolist()), tuple(coords.shape), disable_distortion, use_undistortion_maps
+                )
             camera_opt_to_camera = (  # (h, w, num_rays, 3, 4) or None
                 camera_opt_to_camera.broadcast_to(coords.shape[:-1] + (3, 4))
                 if camera_opt_to_camera is not None
@@ -465,7 +598,13 @@ class Cameras(TensorDataclass):
         # raybundle.shape == (num_rays) when done
 
         raybundle = cameras._generate_rays_from_coords(
-            camera_indices, coords, camera_opt_to_camera, distortion_params_delta, disable_distortion=disable_distortion
+            camera_indices,
+            coords,
+            camera_opt_to_camera,
+            distortion_params_delta,
+            disable_distortion=disable_distortion,
+            directions_cache_key=directions_cache_key,
+            use_undistortion_maps=use_undistortion_maps,
         )
 
         # If we have mandated that we don't keep the shape, then we flatten
@@ -502,6 +641,43 @@ class Cameras(TensorDataclass):
         # that we haven't caught yet with tests
         return raybundle
 
+    def _get_directions_cache_key(
+        self,
+        index: Tuple[int, ...],
+        coords_shape: Tuple[int, ...],
+        disable_distortion: bool,
+        use_undistortion_maps: bool,
+    ) -> Optional[Tuple]:
+        """Returns the key of the full image ray directions of a camera in `RAY_DIRECTIONS_CACHE`, or None if they
+        can't be cached.
+
+        Args:
+            index: Index of the camera.
+            coords_shape: Shape of the image coordinates the rays are generated for.
+            disable_distortion: Whether distortion is disabled.
+            use_undistortion_maps: Whether the rays are undistorted with precomputed maps.
+        """
+        if RAY_DIRECTIONS_CACHE.max_bytes <= 0:
+            return None
+        camera_type = self.camera_type[index].item()
+        # Directions are computed differently when the cameras have several types.
+        if camera_type not in _CACHEABLE_CAMERA_TYPES or not torch.all(self.camera_type == camera_type):
+            return None
+        distortion_params = None
+        if self.distortion_params is not None and not disable_distortion:
+            distortion_params = tuple(self.distortion_params[index].tolist())
+        return (
+            str(self.device),
+            coords_shape,
+            camera_type,
+            self.fx[index].item(),
+            self.fy[index].item(),
+            self.cx[index].item(),
+            self.cy[index].item(),
+            distortion_params,
+            use_undistortion_maps,
+        )
+
     def _generate_rays_from_coords(
         self,
         camera_indices: Int[Tensor, "*num_rays num_cameras_batch_dims"],
@@ -509,6 +685,8 @@ class Cameras(TensorDataclass):
         camera_opt_to_camera: Optional[Float[Tensor, "*num_rays 3 4"]] = None,
         distortion_params_delta: Optional[Float[Tensor, "*num_rays 6"]] = None,
         disable_distortion: bool = False,
+        directions_cache_key: Optional[Tuple] = None,
+        use_undistortion_maps: bool = False,
     ) -> RayBundle:
         """Generates rays for the given camera indices and coords where self isn't jagged
 
@@ -576,6 +754,10 @@ class Cameras(TensorDataclass):
 
             disable_distortion: If True, disables distortion.
 
+            directions_cache_key: If set, the camera-frame directions of the rays are looked up in (or added to)
+                `RAY_DIRECTIONS_CACHE` under this key, see `_get_directions_cache_key`.
+            use_undistortion_maps: If True, distorted rays are undistorted with precomputed maps, see `generate_rays`.
+
         Returns:
             Rays for the given camera indices and coords. RayBundle.shape == num_rays
         """
@@ -595,6 +777,14 @@ class Cameras(TensorDataclass):
         # of our output rays at each dimension of our cameras object
         true_indices = [camera_indices[..., i] for i in range(camera_indices.shape[-1])]
 
+        if directions_cache_key is not None:
+            cached_directions_stack = RAY_DIRECTIONS_CACHE.get(directions_cache_key)
+            if cached_directions_stack is not None:
+                c2w = self.camera_to_worlds[true_indices]
+                return self._generate_rays_from_directions(
+                    camera_indices, true_indices, c2w, cached_directions_stack, camera_opt_to_camera
+                )
+
         # Get all our focal lengths, principal points and make sure they are the right shapes
         y = coords[..., 0]  # (num_rays,) get rid of the last dimension
         x = coords[..., 1]  # (num_rays,) get rid of the last dimension
@@ -647,10 +837,26 @@ class Cameras(TensorDataclass):
                 mask = (self.camera_type[true_indices] != CameraType.EQUIRECTANGULAR.value).squeeze(-1)  # (num_rays)
                 coord_mask = torch.stack([mask, mask, mask], dim=0)
                 if mask.any() and (distortion_params != 0).any():
-                    coord_stack[coord_mask, :] = camera_utils.radial_and_tangential_undistort(
-                        coord_stack[coord_mask, :].reshape(3, -1, 2),
-                        distortion_params[mask, :],
-                    ).reshape(-1, 2)
+                    if use_undistortion_maps and distortion_params_delta is None:
+                        # Fixed camera models, which can be undistorted with precomputed maps.
+                        intrinsics = torch.stack(
+                            [fx, fy, cx, cy, self.width[true_indices][..., 0], self.height[true_indices][..., 0]],
+                            dim=-1,
+                        )
+                        flat_camera_indices = torch.zeros_like(camera_indices[..., 0])
+                        for i, size in enumerate(self.shape):
+                            flat_camera_indices = flat_camera_indices * size + camera_indices[..., i]
+                        coord_stack[coord_mask, :] = camera_utils.radial_and_tangential_undistort_with_maps(
+                            coord_stack[coord_mask, :].reshape(3, -1, 2),
+                            distortion_params[mask, :],
+                            intrinsics[mask, :].to(distortion_params),
+                            flat_camera_indices[mask],
+                        ).reshape(-1, 2)
+                    else:
+                        coord_stack[coord_mask, :] = camera_utils.radial_and_tangential_undistort(
+                            coord_stack[coord_mask, :].reshape(3, -1, 2),
+                            distortion_params[mask, :],
+                        ).reshape(-1, 2)
 
         # Switch from OpenCV to OpenGL
         coord_stack[..., 1] *= -1
@@ -877,13 +1083,46 @@ class Cameras(TensorDataclass):
                     ],
                     dim=1,
                 )
-                directions_stack[coord_mask] = camera_utils.fisheye624_unproject(masked_coords, camera_params)
+                if use_undistortion_maps and distortion_params_delta is None:
+                    image_size = (
+                        int(self.width[true_indices][mask][0].item()),
+                        int(self.height[true_indices][mask][0].item()),
+                    )
+                    directions_stack[coord_mask] = camera_utils.fisheye624_unproject_with_maps(
+                        masked_coords, camera_params, image_size
+                    )
+                else:
+                    directions_stack[coord_mask] = camera_utils.fisheye624_unproject(masked_coords, camera_params)
 
             else:
                 raise ValueError(f"Camera type {cam} not supported.")
 
         assert directions_stack.shape == (3,) + num_rays_shape + (3,)
+        if directions_cache_key is not None:
+            RAY_DIRECTIONS_CACHE.put(directions_cache_key, directions_stack)
+
+        return self._generate_rays_from_directions(
+            camera_indices, true_indices, c2w, directions_stack, camera_opt_to_camera
+        )
+
+    def _generate_rays_from_directions(
+        self,
+        camera_indices: Int[Tensor, "*num_rays num_cameras_batch_dims"],
+        true_indices: List[Tensor],
+        c2w: Float[Tensor, "*num_rays 3 4"],
+        directions_stack: Float[Tensor, "3 *num_rays 3"],
+        camera_opt_to_camera: Optional[Float[Tensor, "*num_rays 3 4"]] = None,
+    ) -> RayBundle:
+        """Generates rays from their directions in camera coordinates, see `_generate_rays_from_coords`.
 
+        Args:
+            camera_indices: Camera indices of the flattened cameras object to generate rays for.
+            true_indices: camera_indices split along the num_cameras_batch_dims dimension.
+            c2w: Camera to world transform of each ray.
+            directions_stack: Directions of the rays, and of the rays offset by one pixel in x and in y.
+            camera_opt_to_camera: Optional transform for the camera to world matrices.
+        """
+        num_rays_shape = camera_indices.shape[:-1]
         if camera_opt_to_camera is not None:
             c2w = pose_utils.multiply(c2w, camera_opt_to_camera)
         rotation = c2w[..., :3, :3]  # (..., 3, 3)
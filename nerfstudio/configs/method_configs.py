@@ -603,6 +603,7 @@ method_configs["splatfacto"] = TrainerConfig(
         datamanager=FullImageDatamanagerConfig(
             dataparser=NerfstudioDataParserConfig(load_3D_points=True),
             cache_images_type="uint8",
+            cache_pyramid_levels=2,
         ),
         model=SplatfactoModelConfig(),
     ),
@@ -660,6 +661,7 @@ method_configs["splatfacto-big"] = TrainerConfig(
         datamanager=FullImageDatamanagerConfig(
             dataparser=NerfstudioDataParserConfig(load_3D_points=True),
             cache_images_type="uint8",
+            cache_pyramid_levels=2,
         ),
         model=SplatfactoModelConfig(
             cull_alpha_thresh=0.005,
@@ -56,10 +56,13 @@ from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
 from nerfstudio.data.dataparsers.blender_dataparser import BlenderDataParserConfig
 from nerfstudio.data.datasets.base_dataset import InputDataset
 from nerfstudio.data.pixel_samplers import PatchPixelSamplerConfig, PixelSampler, PixelSamplerConfig
+from nerfstudio.data.utils.compact_storage import CompactStorageConfig, expand_data, get_compact_collate_fn
 from nerfstudio.data.utils.dataloaders import CacheDataloader, FixedIndicesEvalDataloader, RandIndicesEvalDataloader
+from nerfstudio.data.utils.image_cache import DecodedImageCache
 from nerfstudio.data.utils.nerfstudio_collate import nerfstudio_collate
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.model_components.ray_generators import RayGenerator
+from nerfstudio.utils import comms
 from nerfstudio.utils.misc import IterableWrapper, get_orig_class
 from nerfstudio.utils.rich_utils import CONSOLE
 
@@ -109,6 +112,17 @@ class DataManagerConfig(InstantiateConfig):
     """Process masks on GPU for speed at the expense of memory, if True."""
     images_on_gpu: bool = False
     """Process images on GPU for speed at the expense of memory, if True."""
+    image_cache_dir: Optional[Path] = None
+    """If set, decoded images are cached in a memory-mapped file in this directory, so that later runs on the same
+    data skip image decoding. The cache can be shared by concurrent runs on one host."""
+    compact_storage: CompactStorageConfig = field(default_factory=CompactStorageConfig)
+    """Storage types of the masks, depth images and semantics cached by the datamanager."""
+    shard_train_images: bool = False
+    """In multi-GPU training, each rank only caches and samples from its own disjoint share of the train images,
+    instead of every rank caching all of them."""
+    shard_rotation_interval: int = -1
+    """When sharding train images, every n steps each rank moves on to the shard of the next rank, so that every
+    rank sees all images over time. Each rotation reloads the shard. If -1, shards never rotate."""
 
 
 class DataManager(nn.Module):
@@ -159,6 +173,7 @@ class DataManager(nn.Module):
 
     """
 
+    config: DataManagerConfig
     train_dataset: Optional[InputDataset] = None
     eval_dataset: Optional[InputDataset] = None
     train_sampler: Optional[DistributedSampler] = None
@@ -177,6 +192,12 @@ class DataManager(nn.Module):
         super().__init__()
         self.train_count = 0
         self.eval_count = 0
+        image_cache_dir = getattr(getattr(self, "config", None), "image_cache_dir", None)
+        if image_cache_dir is not None:
+            image_cache = DecodedImageCache(image_cache_dir)
+            for dataset in (self.train_dataset, self.eval_dataset):
+                if dataset is not None:
+                    dataset.image_cache = image_cache
         if self.train_dataset and self.test_mode != "inference":
             self.setup_train()
         if self.eval_dataset and self.test_mode != "inference":
@@ -293,6 +314,37 @@ class DataManager(nn.Module):
         """Returns a list of callbacks to be used during training."""
         return []
 
+    def get_train_shard(self, num_images: int, step: int = 0) -> List[int]:
+        """Returns the indices of the train images this rank caches and samples from at a given step.
+
+        Without sharding, or with a single rank, these are all the images. Otherwise images are dealt round-robin
+        to the ranks, and the shards rotate between ranks every shard_rotation_interval steps.
+
+        Args:
+            num_images: Number of train images.
+            step: Training step.
+        """
+        world_size = comms.get_world_size()
+        if not self.config.shard_train_images or world_size == 1:
+            return list(range(num_images))
+        assert num_images >= world_size, f"Cannot shard {num_images} train images across {world_size} ranks"
+        rotation = step // self.config.shard_rotation_interval if self.config.shard_rotation_interval > 0 else 0
+        shard = (comms.get_rank() + rotation) % world_size
+        return list(range(shard, num_images, world_size))
+
+    def is_shard_rotation_step(self, step: int) -> bool:
+        """Whether the train shards rotate at a given step, see `get_train_shard`."""
+        interval = self.config.shard_rotation_interval
+        return self.config.shard_train_images and interval > 0 and step > 0 and step % interval == 0
+
+    def process_train_outputs(self, batch: Dict, model_outputs: Dict[str, Any]) -> None:
+        """Called with the model outputs of every training batch, e.g. to adapt how the next batches are sampled.
+
+        Args:
+            batch: The training batch returned by next_train.
+            model_outputs: The outputs of the model for that batch.
+        """
+
     @abstractmethod
     def get_param_groups(self) -> Dict[str, List[Parameter]]:
         """Get the param groups for the data manager.
@@ -341,6 +393,9 @@ class VanillaDataManagerConfig(DataManagerConfig):
     """Deprecated, has been moved to the model config."""
     pixel_sampler: PixelSamplerConfig = field(default_factory=PixelSamplerConfig)
     """Specifies the pixel sampler used to sample pixels from images."""
+    use_undistortion_maps: bool = False
+    """Undistort the rays of distorted (OpenCV and fisheye624) cameras with precomputed lookup tables instead of
+    iterative solvers. Maps are only used where they stay within a small angular error of the solvers."""
 
     def __post_init__(self):
         """Warn user of camera optimizer change."""
@@ -491,12 +546,15 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
             device=self.device,
             num_workers=self.world_size * 4,
             pin_memory=True,
-            collate_fn=self.config.collate_fn,
+            collate_fn=get_compact_collate_fn(self.config.collate_fn, self.config.compact_storage),
             exclude_batch_keys_from_device=self.exclude_batch_keys_from_device,
+            indices=self.get_train_shard(len(self.train_dataset)),
         )
         self.iter_train_image_dataloader = iter(self.train_image_dataloader)
         self.train_pixel_sampler = self._get_pixel_sampler(self.train_dataset, self.config.train_num_rays_per_batch)
-        self.train_ray_generator = RayGenerator(self.train_dataset.cameras.to(self.device))
+        self.train_ray_generator = RayGenerator(
+            self.train_dataset.cameras.to(self.device), self.config.use_undistortion_maps
+        )
 
     def setup_eval(self):
         """Sets up the data loader for evaluation"""
@@ -509,12 +567,14 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
             device=self.device,
             num_workers=self.world_size * 4,
             pin_memory=True,
-            collate_fn=self.config.collate_fn,
+            collate_fn=get_compact_collate_fn(self.config.collate_fn, self.config.compact_storage),
             exclude_batch_keys_from_device=self.exclude_batch_keys_from_device,
         )
         self.iter_eval_image_dataloader = iter(self.eval_image_dataloader)
         self.eval_pixel_sampler = self._get_pixel_sampler(self.eval_dataset, self.config.eval_num_rays_per_batch)
-        self.eval_ray_generator = RayGenerator(self.eval_dataset.cameras.to(self.device))
+        self.eval_ray_generator = RayGenerator(
+            self.eval_dataset.cameras.to(self.device), self.config.use_undistortion_maps
+        )
         # for loading full images
         self.fixed_indices_eval_dataloader = FixedIndicesEvalDataloader(
             input_dataset=self.eval_dataset,
@@ -530,10 +590,13 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
     def next_train(self, step: int) -> Tuple[RayBundle, Dict]:
         """Returns the next batch of data from the train dataloader."""
         self.train_count += 1
+        if self.is_shard_rotation_step(step):
+            self.train_image_dataloader.set_indices(self.get_train_shard(len(self.train_dataset), step))
         image_batch = next(self.iter_train_image_dataloader)
         assert self.train_pixel_sampler is not None
         assert isinstance(image_batch, dict)
         batch = self.train_pixel_sampler.sample(image_batch)
+        batch = expand_data(batch, self.config.compact_storage)
         ray_indices = batch["indices"]
         ray_bundle = self.train_ray_generator(ray_indices)
         return ray_bundle, batch
@@ -545,6 +608,7 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
         assert self.eval_pixel_sampler is not None
         assert isinstance(image_batch, dict)
         batch = self.eval_pixel_sampler.sample(image_batch)
+        batch = expand_data(batch, self.config.compact_storage)
         ray_indices = batch["indices"]
         ray_bundle = self.eval_ray_generator(ray_indices)
         return ray_bundle, batch
@@ -560,6 +624,10 @@ class VanillaDataManager(DataManager, Generic[TDataset]):
             return self.train_pixel_sampler.num_rays_per_batch
         return self.config.train_num_rays_per_batch
 
+    def process_train_outputs(self, batch: Dict, model_outputs: Dict[str, Any]) -> None:
+        if self.train_pixel_sampler is not None:
+            self.train_pixel_sampler.update(batch, model_outputs)
+
     def get_eval_rays_per_batch(self) -> int:
         if self.eval_pixel_sampler is not None:
             return self.eval_pixel_sampler.num_rays_per_batch
@@ -21,7 +21,10 @@ paradigm
 
 from __future__ import annotations
 
+import hashlib
+import os
 import random
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from dataclasses import dataclass, field
@@ -44,6 +47,8 @@ from nerfstudio.data.datamanagers.base_datamanager import DataManager, DataManag
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
 from nerfstudio.data.dataparsers.nerfstudio_dataparser import NerfstudioDataParserConfig
 from nerfstudio.data.datasets.base_dataset import InputDataset
+from nerfstudio.data.utils.compact_storage import compact_data, expand_data
+from nerfstudio.data.utils.data_utils import downscale_image_area, get_pyramid_key, tag_cache_dir
 from nerfstudio.utils.misc import get_orig_class
 from nerfstudio.utils.rich_utils import CONSOLE
 
@@ -67,8 +72,15 @@ class FullImageDatamanagerConfig(DataManagerConfig):
     """Whether to cache images in memory. If "cpu", caches on cpu. If "gpu", caches on device."""
     cache_images_type: Literal["uint8", "float32"] = "float32"
     """The image type returned from manager, caching images in uint8 saves memory"""
+    cache_pyramid_levels: int = 0
+    """Number of downscaled copies (1/2, 1/4, ...) of each train image and mask to precompute when caching them,
+    for models that train at a lower resolution first. Should match splatfacto's num_downscales."""
     max_thread_workers: Optional[int] = None
     """The maximum number of threads to use for caching images. If None, uses all available threads."""
+    undistort_cache_dir: Optional[Path] = None
+    """If set, undistorted images, masks and intrinsics are saved to this directory and reused by later runs,
+    keyed by the source files (path, modification time and size) and the camera parameters, so that later runs
+    load them without decoding the source images."""
     train_cameras_sampling_strategy: Literal["random", "fps"] = "random"
     """Specifies which sampling strategy is used to generate train cameras, 'random' means sampling 
     uniformly random without replacement, 'fps' means farthest point sampling which is helpful to reduce the artifacts 
@@ -121,7 +133,8 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
         self.train_dataparser_outputs: DataparserOutputs = self.dataparser.get_dataparser_outputs(split="train")
         self.train_dataset = self.create_train_dataset()
         self.eval_dataset = self.create_eval_dataset()
-        if len(self.train_dataset) > 500 and self.config.cache_images == "gpu":
+        self.train_shard = self.get_train_shard(len(self.train_dataset))
+        if len(self.train_shard) > 500 and self.config.cache_images == "gpu":
             CONSOLE.print(
                 "Train dataset has over 500 images, overriding cache_images to cpu",
                 style="bold yellow",
@@ -133,6 +146,13 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
         if self.config.images_on_gpu is True:
             self.exclude_batch_keys_from_device.remove("image")
 
+        if self.config.shard_train_images and self.config.shard_rotation_interval > 0:
+            # Reloading an image needs the intrinsics from before it was undistorted.
+            self.original_train_cameras = deepcopy(self.train_dataset.cameras)
+
+        # Coarsest downscaled copy of the train images that is cached, see `release_pyramid_levels`.
+        self.max_pyramid_downscale_factor = 2**self.config.cache_pyramid_levels
+
         # Some logic to make sure we sample every camera in equal amounts
         self.train_unseen_cameras = self.sample_train_cameras()
         self.eval_unseen_cameras = [i for i in range(len(self.eval_dataset))]
@@ -142,24 +162,25 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
 
     def sample_train_cameras(self):
         """Return a list of camera indices sampled using the strategy specified by
-        self.config.train_cameras_sampling_strategy"""
-        num_train_cameras = len(self.train_dataset)
+        self.config.train_cameras_sampling_strategy, among the cameras of the train shard of this rank"""
+        num_train_cameras = len(self.train_shard)
         if self.config.train_cameras_sampling_strategy == "random":
             if not hasattr(self, "random_generator"):
                 self.random_generator = random.Random(self.config.train_cameras_sampling_seed)
-            indices = list(range(num_train_cameras))
+            indices = list(self.train_shard)
             self.random_generator.shuffle(indices)
             return indices
         elif self.config.train_cameras_sampling_strategy == "fps":
             if not hasattr(self, "train_unsampled_epoch_count"):
                 np.random.seed(self.config.train_cameras_sampling_seed)  # fix random seed of fpsample
-                self.train_unsampled_epoch_count = np.zeros(num_train_cameras)
-            camera_origins = self.train_dataset.cameras.camera_to_worlds[..., 3].numpy()
+                self.train_unsampled_epoch_count = np.zeros(len(self.train_dataset))
+            shard = np.array(self.train_shard)
+            camera_origins = self.train_dataset.cameras.camera_to_worlds[shard, :, 3].numpy()
             # We concatenate camera origins with weighted train_unsampled_epoch_count because we want to
             # increase the chance to sample camera that hasn't been sampled in consecutive epochs previously.
             # We assume the camera origins are also rescaled, so the weight 0.1 is relative to the scale of scene
             data = np.concatenate(
-                (camera_origins, 0.1 * np.expand_dims(self.train_unsampled_epoch_count, axis=-1)), axis=-1
+                (camera_origins, 0.1 * np.expand_dims(self.train_unsampled_epoch_count[shard], axis=-1)), axis=-1
             )
             n = self.config.fps_reset_every
             if num_train_cameras < n:
@@ -168,30 +189,34 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
                     "camera sampler will be very similar to sampling random without replacement (default setting)."
                 )
                 n = num_train_cameras
-            kdline_fps_samples_idx = fpsample.bucket_fps_kdline_sampling(data, n, h=3)
+            kdline_fps_samples_idx = shard[fpsample.bucket_fps_kdline_sampling(data, n, h=3)]
 
-            self.train_unsampled_epoch_count += 1
+            self.train_unsampled_epoch_count[shard] += 1
             self.train_unsampled_epoch_count[kdline_fps_samples_idx] = 0
             return kdline_fps_samples_idx.tolist()
         else:
             raise ValueError(f"Unknown train camera sampling strategy: {self.config.train_cameras_sampling_strategy}")
 
     @cached_property
-    def cached_train(self) -> List[Dict[str, torch.Tensor]]:
+    def cached_train(self) -> List[Dict]:
         """Get the training images. Will load and undistort the images the
-        first time this (cached) property is accessed."""
-        return self._load_images("train", cache_images_device=self.config.cache_images)
+        first time this (cached) property is accessed. Only the images of the train shard of this rank are
+        loaded, the others are empty."""
+        return self._load_images("train", cache_images_device=self.config.cache_images, indices=self.train_shard)
 
     @cached_property
-    def cached_eval(self) -> List[Dict[str, torch.Tensor]]:
+    def cached_eval(self) -> List[Dict]:
         """Get the eval images. Will load and undistort the images the
         first time this (cached) property is accessed."""
         return self._load_images("eval", cache_images_device=self.config.cache_images)
 
     def _load_images(
-        self, split: Literal["train", "eval"], cache_images_device: Literal["cpu", "gpu"]
-    ) -> List[Dict[str, torch.Tensor]]:
-        undistorted_images: List[Dict[str, torch.Tensor]] = []
+        self,
+        split: Literal["train", "eval"],
+        cache_images_device: Literal["cpu", "gpu"],
+        indices: Optional[List[int]] = None,
+    ) -> List[Dict]:
+        undistorted_images: List[Dict] = []
 
         # Which dataset?
         if split == "train":
@@ -200,44 +225,78 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
             dataset = self.eval_dataset
         else:
             assert_never(split)
+        if indices is None:
+            indices = list(range(len(dataset)))
 
-        def undistort_idx(idx: int) -> Dict[str, torch.Tensor]:
-            data = dataset.get_data(idx, image_type=self.config.cache_images_type)
-            camera = dataset.cameras[idx].reshape(())
-            assert data["image"].shape[1] == camera.width.item() and data["image"].shape[0] == camera.height.item(), (
-                f'The size of image ({data["image"].shape[1]}, {data["image"].shape[0]}) loaded '
-                f'does not match the camera parameters ({camera.width.item(), camera.height.item()})'
-            )
-            if camera.distortion_params is None or torch.all(camera.distortion_params == 0):
-                return data
-            K = camera.get_intrinsics_matrices().numpy()
-            distortion_params = camera.distortion_params.numpy()
-            image = data["image"].numpy()
+        # Frames taken with the same physical camera share their remap tables, so build them once per camera.
+        camera_groups = _group_cameras_by_intrinsics(dataset.cameras)
+        undistortion_maps: Dict[int, UndistortionMaps] = {}
+        undistortion_maps_lock = threading.Lock()
 
-            K, image, mask = _undistort_image(camera, distortion_params, data, image, K)
-            data["image"] = torch.from_numpy(image)
-            if mask is not None:
-                data["mask"] = mask
+        def get_maps(idx: int, camera: Cameras, distortion_params: np.ndarray, K: np.ndarray) -> UndistortionMaps:
+            with undistortion_maps_lock:
+                if camera_groups[idx] not in undistortion_maps:
+                    undistortion_maps[camera_groups[idx]] = get_undistortion_maps(camera, distortion_params, K)
+                return undistortion_maps[camera_groups[idx]]
+
+        def undistort_idx(idx: int) -> Dict:
+            camera = dataset.cameras[idx].reshape(())
+            is_distorted = camera.distortion_params is not None and not torch.all(camera.distortion_params == 0)
+            cache_path = None
+            if is_distorted and self.config.undistort_cache_dir is not None:
+                cache_key = _undistort_cache_key(dataset, idx, camera, self.config.cache_images_type)
+                cache_path = Path(self.config.undistort_cache_dir) / f"{cache_key}.npz"
+            if cache_path is not None and cache_path.exists():
+                K, data = _load_undistorted(cache_path, idx)
+            else:
+                data = dataset.get_data(idx, image_type=self.config.cache_images_type)
+                assert (
+                    data["image"].shape[1] == camera.width.item() and data["image"].shape[0] == camera.height.item()
+                ), (
+                    f'The size of image ({data["image"].shape[1]}, {data["image"].shape[0]}) loaded '
+                    f'does not match the camera parameters ({camera.width.item(), camera.height.item()})'
+                )
+                if not is_distorted:
+                    return data
+                assert camera.distortion_params is not None
+                K = camera.get_intrinsics_matrices().numpy()
+                distortion_params = camera.distortion_params.numpy()
+                maps = get_maps(idx, camera, distortion_params, K)
+                K, image, mask = apply_undistortion_maps(maps, data, data["image"].numpy())
+                data["image"] = torch.from_numpy(image)
+                if mask is not None:
+                    data["mask"] = mask
+                if cache_path is not None:
+                    _save_undistorted(cache_path, data, K)
 
             dataset.cameras.fx[idx] = float(K[0, 0])
             dataset.cameras.fy[idx] = float(K[1, 1])
             dataset.cameras.cx[idx] = float(K[0, 2])
             dataset.cameras.cy[idx] = float(K[1, 2])
-            dataset.cameras.width[idx] = image.shape[1]
-            dataset.cameras.height[idx] = image.shape[0]
+            dataset.cameras.width[idx] = data["image"].shape[1]
+            dataset.cameras.height[idx] = data["image"].shape[0]
+            return data
+
+        def load_idx(idx: int) -> Dict:
+            data = undistort_idx(idx)
+            if split == "train":
+                for downscale_factor in self._pyramid_downscale_factors:
+                    _add_pyramid_level(data, downscale_factor)
+            if self.config.compact_storage.enabled:
+                data = compact_data(data, self.config.compact_storage)
             return data
 
         CONSOLE.log(f"Caching / undistorting {split} images")
-        with ThreadPoolExecutor(max_workers=2) as executor:
+        with ThreadPoolExecutor(max_workers=self.config.max_thread_workers) as executor:
             undistorted_images = list(
                 track(
                     executor.map(
-                        undistort_idx,
-                        range(len(dataset)),
+                        load_idx,
+                        indices,
                     ),
                     description=f"Caching / undistorting {split} images",
                     transient=True,
-                    total=len(dataset),
+                    total=len(indices),
                 )
             )
 
@@ -249,17 +308,69 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
                     cache["mask"] = cache["mask"].to(self.device)
                 if "depth" in cache:
                     cache["depth"] = cache["depth"].to(self.device)
+                for key in self._get_pyramid_keys(cache):
+                    cache[key] = cache[key].to(self.device)
                 self.train_cameras = self.train_dataset.cameras.to(self.device)
         elif cache_images_device == "cpu":
             for cache in undistorted_images:
                 cache["image"] = cache["image"].pin_memory()
                 if "mask" in cache:
                     cache["mask"] = cache["mask"].pin_memory()
+                for key in self._get_pyramid_keys(cache):
+                    cache[key] = cache[key].pin_memory()
                 self.train_cameras = self.train_dataset.cameras
         else:
             assert_never(cache_images_device)
 
-        return undistorted_images
+        if len(indices) == len(dataset):
+            return undistorted_images
+        images: List[Dict] = [{} for _ in range(len(dataset))]
+        for idx, data in zip(indices, undistorted_images):
+            images[idx] = data
+        return images
+
+    def _rotate_train_shard(self, step: int) -> None:
+        """Replaces the cached train images by those of the train shard of this rank at the given step."""
+        train_shard = self.get_train_shard(len(self.train_dataset), step)
+        if train_shard == self.train_shard:
+            return
+        for idx in self.train_shard:
+            self.cached_train[idx] = {}
+        cameras = self.train_dataset.cameras
+        for name in ("fx", "fy", "cx", "cy", "width", "height"):
+            getattr(cameras, name)[train_shard] = getattr(self.original_train_cameras, name)[train_shard]
+        images = self._load_images("train", cache_images_device=self.config.cache_images, indices=train_shard)
+        for idx in train_shard:
+            self.cached_train[idx] = images[idx]
+        self.train_shard = train_shard
+        self.train_unseen_cameras = self.sample_train_cameras()
+
+    def release_pyramid_levels(self, downscale_factor: int) -> None:
+        """Frees the downscaled copies of the cached train images that are coarser than `downscale_factor`, e.g.
+        once a resolution schedule has moved past them. Images cached later, on shard rotations, skip them too.
+
+        Args:
+            downscale_factor: Downscale factor of the coarsest copies to keep, 1 frees all of them.
+        """
+        if downscale_factor >= self.max_pyramid_downscale_factor:
+            return
+        released_factors = [d for d in self._pyramid_downscale_factors if d > downscale_factor]
+        self.max_pyramid_downscale_factor = downscale_factor
+        if "cached_train" not in self.__dict__:
+            return
+        for data in self.cached_train:
+            for key in ("image", "mask"):
+                for d in released_factors:
+                    data.pop(get_pyramid_key(key, d), None)
+
+    @property
+    def _pyramid_downscale_factors(self) -> List[int]:
+        downscale_factors = [2**level for level in range(1, self.config.cache_pyramid_levels + 1)]
+        return [d for d in downscale_factors if d <= self.max_pyramid_downscale_factor]
+
+    def _get_pyramid_keys(self, data: Dict) -> List[str]:
+        keys = [get_pyramid_key(key, d) for key in ("image", "mask") for d in self._pyramid_downscale_factors]
+        return [key for key in keys if key in data]
 
     def create_train_dataset(self) -> TDataset:
         """Sets up the data loaders for training"""
@@ -339,6 +450,8 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
         """Returns the next training batch
 
         Returns a Camera instead of raybundle"""
+        if self.is_shard_rotation_step(step):
+            self._rotate_train_shard(step)
         image_idx = self.train_unseen_cameras.pop(0)
         # Make sure to re-populate the unseen cameras list if we have exhausted it
         if len(self.train_unseen_cameras) == 0:
@@ -346,6 +459,10 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
 
         data = self.cached_train[image_idx]
         data["image"] = data["image"].to(self.device)
+        for key in self._get_pyramid_keys(data):
+            data[key] = data[key].to(self.device)
+        if self.config.compact_storage.enabled:
+            data = expand_data(data, self.config.compact_storage)
 
         assert len(self.train_cameras.shape) == 1, "Assumes single batch dimension"
         camera = self.train_cameras[image_idx : image_idx + 1].to(self.device)
@@ -372,15 +489,126 @@ class FullImageDatamanager(DataManager, Generic[TDataset]):
             self.eval_unseen_cameras = [i for i in range(len(self.eval_dataset))]
         data = deepcopy(self.cached_eval[image_idx])
         data["image"] = data["image"].to(self.device)
+        if self.config.compact_storage.enabled:
+            data = expand_data(data, self.config.compact_storage)
         assert len(self.eval_dataset.cameras.shape) == 1, "Assumes single batch dimension"
         camera = self.eval_dataset.cameras[image_idx : image_idx + 1].to(self.device)
         return camera, data
 
 
-def _undistort_image(
-    camera: Cameras, distortion_params: np.ndarray, data: dict, image: np.ndarray, K: np.ndarray
-) -> Tuple[np.ndarray, np.ndarray, Optional[torch.Tensor]]:
-    mask = None
+def _group_cameras_by_intrinsics(cameras: Cameras) -> List[int]:
+    """Returns for each camera the index of the group of cameras with identical intrinsics, distortion and fisheye
+    crop radius."""
+    num_cameras = cameras.shape[0]
+    params = [cameras.fx, cameras.fy, cameras.cx, cameras.cy, cameras.width, cameras.height, cameras.camera_type]
+    if cameras.distortion_params is not None:
+        params.append(cameras.distortion_params)
+    if cameras.metadata is not None and "fisheye_crop_radius" in cameras.metadata:
+        # Either one radius for every camera, or one per camera.
+        crop_radius = torch.as_tensor(cameras.metadata["fisheye_crop_radius"], dtype=torch.float64)
+        params.append(crop_radius.reshape(-1, 1).expand(num_cameras, -1))
+    params = torch.cat([p.reshape(num_cameras, -1).to(torch.float64) for p in params], dim=-1)
+    _, groups = torch.unique(params, dim=0, return_inverse=True)
+    return groups.tolist()
+
+
+def _add_pyramid_level(data: Dict, downscale_factor: int) -> None:
+    """Adds the image and mask of `data` downscaled by `downscale_factor` to `data`, see `get_pyramid_key`.
+    The downscaled image keeps the type of the image, the downscaled mask is float32."""
+    image = downscale_image_area(data["image"], downscale_factor)
+    if data["image"].dtype == torch.uint8:
+        image = image.round().to(torch.uint8)
+    data[get_pyramid_key("image", downscale_factor)] = image
+    if "mask" in data:
+        data[get_pyramid_key("mask", downscale_factor)] = downscale_image_area(data["mask"], downscale_factor)
+
+
+def _undistort_cache_key(dataset: InputDataset, idx: int, camera: Cameras, image_type: str) -> str:
+    """Returns a hash of everything the undistorted data of an image depends on, without loading the image: its
+    source files (path, modification time and size), how they are loaded, and the camera parameters."""
+    outputs = dataset._dataparser_outputs
+    filenames = [outputs.image_filenames[idx]]
+    if outputs.mask_filenames is not None:
+        filenames.append(outputs.mask_filenames[idx])
+    # e.g. depth images, listed per image in the metadata.
+    for value in dataset.metadata.values():
+        if isinstance(value, list) and len(value) == len(dataset) and isinstance(value[idx], (str, Path)):
+            filenames.append(value[idx])
+    hasher = hashlib.sha1()
+    for filename in filenames:
+        stat = os.stat(filename)
+        hasher.update(f"{Path(filename).absolute()}|{stat.st_mtime_ns}|{stat.st_size}".encode())
+    alpha_color = None if outputs.alpha_color is None else outputs.alpha_color.tolist()
+    hasher.update(
+        f"{type(dataset).__name__}|{dataset.scale_factor}|{image_type}|{alpha_color}|{dataset.mask_color}".encode()
+    )
+    assert camera.distortion_params is not None
+    params = [camera.fx, camera.fy, camera.cx, camera.cy, camera.width, camera.height, camera.camera_type]
+    params.append(camera.distortion_params)
+    for param in params:
+        hasher.update(np.ascontiguousarray(param.numpy(), dtype=np.float64).tobytes())
+    if camera.metadata is not None and "fisheye_crop_radius" in camera.metadata:
+        hasher.update(str(camera.metadata["fisheye_crop_radius"]).encode())
+    return hasher.hexdigest()
+
+
+def _save_undistorted(cache_path: Path, data: dict, K: np.ndarray) -> None:
+    """Saves the undistorted data of an image so it can be restored with `_load_undistorted`. Data with values
+    other than tensors is not saved, as it could not be restored without loading the image."""
+    arrays = {"K": K}
+    for key, value in data.items():
+        if key == "image_idx":
+            continue
+        if not isinstance(value, torch.Tensor):
+            return
+        arrays[f"data_{key}"] = value.numpy()
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tag_cache_dir(cache_path.parent)
+    # Write to a temporary file first so that concurrent runs never read a partially written entry.
+    tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp.npz")
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def _load_undistorted(cache_path: Path, image_idx: int) -> Tuple[np.ndarray, Dict]:
+    """Loads the intrinsics and the undistorted data of an image saved with `_save_undistorted`."""
+    with np.load(cache_path) as arrays:
+        data: Dict = {"image_idx": image_idx}
+        for name in arrays.files:
+            if name.startswith("data_"):
+                data[name[len("data_") :]] = torch.from_numpy(arrays[name])
+        return arrays["K"], data
+
+
+@dataclass
+class UndistortionMaps:
+    """Remap tables for undistorting every image taken with one camera, see `get_undistortion_maps`."""
+
+    K: np.ndarray
+    """Intrinsics of the undistorted images."""
+    map1: Optional[np.ndarray]
+    """First map for `cv2.remap`, or None if the images are not distorted."""
+    map2: Optional[np.ndarray]
+    """Second map for `cv2.remap`, or None if the images are not distorted."""
+    roi: Optional[Tuple[int, int, int, int]] = None
+    """Region (x, y, w, h) of the remapped images to crop to, if any."""
+    mask: Optional[torch.Tensor] = None
+    """Valid region of the undistorted images, for cameras whose valid region is fixed by the camera model."""
+
+
+def get_undistortion_maps(camera: Cameras, distortion_params: np.ndarray, K: np.ndarray) -> UndistortionMaps:
+    """Builds the remap tables to undistort images taken with the given camera.
+
+    The maps only depend on the camera intrinsics and distortion parameters, so they can be reused for every
+    image sharing them.
+
+    Args:
+        camera: The camera, with a single element.
+        distortion_params: The camera distortion parameters.
+        K: The 3x3 camera intrinsics matrix.
+    """
+    K = K.copy()
+    image_size = (int(camera.width.item()), int(camera.height.item()))
     if camera.camera_type.item() == CameraType.PERSPECTIVE.value:
         assert distortion_params[3] == 0, (
             "We doesn't support the 4th Brown parameter for image undistortion, "
@@ -403,28 +631,16 @@ def _undistort_image(
         K[0, 2] = K[0, 2] - 0.5
         K[1, 2] = K[1, 2] - 0.5
         if np.any(distortion_params):
-            newK, roi = cv2.getOptimalNewCameraMatrix(K, distortion_params, (image.shape[1], image.shape[0]), 0)
-            image = cv2.undistort(image, K, distortion_params, None, newK)  # type: ignore
+            newK, roi = cv2.getOptimalNewCameraMatrix(K, distortion_params, image_size, 0)
+            # same maps as used internally by cv2.undistort
+            map1, map2 = cv2.initUndistortRectifyMap(K, distortion_params, None, newK, image_size, cv2.CV_16SC2)
         else:
             newK = K
-            roi = 0, 0, image.shape[1], image.shape[0]
-        # crop the image and update the intrinsics accordingly
-        x, y, w, h = roi
-        image = image[y : y + h, x : x + w]
-        if "depth_image" in data:
-            data["depth_image"] = data["depth_image"][y : y + h, x : x + w]
-        if "mask" in data:
-            mask = data["mask"].numpy()
-            mask = mask.astype(np.uint8) * 255
-            if np.any(distortion_params):
-                mask = cv2.undistort(mask, K, distortion_params, None, newK)  # type: ignore
-            mask = mask[y : y + h, x : x + w]
-            mask = torch.from_numpy(mask).bool()
-            if len(mask.shape) == 2:
-                mask = mask[:, :, None]
+            roi = 0, 0, image_size[0], image_size[1]
+            map1, map2 = None, None
         newK[0, 2] = newK[0, 2] + 0.5
         newK[1, 2] = newK[1, 2] + 0.5
-        K = newK
+        return UndistortionMaps(K=newK, map1=map1, map2=map2, roi=tuple(roi))
 
     elif camera.camera_type.item() == CameraType.FISHEYE.value:
         K[0, 2] = K[0, 2] - 0.5
@@ -433,31 +649,22 @@ def _undistort_image(
             [distortion_params[0], distortion_params[1], distortion_params[2], distortion_params[3]]
         )
         newK = cv2.fisheye.estimateNewCameraMatrixForUndistortRectify(
-            K, distortion_params, (image.shape[1], image.shape[0]), np.eye(3), balance=0
+            K, distortion_params, image_size, np.eye(3), balance=0
         )
         map1, map2 = cv2.fisheye.initUndistortRectifyMap(
-            K, distortion_params, np.eye(3), newK, (image.shape[1], image.shape[0]), cv2.CV_32FC1
+            K, distortion_params, np.eye(3), newK, image_size, cv2.CV_32FC1
         )
-        # and then remap:
-        image = cv2.remap(image, map1, map2, interpolation=cv2.INTER_LINEAR)
-        if "mask" in data:
-            mask = data["mask"].numpy()
-            mask = mask.astype(np.uint8) * 255
-            mask = cv2.fisheye.undistortImage(mask, K, distortion_params, None, newK)
-            mask = torch.from_numpy(mask).bool()
-            if len(mask.shape) == 2:
-                mask = mask[:, :, None]
         newK[0, 2] = newK[0, 2] + 0.5
         newK[1, 2] = newK[1, 2] + 0.5
-        K = newK
+        return UndistortionMaps(K=newK, map1=map1, map2=map2)
+
     elif camera.camera_type.item() == CameraType.FISHEYE624.value:
         fisheye624_params = torch.cat(
             [camera.fx, camera.fy, camera.cx, camera.cy, torch.from_numpy(distortion_params)], dim=0
         )
         assert fisheye624_params.shape == (16,)
         assert (
-            "mask" not in data
-            and camera.metadata is not None
+            camera.metadata is not None
             and "fisheye_crop_radius" in camera.metadata
             and isinstance(camera.metadata["fisheye_crop_radius"], float)
         )
@@ -520,9 +727,6 @@ def _undistort_image(
         map1 = dist_uv[..., 1]
         map2 = dist_uv[..., 0]
 
-        # Use correspondence to undistort image.
-        image = cv2.remap(image, map1, map2, interpolation=cv2.INTER_LINEAR)
-
         # Compute undistorted mask as well.
         dist_h = camera.height.item()
         dist_w = camera.width.item()
@@ -544,8 +748,52 @@ def _undistort_image(
         if len(mask.shape) == 2:
             mask = mask[:, :, None]
         assert mask.shape == (undist_h, undist_w, 1)
-        K = undist_K.numpy()
+        return UndistortionMaps(K=undist_K.numpy(), map1=map1, map2=map2, mask=mask)
     else:
         raise NotImplementedError("Only perspective and fisheye cameras are supported")
 
-    return K, image, mask
+
+def apply_undistortion_maps(
+    maps: UndistortionMaps, data: dict, image: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, Optional[torch.Tensor]]:
+    """Undistorts an image (and its mask and depth image in `data`, if any) with precomputed remap tables.
+
+    Args:
+        maps: The remap tables of the camera the image was taken with.
+        data: The data of the image, the depth image is updated in place.
+        image: The image to undistort.
+
+    Returns:
+        The intrinsics of the undistorted image, the undistorted image, and its mask.
+    """
+    if maps.map1 is not None:
+        image = cv2.remap(image, maps.map1, maps.map2, interpolation=cv2.INTER_LINEAR)
+    mask = None
+    if maps.mask is not None:
+        assert "mask" not in data
+        mask = maps.mask.clone()
+    elif "mask" in data:
+        mask = data["mask"].numpy()
+        mask = mask.astype(np.uint8) * 255
+        if maps.map1 is not None:
+            mask = cv2.remap(mask, maps.map1, maps.map2, interpolation=cv2.INTER_LINEAR)
+    if maps.roi is not None:
+        # crop the image and update the intrinsics accordingly
+        x, y, w, h = maps.roi
+        image = image[y : y + h, x : x + w]
+        if "depth_image" in data:
+            data["depth_image"] = data["depth_image"][y : y + h, x : x + w]
+        if mask is not None:
+            mask = mask[y : y + h, x : x + w]
+    if isinstance(mask, np.ndarray):
+        mask = torch.from_numpy(mask).bool()
+        if len(mask.shape) == 2:
+            mask = mask[:, :, None]
+    return maps.K.copy(), image, mask
+
+
+def _undistort_image(
+    camera: Cameras, distortion_params: np.ndarray, data: dict, image: np.ndarray, K: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, Optional[torch.Tensor]]:
+    maps = get_undistortion_maps(camera, distortion_params, K)
+    return apply_undistortion_maps(maps, data, image)
@@ -19,12 +19,28 @@ Parallel data manager that generates training data in multiple python processes.
 from __future__ import annotations
 
 import concurrent.futures
-import queue
+import os
+import shutil
 import time
+import weakref
 from dataclasses import dataclass, field
 from functools import cached_property
 from pathlib import Path
-from typing import Dict, ForwardRef, Generic, List, Literal, Optional, Tuple, Type, Union, cast, get_args, get_origin
+from typing import (
+    Any,
+    Dict,
+    ForwardRef,
+    Generic,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    cast,
+    get_args,
+    get_origin,
+)
 
 import torch
 from pathos.helpers import mp
@@ -42,8 +58,18 @@ from nerfstudio.data.datamanagers.base_datamanager import (
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
 from nerfstudio.data.datasets.base_dataset import InputDataset
 from nerfstudio.data.pixel_samplers import PatchPixelSamplerConfig, PixelSampler, PixelSamplerConfig
+from nerfstudio.data.utils.compact_storage import expand_data, get_compact_collate_fn
 from nerfstudio.data.utils.dataloaders import CacheDataloader, FixedIndicesEvalDataloader, RandIndicesEvalDataloader
+from nerfstudio.data.utils.shared_tensors import (
+    SharedTensorHandle,
+    attach_tensors,
+    create_shared_tensor,
+    get_num_bytes,
+    get_shared_memory_dir,
+    share_tensors,
+)
 from nerfstudio.model_components.ray_generators import RayGenerator
+from nerfstudio.utils import writer
 from nerfstudio.utils.misc import get_orig_class
 from nerfstudio.utils.rich_utils import CONSOLE
 
@@ -57,10 +83,15 @@ class ParallelDataManagerConfig(VanillaDataManagerConfig):
     num_processes: int = 1
     """Number of processes to use for train data loading. More than 1 doesn't result in that much better performance"""
     queue_size: int = 2
-    """Size of shared data queue containing generated ray bundles and batches.
-    If queue_size <= 0, the queue size is infinite."""
+    """Number of batches each data process can prepare ahead of the trainer. Batches are written in place into a
+    ring of queue_size preallocated shared-memory slots per process and handed over by slot index.
+    If queue_size <= 0, the queue size is infinite and batches are pickled through the queue instead."""
     max_thread_workers: Optional[int] = None
     """Maximum number of threads to use in thread pool executor. If None, use ThreadPool default."""
+    share_images: bool = False
+    """If True, the training images are loaded once in the main process and shared read-only with every data
+    process through memory-mapped files (in /dev/shm when it has room), instead of each process loading its own
+    copy. Memory usage then no longer grows with num_processes."""
 
 
 class DataProcessor(mp.Process):  # type: ignore
@@ -75,6 +106,13 @@ class DataProcessor(mp.Process):  # type: ignore
         dataparser_outputs: outputs from the dataparser
         dataset: input dataset
         pixel_sampler: The pixel sampler for sampling rays
+        shared_img_data: Collated images shared by the main process, see `share_tensors`. If None, the process
+            loads the images itself.
+        worker_id: Index of this process, sent along with every batch.
+        free_slots: Semaphore counting the free slots of this process' batch ring. If None, batches are pickled
+            through the output queue instead.
+        slot_dir: Directory to create the batch ring slots in.
+        image_indices: Indices of the images to load when the process loads the images itself, all if None.
     """
 
     def __init__(
@@ -84,6 +122,11 @@ class DataProcessor(mp.Process):  # type: ignore
         dataparser_outputs: DataparserOutputs,
         dataset: TDataset,
         pixel_sampler: PixelSampler,
+        shared_img_data: Optional[Dict[str, Any]] = None,
+        worker_id: int = 0,
+        free_slots: Optional[Any] = None,
+        slot_dir: Optional[Path] = None,
+        image_indices: Optional[List[int]] = None,
     ):
         super().__init__()
         self.daemon = True
@@ -93,40 +136,114 @@ class DataProcessor(mp.Process):  # type: ignore
         self.dataset = dataset
         self.exclude_batch_keys_from_device = self.dataset.exclude_batch_keys_from_device
         self.pixel_sampler = pixel_sampler
-        self.ray_generator = RayGenerator(self.dataset.cameras)
+        self.ray_generator = RayGenerator(self.dataset.cameras, self.config.use_undistortion_maps)
+        self.shared_img_data = shared_img_data
+        self.worker_id = worker_id
+        self.free_slots = free_slots
+        self.slot_dir = slot_dir
+        self.image_indices = image_indices
 
     def run(self):
         """Append out queue in parallel with ray bundles and batches."""
-        self.cache_images()
-        while True:
-            batch = self.pixel_sampler.sample(self.img_data)
-            ray_indices = batch["indices"]
-            ray_bundle: RayBundle = self.ray_generator(ray_indices)
-            # check that GPUs are available
-            if torch.cuda.is_available():
-                ray_bundle = ray_bundle.pin_memory()
+        if self.shared_img_data is not None:
+            self.img_data = attach_tensors(self.shared_img_data)
+        else:
+            self.cache_images()
+        if self.free_slots is None:
             while True:
-                try:
-                    self.out_queue.put((ray_bundle, batch))
-                    break
-                except queue.Full:
-                    time.sleep(0.0001)
-                except Exception:
-                    CONSOLE.print_exception()
-                    CONSOLE.print("[bold red]Error: Error occurred in parallel datamanager queue.")
+                ray_bundle, batch = self.next_batch()
+                # check that GPUs are available
+                if torch.cuda.is_available():
+                    ray_bundle = ray_bundle.pin_memory()
+                self.out_queue.put((ray_bundle, batch))
+
+        assert self.slot_dir is not None
+        slots: Optional[List[List[torch.Tensor]]] = None
+        layout: List[Tuple[torch.Size, torch.dtype]] = []
+        num_produced = 0
+        while True:
+            ray_bundle, batch = self.next_batch()
+            tensors = _flatten_batch(ray_bundle, batch)
+            start = time.perf_counter()
+            self.free_slots.acquire()
+            producer_wait = time.perf_counter() - start
+
+            # Slots are consumed and released in order, so the next slot in the ring is the one freed.
+            slot_idx = num_produced % self.config.queue_size
+            num_produced += 1
+            handles: Optional[List[List[SharedTensorHandle]]] = None
+            payload: Optional[Tuple[RayBundle, Dict]] = None
+            if slots is None:
+                layout = [(t.shape, t.dtype) for t in tensors]
+                handles = [
+                    [create_shared_tensor(self.slot_dir, tuple(shape), dtype) for shape, dtype in layout]
+                    for _ in range(self.config.queue_size)
+                ]
+                slots = [[handle.attach(writable=True) for handle in slot] for slot in handles]
+                # The first batch also serves as the template to rebuild batches from slots.
+                payload = (ray_bundle, batch)
+            elif [(t.shape, t.dtype) for t in tensors] != layout:
+                # Doesn't fit in the preallocated slots, send it through the queue.
+                payload = (ray_bundle, batch)
+            else:
+                for slot_tensor, tensor in zip(slots[slot_idx], tensors):
+                    slot_tensor.copy_(tensor)
+            self.out_queue.put((self.worker_id, slot_idx, producer_wait, payload, handles))
+
+    def next_batch(self) -> Tuple[RayBundle, Dict]:
+        """Samples the next batch of rays."""
+        batch = self.pixel_sampler.sample(self.img_data)
+        batch = expand_data(batch, self.config.compact_storage)
+        ray_indices = batch["indices"]
+        ray_bundle: RayBundle = self.ray_generator(ray_indices)
+        return ray_bundle, batch
 
     def cache_images(self):
         """Caches all input images into a NxHxWx3 tensor."""
-        indices = range(len(self.dataset))
-        batch_list = []
-        results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.config.max_thread_workers) as executor:
-            for idx in indices:
-                res = executor.submit(self.dataset.__getitem__, idx)
-                results.append(res)
-            for res in track(results, description="Loading data batch", transient=False):
-                batch_list.append(res.result())
-        self.img_data = self.config.collate_fn(batch_list)
+        self.img_data = _load_collated_images(self.dataset, self.config, self.image_indices)
+
+
+def _flatten_batch(ray_bundle: RayBundle, batch: Dict) -> List[torch.Tensor]:
+    """Returns the tensors of a ray bundle and batch, in the order expected by `_unflatten_batch`."""
+    tensors: List[torch.Tensor] = []
+
+    def collect(x):
+        tensors.append(x)
+        return x
+
+    ray_bundle._apply_fn_to_fields(collect, custom_tensor_dims_fn=lambda k, v: collect(v))
+    tensors.extend(value for value in batch.values() if isinstance(value, torch.Tensor))
+    return tensors
+
+
+def _unflatten_batch(template: Tuple[RayBundle, Dict], tensors: List[torch.Tensor]) -> Tuple[RayBundle, Dict]:
+    """Rebuilds a ray bundle and batch with the structure of `template` from tensors given by `_flatten_batch`."""
+    template_ray_bundle, template_batch = template
+    tensor_iter = iter(tensors)
+    ray_bundle = template_ray_bundle._apply_fn_to_fields(
+        lambda x: next(tensor_iter), custom_tensor_dims_fn=lambda k, v: next(tensor_iter)
+    )
+    batch = {
+        key: next(tensor_iter) if isinstance(value, torch.Tensor) else value for key, value in template_batch.items()
+    }
+    return ray_bundle, batch
+
+
+def _load_collated_images(
+    dataset: InputDataset, config: ParallelDataManagerConfig, indices: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """Loads the images of the dataset with the given indices (all if None) in a thread pool and collates them."""
+    if indices is None:
+        indices = list(range(len(dataset)))
+    batch_list = []
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=config.max_thread_workers) as executor:
+        for idx in indices:
+            res = executor.submit(dataset.__getitem__, idx)
+            results.append(res)
+        for res in track(results, description="Loading data batch", transient=False):
+            batch_list.append(res.result())
+    return get_compact_collate_fn(config.collate_fn, config.compact_storage)(batch_list)
 
 
 class ParallelDataManager(DataManager, Generic[TDataset]):
@@ -241,17 +358,48 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
         """Sets up parallel python data processes for training."""
         assert self.train_dataset is not None
         self.train_pixel_sampler = self._get_pixel_sampler(self.train_dataset, self.config.train_num_rays_per_batch)  # type: ignore
-        self.data_queue = mp.Queue(maxsize=self.config.queue_size)  # type: ignore
-        self.data_procs = [
+        self.data_queue = mp.Queue()  # type: ignore
+        # Stops the data processes and removes their shared memory when the datamanager is garbage collected or
+        # the interpreter exits, whichever comes first.
+        self.data_procs: List[DataProcessor] = []
+        shared_memory_dirs: List[Path] = []
+        self._shutdown = weakref.finalize(
+            self, _shutdown_data_processes, os.getpid(), self.data_procs, shared_memory_dirs
+        )
+        if self.config.queue_size > 0:
+            self.slot_dir = get_shared_memory_dir()
+            shared_memory_dirs.append(self.slot_dir)
+            self.free_slots = [mp.Semaphore(self.config.queue_size) for _ in range(self.config.num_processes)]  # type: ignore
+        self.slots: Dict[int, List[List[torch.Tensor]]] = {}
+        self.slot_templates: Dict[int, Tuple[RayBundle, Dict]] = {}
+        self.held_slot: Optional[int] = None
+        self.queue_stats: Dict[str, float] = {}
+        train_shard = self.get_train_shard(len(self.train_dataset))
+        if self.config.shard_train_images and self.config.shard_rotation_interval > 0:
+            CONSOLE.print("[bold yellow]Warning: train shards don't rotate with the parallel datamanager.")
+        shared_img_data = None
+        if self.config.share_images:
+            CONSOLE.print("Loading training images to share with the data processes...")
+            img_data = _load_collated_images(self.train_dataset, self.config, train_shard)
+            self.shared_image_dir = get_shared_memory_dir(get_num_bytes(img_data))
+            shared_memory_dirs.append(self.shared_image_dir)
+            shared_img_data = share_tensors(img_data, self.shared_image_dir)
+            del img_data
+        self.data_procs.extend(
             DataProcessor(
                 out_queue=self.data_queue,  # type: ignore
                 config=self.config,
                 dataparser_outputs=self.train_dataparser_outputs,
                 dataset=self.train_dataset,
                 pixel_sampler=self.train_pixel_sampler,
+                shared_img_data=shared_img_data,
+                worker_id=i,
+                free_slots=self.free_slots[i] if self.config.queue_size > 0 else None,
+                slot_dir=self.slot_dir if self.config.queue_size > 0 else None,
+                image_indices=train_shard,
             )
             for i in range(self.config.num_processes)
-        ]
+        )
         for proc in self.data_procs:
             proc.start()
         print("Started threads")
@@ -267,12 +415,14 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
             device=self.device,
             num_workers=self.world_size * 4,
             pin_memory=True,
-            collate_fn=self.config.collate_fn,
+            collate_fn=get_compact_collate_fn(self.config.collate_fn, self.config.compact_storage),
             exclude_batch_keys_from_device=self.exclude_batch_keys_from_device,
         )
         self.iter_eval_image_dataloader = iter(self.eval_image_dataloader)
         self.eval_pixel_sampler = self._get_pixel_sampler(self.eval_dataset, self.config.eval_num_rays_per_batch)  # type: ignore
-        self.eval_ray_generator = RayGenerator(self.eval_dataset.cameras.to(self.device))
+        self.eval_ray_generator = RayGenerator(
+            self.eval_dataset.cameras.to(self.device), self.config.use_undistortion_maps
+        )
         # for loading full images
         self.fixed_indices_eval_dataloader = FixedIndicesEvalDataloader(
             input_dataset=self.eval_dataset,
@@ -288,7 +438,42 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
     def next_train(self, step: int) -> Tuple[RayBundle, Dict]:
         """Returns the next batch of data from the parallel training processes."""
         self.train_count += 1
-        bundle, batch = self.data_queue.get()
+        if self.config.queue_size <= 0:
+            bundle, batch = self.data_queue.get()
+            ray_bundle = bundle.to(self.device)
+            return ray_bundle, batch
+
+        # The slot handed out by the previous call is no longer in use, let its process refill it.
+        if self.held_slot is not None:
+            self.free_slots[self.held_slot].release()
+            self.held_slot = None
+        try:
+            queue_depth = float(self.data_queue.qsize())
+        except NotImplementedError:  # not available on macOS
+            queue_depth = float("nan")
+        start = time.perf_counter()
+        worker_id, slot_idx, producer_wait, payload, handles = self.data_queue.get()
+        consumer_wait = time.perf_counter() - start
+
+        if handles is not None:
+            self.slots[worker_id] = [[handle.attach(writable=True) for handle in slot] for slot in handles]
+            self.slot_templates[worker_id] = payload
+        if payload is not None:
+            bundle, batch = payload
+            self.free_slots[worker_id].release()
+        else:
+            bundle, batch = _unflatten_batch(self.slot_templates[worker_id], self.slots[worker_id][slot_idx])
+            self.held_slot = worker_id
+
+        self.queue_stats = {
+            "queue_depth": queue_depth,
+            "producer_wait_ms": producer_wait * 1000.0,
+            "consumer_wait_ms": consumer_wait * 1000.0,
+        }
+        if writer.is_initialized():
+            writer.put_scalar(name="Data Queue/Depth", scalar=queue_depth, step=step)
+            writer.put_time(name="Data Queue/Producer Wait (ms)", duration=producer_wait * 1000.0, step=step)
+            writer.put_time(name="Data Queue/Consumer Wait (ms)", duration=consumer_wait * 1000.0, step=step)
         ray_bundle = bundle.to(self.device)
         return ray_bundle, batch
 
@@ -299,6 +484,7 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
         assert self.eval_pixel_sampler is not None
         assert isinstance(image_batch, dict)
         batch = self.eval_pixel_sampler.sample(image_batch)
+        batch = expand_data(batch, self.config.compact_storage)
         ray_indices = batch["indices"]
         ray_bundle = self.eval_ray_generator(ray_indices)
         return ray_bundle, batch
@@ -333,9 +519,20 @@ class ParallelDataManager(DataManager, Generic[TDataset]):
         """
         return {}
 
-    def __del__(self):
-        """Clean up the parallel data processes."""
-        if hasattr(self, "data_procs"):
-            for proc in self.data_procs:
-                proc.terminate()
-                proc.join()
+    def shutdown(self) -> None:
+        """Stops the data processes and removes their shared memory."""
+        if hasattr(self, "_shutdown"):
+            self._shutdown()
+
+
+def _shutdown_data_processes(owner_pid: int, data_procs: List[DataProcessor], shared_memory_dirs: List[Path]) -> None:
+    """Stops data processes and removes the directories of the memory they shared, from the process that started
+    them only (forked processes inherit the finalizers of their parent)."""
+    if os.getpid() != owner_pid:
+        return
+    for proc in data_procs:
+        if proc.is_alive():
+            proc.terminate()
+            proc.join()
+    for directory in shared_memory_dirs:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -30,6 +30,7 @@ import nerfstudio.configs.base_config as cfg
 from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.configs.config_utils import to_immutable_dict
 from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.utils.rich_utils import CONSOLE
 
 
 @dataclass
@@ -119,6 +120,9 @@ class DataParserConfig(cfg.InstantiateConfig):
     """_target: target class to instantiate"""
     data: Path = Path()
     """Directory specifying location of data."""
+    outputs_cache_dir: Optional[Path] = None
+    """If set, the dataparser outputs are saved to this directory and loaded back on later runs, as long as the
+    config and the input files of the dataparser are unchanged."""
 
 
 @dataclass
@@ -162,7 +166,26 @@ class DataParser:
         Returns:
             DataparserOutputs containing data for the specified dataset and split
         """
+        if self.config.outputs_cache_dir is None:
+            return self._generate_dataparser_outputs(split, **kwargs)
+
+        from nerfstudio.data.utils import dataparser_cache
+
+        snapshot_key = dataparser_cache.get_snapshot_key(self, split, kwargs)
+        snapshot_path = Path(self.config.outputs_cache_dir) / f"{snapshot_key}.pt"
+        snapshot = dataparser_cache.load_snapshot(snapshot_path, self.config.data)
+        if snapshot is not None:
+            dataparser_outputs, state = snapshot
+            vars(self).update(state)
+            CONSOLE.log(f"Loaded {split} dataparser outputs from {snapshot_path}")
+            return dataparser_outputs
+
         dataparser_outputs = self._generate_dataparser_outputs(split, **kwargs)
+        state = {name: value for name, value in vars(self).items() if name != "config"}
+        try:
+            dataparser_cache.save_snapshot(snapshot_path, self.config.data, dataparser_outputs, state)
+        except Exception as e:  # pylint: disable=broad-except
+            CONSOLE.print(f"[bold yellow]Warning: could not save dataparser outputs to {snapshot_path}: {e}")
         return dataparser_outputs
 
 
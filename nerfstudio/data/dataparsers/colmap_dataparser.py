@@ -15,7 +15,6 @@
 
 from __future__ import annotations
 
-import math
 import sys
 from dataclasses import dataclass, field
 from functools import partial
@@ -32,6 +31,7 @@ from nerfstudio.cameras.cameras import CAMERA_MODEL_TO_TYPE, Cameras
 from nerfstudio.data.dataparsers.base_dataparser import DataParser, DataParserConfig, DataparserOutputs
 from nerfstudio.data.scene_box import SceneBox
 from nerfstudio.data.utils import colmap_parsing_utils as colmap_utils
+from nerfstudio.data.utils.data_utils import downscale_image_files
 from nerfstudio.data.utils.dataparsers_utils import (
     get_train_eval_split_all,
     get_train_eval_split_filename,
@@ -40,7 +40,6 @@ from nerfstudio.data.utils.dataparsers_utils import (
 )
 from nerfstudio.process_data.colmap_utils import parse_colmap_camera_params
 from nerfstudio.utils.rich_utils import CONSOLE, status
-from nerfstudio.utils.scripts import run_command
 
 MAX_AUTO_RESOLUTION = 1600
 
@@ -393,12 +392,14 @@ class ColmapDataParser(DataParser):
 
     def _load_3D_points(self, colmap_path: Path, transform_matrix: torch.Tensor, scale_factor: float):
         if (colmap_path / "points3D.bin").exists():
-            colmap_points = colmap_utils.read_points3D_binary(colmap_path / "points3D.bin")
+            colmap_points = colmap_utils.read_points3D_binary_columns(colmap_path / "points3D.bin")
         elif (colmap_path / "points3D.txt").exists():
-            colmap_points = colmap_utils.read_points3D_text(colmap_path / "points3D.txt")
+            colmap_points = colmap_utils.points3D_to_point3D_columns(
+                colmap_utils.read_points3D_text(colmap_path / "points3D.txt")
+            )
         else:
             raise ValueError(f"Could not find points3D.txt or points3D.bin in {colmap_path}")
-        points3D = torch.from_numpy(np.array([p.xyz for p in colmap_points.values()], dtype=np.float32))
+        points3D = torch.from_numpy(colmap_points.xyz.astype(np.float32))
         points3D = (
             torch.cat(
                 (
@@ -412,49 +413,52 @@ class ColmapDataParser(DataParser):
         points3D *= scale_factor
 
         # Load point colours
-        points3D_rgb = torch.from_numpy(np.array([p.rgb for p in colmap_points.values()], dtype=np.uint8))
-        points3D_num_points = torch.tensor([len(p.image_ids) for p in colmap_points.values()], dtype=torch.int64)
+        points3D_rgb = torch.from_numpy(colmap_points.rgb.astype(np.uint8))
+        track_lengths = np.diff(colmap_points.track_offsets)
+        points3D_num_points = torch.from_numpy(track_lengths.astype(np.int64))
         out = {
             "points3D_xyz": points3D,
             "points3D_rgb": points3D_rgb,
-            "points3D_error": torch.from_numpy(np.array([p.error for p in colmap_points.values()], dtype=np.float32)),
+            "points3D_error": torch.from_numpy(colmap_points.error.astype(np.float32)),
             "points3D_num_points2D": points3D_num_points,
         }
         if self.config.max_2D_matches_per_3D_point != 0:
             if (colmap_path / "images.txt").exists():
-                im_id_to_image = colmap_utils.read_images_text(colmap_path / "images.txt")
+                images = colmap_utils.images_to_image_columns(colmap_utils.read_images_text(colmap_path / "images.txt"))
             elif (colmap_path / "images.bin").exists():
-                im_id_to_image = colmap_utils.read_images_binary(colmap_path / "images.bin")
+                images = colmap_utils.read_images_binary_columns(colmap_path / "images.bin")
             else:
                 raise ValueError(f"Could not find images.txt or images.bin in {colmap_path}")
             downscale_factor = self._downscale_factor
-            max_num_points = int(torch.max(points3D_num_points).item())
+            num_matches = track_lengths
             if self.config.max_2D_matches_per_3D_point > 0:
-                max_num_points = min(max_num_points, self.config.max_2D_matches_per_3D_point)
-            points3D_image_ids = []
-            points3D_image_xy = []
-            for p in colmap_points.values():
-                nids = np.array(p.image_ids, dtype=np.int64)
-                nxy_ids = np.array(p.point2D_idxs, dtype=np.int32)
-                if self.config.max_2D_matches_per_3D_point != -1:
-                    # Randomly sample 2D matches
-                    idxs = np.argsort(p.error)[: self.config.max_2D_matches_per_3D_point]
-                    nids = nids[idxs]
-                    nxy_ids = nxy_ids[idxs]
-                nxy = [im_id_to_image[im_id].xys[pt_idx] for im_id, pt_idx in zip(nids, nxy_ids)]
-                nxy = torch.from_numpy(np.stack(nxy).astype(np.float32))
-                nids = torch.from_numpy(nids)
-                assert len(nids.shape) == 1
-                assert len(nxy.shape) == 2
-                points3D_image_ids.append(
-                    torch.cat((nids, torch.full((max_num_points - len(nids),), -1, dtype=torch.int64)))
-                )
-                points3D_image_xy.append(
-                    torch.cat((nxy, torch.full((max_num_points - len(nxy), nxy.shape[-1]), 0, dtype=torch.float32)))
-                    / downscale_factor
-                )
-            out["points3D_image_ids"] = torch.stack(points3D_image_ids, dim=0)
-            out["points3D_points2D_xy"] = torch.stack(points3D_image_xy, dim=0)
+                # All observations of a point share its reprojection error, keep the first ones.
+                num_matches = np.minimum(num_matches, self.config.max_2D_matches_per_3D_point)
+            max_num_points = int(num_matches.max()) if len(num_matches) > 0 else 0
+
+            # Flat (point, slot) coordinates of the kept observations, and their index in the track arrays.
+            point_idxs = np.repeat(np.arange(len(num_matches)), num_matches)
+            slot_idxs = np.arange(len(point_idxs)) - np.repeat(np.cumsum(num_matches) - num_matches, num_matches)
+            track_idxs = colmap_points.track_offsets[point_idxs] + slot_idxs
+            nids = colmap_points.track_image_ids[track_idxs].astype(np.int64)
+
+            # Look up the 2D coordinates of the observations in the image that made them.
+            image_id_to_row = np.full(int(images.ids.max(initial=0)) + 1, -1, dtype=np.int64)
+            image_id_to_row[images.ids] = np.arange(len(images.ids))
+            known = (nids >= 0) & (nids < len(image_id_to_row))
+            known[known] = image_id_to_row[nids[known]] >= 0
+            if not known.all():
+                missing_ids = np.unique(nids[~known])[:10].tolist()
+                raise ValueError(f"3D points in {colmap_path} are observed by images missing from it: {missing_ids}")
+            point2D_idxs = images.points2D_offsets[image_id_to_row[nids]] + colmap_points.track_point2D_idxs[track_idxs]
+            nxy = images.xys[point2D_idxs].astype(np.float32)
+
+            points3D_image_ids = torch.full((len(num_matches), max_num_points), -1, dtype=torch.int64)
+            points3D_image_xy = torch.zeros((len(num_matches), max_num_points, 2), dtype=torch.float32)
+            points3D_image_ids[point_idxs, slot_idxs] = torch.from_numpy(nids)
+            points3D_image_xy[point_idxs, slot_idxs] = torch.from_numpy(nxy)
+            out["points3D_image_ids"] = points3D_image_ids
+            out["points3D_points2D_xy"] = points3D_image_xy / downscale_factor
         return out
 
     def _downscale_images(
@@ -462,39 +466,19 @@ class ColmapDataParser(DataParser):
         paths,
         get_fname,
         downscale_factor: int,
-        downscale_rounding_mode: str = "floor",
+        downscale_rounding_mode: Literal["floor", "round", "ceil"] = "floor",
         nearest_neighbor: bool = False,
     ):
-        def calculate_scaled_size(original_width, original_height, downscale_factor, mode="floor"):
-            if mode == "floor":
-                return math.floor(original_width / downscale_factor), math.floor(original_height / downscale_factor)
-            elif mode == "round":
-                return round(original_width / downscale_factor), round(original_height / downscale_factor)
-            elif mode == "ceil":
-                return math.ceil(original_width / downscale_factor), math.ceil(original_height / downscale_factor)
-            else:
-                raise ValueError("Invalid mode. Choose from 'floor', 'round', or 'ceil'.")
-
         with status(msg="[bold yellow]Downscaling images...", spinner="growVertical"):
             assert downscale_factor > 1
             assert isinstance(downscale_factor, int)
-            # Using %05d ffmpeg commands appears to be unreliable (skips images).
-            for path in paths:
-                # Compute image-wise rescaled width/height.
-                img = Image.open(path)
-                w, h = img.size
-                w_scaled, h_scaled = calculate_scaled_size(w, h, downscale_factor, downscale_rounding_mode)
-                # Downscale images using ffmpeg.
-                nn_flag = "" if not nearest_neighbor else ":flags=neighbor"
-                path_out = get_fname(path)
-                path_out.parent.mkdir(parents=True, exist_ok=True)
-                ffmpeg_cmd = [
-                    f'ffmpeg -y -noautorotate -i "{path}" ',
-                    f"-q:v 2 -vf scale={w_scaled}:{h_scaled}{nn_flag} ",
-                    f'"{path_out}"',
-                ]
-                ffmpeg_cmd = " ".join(ffmpeg_cmd)
-                run_command(ffmpeg_cmd)
+            downscale_image_files(
+                paths,
+                lambda path, _: get_fname(path),
+                [downscale_factor],
+                nearest_neighbor=nearest_neighbor,
+                rounding_mode=downscale_rounding_mode,
+            )
 
         CONSOLE.log("[bold green]:tada: Done downscaling images.")
 
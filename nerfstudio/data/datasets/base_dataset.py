@@ -20,7 +20,7 @@ from __future__ import annotations
 
 from copy import deepcopy
 from pathlib import Path
-from typing import Dict, List, Literal
+from typing import Dict, List, Literal, Optional
 
 import numpy as np
 import numpy.typing as npt
@@ -32,7 +32,8 @@ from torch.utils.data import Dataset
 
 from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
-from nerfstudio.data.utils.data_utils import get_image_mask_tensor_from_path
+from nerfstudio.data.utils.data_utils import get_image_mask_tensor_from_path, resize_image
+from nerfstudio.data.utils.image_cache import DecodedImageCache
 
 
 class InputDataset(Dataset):
@@ -45,6 +46,8 @@ class InputDataset(Dataset):
 
     exclude_batch_keys_from_device: List[str] = ["image", "mask"]
     cameras: Cameras
+    image_cache: Optional[DecodedImageCache] = None
+    """If set, decoded images are read from and written to this on-disk cache."""
 
     def __init__(self, dataparser_outputs: DataparserOutputs, scale_factor: float = 1.0):
         super().__init__()
@@ -66,11 +69,21 @@ class InputDataset(Dataset):
             image_idx: The image index in the dataset.
         """
         image_filename = self._dataparser_outputs.image_filenames[image_idx]
+        if self.image_cache is not None:
+            return self.image_cache.get_or_load(image_filename, self.scale_factor, self._read_numpy_image)
+        return self._read_numpy_image(image_filename)
+
+    def _read_numpy_image(self, image_filename: Path) -> npt.NDArray[np.uint8]:
+        """Decodes and rescales an image file into an array of shape (H, W, 3 or 4).
+
+        Args:
+            image_filename: Path to the image file.
+        """
         pil_image = Image.open(image_filename)
         if self.scale_factor != 1.0:
             width, height = pil_image.size
             newsize = (int(width * self.scale_factor), int(height * self.scale_factor))
-            pil_image = pil_image.resize(newsize, resample=Image.Resampling.BILINEAR)
+            pil_image = resize_image(pil_image, newsize, resample=Image.Resampling.BILINEAR)
         image = np.array(pil_image, dtype="uint8")  # shape is (h, w) or (h, w, 3 or 4)
         if len(image.shape) == 2:
             image = image[:, :, None].repeat(3, axis=2)
@@ -16,18 +16,18 @@
 Depth dataset.
 """
 
-import json
 from pathlib import Path
-from typing import Dict, Union
+from typing import Dict, Optional, Tuple
 
 import numpy as np
 import torch
 from PIL import Image
-from rich.progress import track
+from torch import Tensor
 
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
 from nerfstudio.data.datasets.base_dataset import InputDataset
 from nerfstudio.data.utils.data_utils import get_depth_image_from_path
+from nerfstudio.data.utils.depth_cache import DepthEstimator, PseudoDepthCache, get_pseudo_depth_cache_dir
 from nerfstudio.model_components import losses
 from nerfstudio.utils.misc import torch_compile
 from nerfstudio.utils.rich_utils import CONSOLE
@@ -41,6 +41,8 @@ class DepthDataset(InputDataset):
         scale_factor: The scaling factor for the dataparser outputs.
     """
 
+    depth_cache: Optional[PseudoDepthCache] = None
+
     def __init__(self, dataparser_outputs: DataparserOutputs, scale_factor: float = 1.0):
         super().__init__(dataparser_outputs, scale_factor)
         # if there are no depth images than we want to generate them all with zoe depth
@@ -53,48 +55,26 @@ class DepthDataset(InputDataset):
             CONSOLE.print("[bold yellow] No depth data found! Generating pseudodepth...")
             losses.FORCE_PSEUDODEPTH_LOSS = True
             CONSOLE.print("[bold red] Using psueodepth: forcing depth loss to be ranking loss.")
-            cache = dataparser_outputs.image_filenames[0].parent / "depths.npy"
-            # Note: this should probably be saved to disk as images, and then loaded with the dataparser.
-            #  That will allow multi-gpu training.
-            if cache.exists():
+            legacy_cache = dataparser_outputs.image_filenames[0].parent / "depths.npy"
+            if legacy_cache.exists():
                 CONSOLE.print("[bold yellow] Loading pseudodata depth from cache!")
-                # load all the depths
-                self.depths = np.load(cache)
-                self.depths = torch.from_numpy(self.depths).to(device)
+                self.depths = torch.from_numpy(np.load(legacy_cache)).to(device)
             else:
-                depth_tensors = []
-                transforms = self._find_transform(dataparser_outputs.image_filenames[0])
-                data = dataparser_outputs.image_filenames[0].parent
-                if transforms is not None:
-                    meta = json.load(open(transforms, "r"))
-                    frames = meta["frames"]
-                    filenames = [data / frames[j]["file_path"].split("/")[-1] for j in range(len(frames))]
-                else:
-                    meta = None
-                    frames = None
-                    filenames = dataparser_outputs.image_filenames
-
-                repo = "isl-org/ZoeDepth"
-                self.zoe = torch_compile(torch.hub.load(repo, "ZoeD_NK", pretrained=True).to(device))
-
-                for i in track(range(len(filenames)), description="Generating depth images"):
-                    image_filename = filenames[i]
-                    pil_image = Image.open(image_filename)
-                    image = np.array(pil_image, dtype="uint8")  # shape is (h, w) or (h, w, 3 or 4)
-                    if len(image.shape) == 2:
-                        image = image[:, :, None].repeat(3, axis=2)
-                    image = torch.from_numpy(image.astype("float32") / 255.0)
-
-                    with torch.no_grad():
-                        image = torch.permute(image, (2, 0, 1)).unsqueeze(0).to(device)
-                        if image.shape[1] == 4:
-                            image = image[:, :3, :, :]
-                        depth_tensor = self.zoe.infer(image).squeeze().unsqueeze(-1)
-
-                    depth_tensors.append(depth_tensor)
-
-                self.depths = torch.stack(depth_tensors)
-                np.save(cache, self.depths.cpu().numpy())
+                # One cache per list of images, in which each depth map is written as soon as it is estimated.
+                self.depth_cache = PseudoDepthCache(
+                    get_pseudo_depth_cache_dir(
+                        dataparser_outputs.image_filenames[0].parent / "pseudodepth",
+                        dataparser_outputs.image_filenames,
+                        self.scale_factor,
+                    ),
+                    image_shapes=[self._get_image_shape(filename) for filename in self.image_filenames],
+                )
+                if not self.depth_cache.is_complete():
+                    if len(self.depth_cache.missing_indices) < len(self.depth_cache):
+                        CONSOLE.print("[bold yellow] Resuming pseudodepth generation from cache!")
+                    self.depth_cache.generate(
+                        lambda idx: self.get_image_float32(idx)[..., :3], self.get_depth_estimator(device)
+                    )
             dataparser_outputs.metadata["depth_filenames"] = None
             dataparser_outputs.metadata["depth_unit_scale_factor"] = 1.0
             self.metadata["depth_filenames"] = None
@@ -103,8 +83,32 @@ class DepthDataset(InputDataset):
         self.depth_filenames = self.metadata["depth_filenames"]
         self.depth_unit_scale_factor = self.metadata["depth_unit_scale_factor"]
 
+    def get_depth_estimator(self, device: torch.device) -> DepthEstimator:
+        """Returns the depth estimator used to generate pseudodepth when the dataset has no depth images.
+        Uses ZoeDepth, subclasses can override it to use another model.
+
+        Args:
+            device: Device to run the estimator on.
+        """
+        zoe = torch_compile(torch.hub.load("isl-org/ZoeDepth", "ZoeD_NK", pretrained=True).to(device))
+
+        def estimate_depth(image: Tensor) -> Tensor:
+            image = torch.permute(image, (2, 0, 1)).unsqueeze(0).to(device)
+            return zoe.infer(image).squeeze().unsqueeze(-1)
+
+        return estimate_depth
+
+    def _get_image_shape(self, image_filename: Path) -> Tuple[int, int]:
+        """Returns the (height, width) of an image as loaded by the dataset, without decoding it."""
+        width, height = Image.open(image_filename).size
+        if self.scale_factor != 1.0:
+            width, height = int(width * self.scale_factor), int(height * self.scale_factor)
+        return height, width
+
     def get_metadata(self, data: Dict) -> Dict:
         if self.depth_filenames is None:
+            if self.depth_cache is not None:
+                return {"depth_image": self.depth_cache.get(data["image_idx"])}
             return {"depth_image": self.depths[data["image_idx"]]}
 
         filepath = self.depth_filenames[data["image_idx"]]
@@ -118,11 +122,3 @@ class DepthDataset(InputDataset):
         )
 
         return {"depth_image": depth_image}
-
-    def _find_transform(self, image_path: Path) -> Union[Path, None]:
-        while image_path.parent != image_path:
-            transform_path = image_path.parent / "transforms.json"
-            if transform_path.exists():
-                return transform_path
-            image_path = image_path.parent
-        return None
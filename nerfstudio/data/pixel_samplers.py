@@ -16,17 +16,23 @@
 Code for sampling pixels.
 """
 
-import random
+import math
 import warnings
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Type, Union
+from typing import Dict, List, Optional, Tuple, Type, Union
 
 import torch
-from jaxtyping import Int
+from jaxtyping import Bool, Float, Int
 from torch import Tensor
 
 from nerfstudio.configs.base_config import InstantiateConfig
-from nerfstudio.data.utils.pixel_sampling_utils import divide_rays_per_image, erode_mask
+from nerfstudio.data.utils.pixel_sampling_utils import (
+    PackedImages,
+    divide_rays_per_image,
+    erode_mask,
+    gather_pixels,
+    pack_images,
+)
 
 
 @dataclass
@@ -69,6 +75,12 @@ class PixelSampler:
         self.config.is_equirectangular = self.kwargs.get("is_equirectangular", self.config.is_equirectangular)
         self.config.fisheye_crop_radius = self.kwargs.get("fisheye_crop_radius", self.config.fisheye_crop_radius)
         self.set_num_rays_per_batch(self.config.num_rays_per_batch)
+        self._packed_images: Optional[PackedImages] = None
+        self._packed_images_source: Optional[List[Tensor]] = None
+        self._valid_pixels: Dict[int, Tensor] = {}
+        self._valid_pixels_key: Optional[Tuple] = None
+        # Reference to the mask of the cached indices, which keeps its memory from being reused by another mask
+        self._valid_pixels_mask: Optional[Tensor] = None
 
     def set_num_rays_per_batch(self, num_rays_per_batch: int):
         """Set the number of rays to sample per batch.
@@ -78,6 +90,57 @@ class PixelSampler:
         """
         self.num_rays_per_batch = num_rays_per_batch
 
+    def get_valid_pixels(self, mask: Tensor, pixel_radius: int = 0) -> Tensor:
+        """Returns the flat indices of the pixels inside a mask, computed once per mask.
+
+        The indices are cached on the memory, layout and version of the mask, so views of the same mask reuse them
+        and in-place changes to the mask recompute them.
+
+        Args:
+            mask: mask of shape (num_images, image_height, image_width, 1).
+            pixel_radius: if > 0, the mask is first eroded by this many pixels, see `erode_mask`.
+        """
+        key = (mask.device, mask.data_ptr(), tuple(mask.shape), mask.stride(), mask._version)
+        if self._valid_pixels_key != key:
+            self._valid_pixels = {}
+            self._valid_pixels_key = key
+            self._valid_pixels_mask = mask
+        if pixel_radius not in self._valid_pixels:
+            if pixel_radius > 0:
+                valid = erode_mask(mask.permute(0, 3, 1, 2).float(), pixel_radius=pixel_radius)[:, 0]
+            else:
+                valid = mask[..., 0]
+            valid_pixels = torch.nonzero(valid.reshape(-1), as_tuple=False)[:, 0]
+            if valid.numel() < torch.iinfo(torch.int32).max:
+                valid_pixels = valid_pixels.int()  # halves the memory of the index
+            self._valid_pixels[pixel_radius] = valid_pixels
+        return self._valid_pixels[pixel_radius]
+
+    def sample_valid_pixels(
+        self,
+        batch_size: int,
+        mask: Tensor,
+        pixel_radius: int = 0,
+        device: Union[torch.device, str] = "cpu",
+    ) -> Int[Tensor, "batch_size 3"]:
+        """Uniformly samples pixels inside a mask with a single vectorized draw.
+
+        Args:
+            batch_size: number of samples in a batch
+            mask: mask of shape (num_images, image_height, image_width, 1).
+            pixel_radius: if > 0, only samples pixels at least this far from the mask border.
+        """
+        valid_pixels = self.get_valid_pixels(mask, pixel_radius=pixel_radius)
+        if len(valid_pixels) == 0:
+            raise ValueError("Cannot sample pixels, the mask is empty.")
+        _, image_height, image_width, _ = mask.shape
+        chosen = valid_pixels[torch.randint(0, len(valid_pixels), (batch_size,), device=valid_pixels.device)].long()
+        c = torch.div(chosen, image_height * image_width, rounding_mode="floor")
+        chosen = chosen - c * image_height * image_width
+        y = torch.div(chosen, image_width, rounding_mode="floor")
+        x = chosen - y * image_width
+        return torch.stack([c, y, x], dim=-1).to(device)
+
     def sample_method(
         self,
         batch_size: int,
@@ -126,13 +189,9 @@ class PixelSampler:
                         """
                     )
                     self.config.rejection_sample_mask = False
-                    nonzero_indices = torch.nonzero(mask[..., 0], as_tuple=False)
-                    chosen_indices = random.sample(range(len(nonzero_indices)), k=batch_size)
-                    indices = nonzero_indices[chosen_indices]
+                    indices = self.sample_valid_pixels(batch_size, mask, device=device)
             else:
-                nonzero_indices = torch.nonzero(mask[..., 0], as_tuple=False)
-                chosen_indices = random.sample(range(len(nonzero_indices)), k=batch_size)
-                indices = nonzero_indices[chosen_indices]
+                indices = self.sample_valid_pixels(batch_size, mask, device=device)
 
         return indices
 
@@ -284,15 +343,20 @@ class PixelSampler:
         Does the same as collate_image_dataset_batch, except it will operate over a list of images / masks inside
         a list.
 
-        We will use this with the intent of DEPRECIATING it as soon as we find a viable alternative.
-        The intention will be to replace this with a more efficient implementation that doesn't require a for loop, but
-        since pytorch's ragged tensors are still in beta (this would allow for some vectorization), this will do.
+        The images are laid out once in a flat pixel index space (see `pack_images`), the pixels of all images are
+        then drawn in a single vectorized pass and gathered from the images where they are stored. Samplers overriding `sample_method` or
+        `sample_method_equirectangular` fall back to sampling each image separately.
 
         Args:
             batch: batch of images to sample from
             num_rays_per_batch: number of rays to sample per batch
             keep_full_image: whether or not to include a reference to the full image in returned batch
         """
+        if (
+            type(self).sample_method is PixelSampler.sample_method
+            and type(self).sample_method_equirectangular is PixelSampler.sample_method_equirectangular
+        ):
+            return self._collate_packed_image_batch_list(batch, num_rays_per_batch, keep_full_image)
 
         device = batch["image"][0].device
         num_images = len(batch["image"])
@@ -355,6 +419,75 @@ class PixelSampler:
 
         return collated_batch
 
+    def _get_packed_images(self, batch: Dict) -> PackedImages:
+        """Returns the layout of the images of a batch, computing it only once per image batch."""
+        if self._packed_images is None or self._packed_images_source is not batch["image"]:
+            use_mask = "mask" in batch and not self.config.ignore_mask
+            self._packed_images = pack_images(batch["image"], mask=batch["mask"] if use_mask else None)
+            self._packed_images_source = batch["image"]
+            if self._packed_images.valid_counts is not None and (self._packed_images.valid_counts == 0).any():
+                raise ValueError("Cannot sample pixels from an image with an empty mask.")
+        return self._packed_images
+
+    def _collate_packed_image_batch_list(self, batch: Dict, num_rays_per_batch: int, keep_full_image: bool = False):
+        """Vectorized implementation of collate_image_dataset_batch_list for the default sampling methods."""
+        device = batch["image"][0].device
+        num_images = len(batch["image"])
+        packed = self._get_packed_images(batch)
+
+        assert num_rays_per_batch % 2 == 0, "num_rays_per_batch must be divisible by 2"
+        num_rays_per_image = divide_rays_per_image(num_rays_per_batch, num_images)
+        c = torch.repeat_interleave(
+            torch.arange(num_images, device=device), torch.tensor(num_rays_per_image, device=device)
+        )
+        widths = packed.widths[c]
+
+        if packed.valid_pixels is not None:
+            # Uniformly sample among the valid pixels of each image.
+            assert packed.valid_offsets is not None and packed.valid_counts is not None
+            valid_counts = packed.valid_counts[c]
+            chosen = (torch.rand(num_rays_per_batch, device=device) * valid_counts).long()
+            chosen = torch.minimum(chosen, valid_counts - 1)
+            flat_indices = packed.valid_pixels[packed.valid_offsets[c] + chosen]
+            image_indices = flat_indices - packed.offsets[c]
+            y = torch.div(image_indices, widths, rounding_mode="floor")
+            x = image_indices - y * widths
+        else:
+            rows = torch.rand(num_rays_per_batch, device=device)
+            if self.config.is_equirectangular:
+                # Sample phi in [0, pi] according to the PDF f(phi) = sin(phi) / 2, see sample_method_equirectangular.
+                rows = torch.acos(1 - 2 * rows) / torch.pi
+            y = torch.clamp((rows * packed.heights[c]).long(), max=packed.heights[c] - 1)
+            x = (torch.rand(num_rays_per_batch, device=device) * widths).long()
+
+        collated_batch = {
+            key: value[c, y, x]
+            for key, value in batch.items()
+            if key not in ("image_idx", "image", "mask", "depth_image") and value is not None
+        }
+        for key in ("image", "depth_image"):
+            if key in batch:
+                collated_batch[key] = gather_pixels(batch[key], num_rays_per_image, y, x)
+
+        assert collated_batch["image"].shape[0] == num_rays_per_batch
+
+        # Needed to correct the random indices to their actual camera idx locations.
+        indices = torch.stack([batch["image_idx"][c].to(device), y, x], dim=-1)
+        collated_batch["indices"] = indices  # with the abs camera indices
+
+        if keep_full_image:
+            collated_batch["full_image"] = batch["image"]
+
+        return collated_batch
+
+    def update(self, pixel_batch: Dict, model_outputs: Dict) -> None:
+        """Updates the sampler with the model outputs for a pixel batch it returned. Does nothing by default.
+
+        Args:
+            pixel_batch: batch returned by `sample`
+            model_outputs: outputs of the model for the rays of the batch
+        """
+
     def sample(self, image_batch: Dict):
         """Sample an image batch and return a pixel batch.
 
@@ -421,10 +554,7 @@ class PatchPixelSampler(PixelSampler):
         if isinstance(mask, Tensor) and not self.config.ignore_mask:
             sub_bs = batch_size // (self.config.patch_size**2)
             half_patch_size = int(self.config.patch_size / 2)
-            m = erode_mask(mask.permute(0, 3, 1, 2).float(), pixel_radius=half_patch_size)
-            nonzero_indices = torch.nonzero(m[:, 0], as_tuple=False).to(device)
-            chosen_indices = random.sample(range(len(nonzero_indices)), k=sub_bs)
-            indices = nonzero_indices[chosen_indices]
+            indices = self.sample_valid_pixels(sub_bs, mask, pixel_radius=half_patch_size, device=device)
 
             indices = (
                 indices.view(sub_bs, 1, 1, 3)
@@ -507,10 +637,7 @@ class PairPixelSampler(PixelSampler):  # pylint: disable=too-few-public-methods
             rays_to_sample = batch_size // 2
 
         if isinstance(mask, Tensor) and not self.config.ignore_mask:
-            m = erode_mask(mask.permute(0, 3, 1, 2).float(), pixel_radius=self.radius)
-            nonzero_indices = torch.nonzero(m[:, 0], as_tuple=False).to(device)
-            chosen_indices = random.sample(range(len(nonzero_indices)), k=rays_to_sample)
-            indices = nonzero_indices[chosen_indices]
+            indices = self.sample_valid_pixels(rays_to_sample, mask, pixel_radius=self.radius, device=device)
         else:
             s = (rays_to_sample, 1)
             ns = torch.randint(0, num_images, s, dtype=torch.long, device=device)
@@ -527,3 +654,178 @@ class PairPixelSampler(PixelSampler):  # pylint: disable=too-few-public-methods
         pair_indices += indices
         indices = torch.hstack((indices, pair_indices)).view(rays_to_sample * 2, 3)
         return indices
+
+
+@dataclass
+class ImportancePixelSamplerConfig(PixelSamplerConfig):
+    """Config dataclass for ImportancePixelSampler."""
+
+    _target: Type = field(default_factory=lambda: ImportancePixelSampler)
+    """Target class to instantiate."""
+    tile_size: int = 16
+    """Side length of the square image tiles a running error estimate is kept for."""
+    error_decay: float = 0.9
+    """Decay of the running error estimate of a tile each time rays are sampled from it."""
+    uniform_fraction: float = 0.2
+    """Fraction of the sampling distribution spread uniformly over all pixels. Keeps every pixel reachable and
+    bounds the importance weights by 1 / uniform_fraction."""
+
+
+class ImportancePixelSampler(PixelSampler):
+    """Samples pixels in proportion to a running estimate of the per-ray error of the model.
+
+    A running error estimate is kept for every tile of every training image and updated from the rendered rgb of
+    each batch. Rays are drawn from the mixture of the uniform distribution over all pixels and of the error
+    distribution, which picks an image in proportion to its total error, a tile of it from the CDF of its tile
+    errors, and a pixel uniformly within the tile. The CDFs are kept per image, so updates only refresh the CDFs of
+    the images they touch. Returned batches hold "importance_weights", which models multiply their per-ray losses by
+    to keep them unbiased estimates of the loss over all pixels.
+
+    Only fixed-resolution batches without masks, equirectangular or fisheye cameras are importance sampled, other
+    batches are sampled as with the default PixelSampler.
+
+    Args:
+        config: the ImportancePixelSamplerConfig used to instantiate class
+    """
+
+    config: ImportancePixelSamplerConfig
+
+    def __init__(self, config: ImportancePixelSamplerConfig, **kwargs) -> None:
+        super().__init__(config, **kwargs)
+        self.tile_errors: Optional[Float[Tensor, "num_cameras tiles_y tiles_x"]] = None
+        self._tile_areas: Optional[Float[Tensor, "tiles_y tiles_x"]] = None
+        # Tile CDFs of all cameras in one sorted array, camera i holds i + the normalized CDF of its tile errors.
+        self._tile_cdfs: Optional[Float[Tensor, "num_tiles"]] = None
+        self._camera_errors: Optional[Float[Tensor, "num_cameras"]] = None
+        self._stale_cameras: Optional[Bool[Tensor, "num_cameras"]] = None
+
+    def _get_tile_errors(self, num_cameras: int, image_height: int, image_width: int, device) -> Tensor:
+        """Returns the tile error estimates, allocating them (with a high initial error) for unseen cameras."""
+        tile_size = self.config.tile_size
+        tiles_y = math.ceil(image_height / tile_size)
+        tiles_x = math.ceil(image_width / tile_size)
+        if self.tile_errors is None or self.tile_errors.shape[1:] != (tiles_y, tiles_x):
+            self.tile_errors = torch.ones((0, tiles_y, tiles_x), device=device)
+            self._tile_cdfs = torch.zeros(0, dtype=torch.float64, device=device)
+            self._camera_errors = torch.zeros(0, device=device)
+            self._stale_cameras = torch.zeros(0, dtype=torch.bool, device=device)
+            # Number of pixels of each tile, tiles on the right and bottom borders may be cropped.
+            tile_heights = torch.clamp(image_height - torch.arange(tiles_y, device=device) * tile_size, max=tile_size)
+            tile_widths = torch.clamp(image_width - torch.arange(tiles_x, device=device) * tile_size, max=tile_size)
+            self._tile_areas = (tile_heights[:, None] * tile_widths[None, :]).float()
+        assert self._tile_cdfs is not None and self._camera_errors is not None and self._stale_cameras is not None
+        num_new = num_cameras - self.tile_errors.shape[0]
+        if num_new > 0:
+            self.tile_errors = torch.cat([self.tile_errors, torch.ones((num_new, tiles_y, tiles_x), device=device)])
+            self._tile_cdfs = torch.cat([self._tile_cdfs, self._tile_cdfs.new_zeros(num_new * tiles_y * tiles_x)])
+            self._camera_errors = torch.cat([self._camera_errors, self._camera_errors.new_zeros(num_new)])
+            self._stale_cameras = torch.cat([self._stale_cameras, self._stale_cameras.new_ones(num_new)])
+        return self.tile_errors
+
+    def _refresh_tile_cdfs(self) -> None:
+        """Recomputes the tile CDFs and total errors of the cameras whose error estimates changed."""
+        assert self.tile_errors is not None and self._tile_areas is not None and self._stale_cameras is not None
+        assert self._tile_cdfs is not None and self._camera_errors is not None
+        stale = torch.nonzero(self._stale_cameras, as_tuple=False)[:, 0]
+        if len(stale) == 0:
+            return
+        errors = (self.tile_errors[stale] * self._tile_areas).flatten(1).double()
+        camera_errors = errors.sum(dim=-1)
+        cdfs = torch.cumsum(errors, dim=-1) / torch.clamp(camera_errors, min=1e-12)[:, None]
+        cdfs = torch.clamp(cdfs, max=1.0) + stale[:, None].double()
+        self._tile_cdfs.view(self.tile_errors.shape[0], -1)[stale] = cdfs
+        self._camera_errors[stale] = camera_errors.float()
+        self._stale_cameras[stale] = False
+
+    def collate_image_dataset_batch(self, batch: Dict, num_rays_per_batch: int, keep_full_image: bool = False):
+        if "mask" in batch or self.config.is_equirectangular or self.config.fisheye_crop_radius is not None:
+            return super().collate_image_dataset_batch(batch, num_rays_per_batch, keep_full_image)
+
+        device = batch["image"].device
+        num_images, image_height, image_width, _ = batch["image"].shape
+        image_idx = batch["image_idx"].to(device).long()
+        tile_size = self.config.tile_size
+        uniform_fraction = self.config.uniform_fraction
+        tile_errors = self._get_tile_errors(int(image_idx.max()) + 1, image_height, image_width, device)
+        self._refresh_tile_cdfs()
+        assert self._tile_cdfs is not None and self._camera_errors is not None and self._tile_areas is not None
+        _, tiles_y, tiles_x = tile_errors.shape
+        num_tiles = tiles_y * tiles_x
+        num_pixels = num_images * image_height * image_width
+
+        camera_errors = self._camera_errors[image_idx]
+        total_error = float(camera_errors.sum())
+        if total_error <= 0:
+            uniform_fraction = 1.0
+
+        # Uniformly drawn rays.
+        c = torch.randint(0, num_images, (num_rays_per_batch,), device=device)
+        y = (torch.rand(num_rays_per_batch, device=device) * image_height).long()
+        x = (torch.rand(num_rays_per_batch, device=device) * image_width).long()
+
+        # Error driven rays, an image by its total error, a tile from its CDF and a pixel within the tile.
+        error_driven = torch.rand(num_rays_per_batch, device=device) >= uniform_fraction
+        num_error_driven = int(error_driven.sum())
+        if num_error_driven > 0:
+            error_c = torch.multinomial(camera_errors, num_error_driven, replacement=True)
+            cameras = image_idx[error_c]
+            rand = cameras.double() + torch.rand(num_error_driven, device=device, dtype=torch.float64)
+            tiles = torch.searchsorted(self._tile_cdfs, rand, right=True) - cameras * num_tiles
+            tiles = torch.clamp(tiles, 0, num_tiles - 1)
+            tile_y = torch.div(tiles, tiles_x, rounding_mode="floor")
+            tile_x = tiles - tile_y * tiles_x
+            tile_height = torch.clamp(image_height - tile_y * tile_size, max=tile_size)
+            tile_width = torch.clamp(image_width - tile_x * tile_size, max=tile_size)
+            c[error_driven] = error_c
+            y[error_driven] = tile_y * tile_size + (torch.rand(num_error_driven, device=device) * tile_height).long()
+            x[error_driven] = tile_x * tile_size + (torch.rand(num_error_driven, device=device) * tile_width).long()
+        y = torch.clamp(y, max=image_height - 1)
+        x = torch.clamp(x, max=image_width - 1)
+
+        # Ratio of the uniform pixel probability to the probability of the mixture to sample the pixel.
+        tile_y = torch.div(y, tile_size, rounding_mode="floor")
+        tile_x = torch.div(x, tile_size, rounding_mode="floor")
+        pixel_probs = torch.full((num_rays_per_batch,), uniform_fraction / num_pixels, device=device)
+        if total_error > 0:
+            pixel_errors = tile_errors[image_idx[c], tile_y, tile_x]
+            pixel_probs = pixel_probs + (1 - uniform_fraction) * pixel_errors / total_error
+        importance_weights = 1.0 / (num_pixels * pixel_probs)
+
+        c, y, x = c.cpu(), y.cpu(), x.cpu()
+        collated_batch = {
+            key: value[c, y, x] for key, value in batch.items() if key != "image_idx" and value is not None
+        }
+        collated_batch["importance_weights"] = importance_weights[:, None]
+        indices = torch.stack([c, y, x], dim=-1).to(device)
+        indices[:, 0] = image_idx[indices[:, 0]]
+        collated_batch["indices"] = indices  # with the abs camera indices
+        if keep_full_image:
+            collated_batch["full_image"] = batch["image"]
+        return collated_batch
+
+    def update(self, pixel_batch: Dict, model_outputs: Dict) -> None:
+        if self.tile_errors is None or "importance_weights" not in pixel_batch or "rgb" not in model_outputs:
+            return
+        assert self._stale_cameras is not None
+        with torch.no_grad():
+            device = self.tile_errors.device
+            gt_rgb = pixel_batch["image"][..., :3].to(device)
+            pred_rgb = model_outputs["rgb"].detach().to(device)
+            ray_errors = torch.mean((pred_rgb - gt_rgb) ** 2, dim=-1)
+
+            num_cameras, tiles_y, tiles_x = self.tile_errors.shape
+            indices = pixel_batch["indices"].to(device)
+            tiles = (
+                indices[:, 0] * tiles_y * tiles_x
+                + torch.div(indices[:, 1], self.config.tile_size, rounding_mode="floor") * tiles_x
+                + torch.div(indices[:, 2], self.config.tile_size, rounding_mode="floor")
+            )
+            error_sums = torch.zeros(num_cameras * tiles_y * tiles_x, device=device).index_add_(0, tiles, ray_errors)
+            counts = torch.zeros_like(error_sums).index_add_(0, tiles, torch.ones_like(ray_errors))
+            sampled = counts > 0
+            flat_errors = self.tile_errors.view(-1)
+            flat_errors[sampled] = (
+                self.config.error_decay * flat_errors[sampled]
+                + (1 - self.config.error_decay) * error_sums[sampled] / counts[sampled]
+            )
+            self._stale_cameras[indices[:, 0]] = True
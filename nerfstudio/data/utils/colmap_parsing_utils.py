@@ -48,6 +48,15 @@ CameraModel = collections.namedtuple("CameraModel", ["model_id", "model_name", "
 Camera = collections.namedtuple("Camera", ["id", "model", "width", "height", "params"])
 BaseImage = collections.namedtuple("Image", ["id", "qvec", "tvec", "camera_id", "name", "xys", "point3D_ids"])
 Point3D = collections.namedtuple("Point3D", ["id", "xyz", "rgb", "error", "image_ids", "point2D_idxs"])
+# Columnar versions of the images and points3D dicts. Per-observation arrays of all images / points are
+# concatenated, the observations of row i are in [offsets[i], offsets[i + 1]).
+ImageColumns = collections.namedtuple(
+    "ImageColumns", ["ids", "qvecs", "tvecs", "camera_ids", "names", "points2D_offsets", "xys", "point3D_ids"]
+)
+Point3DColumns = collections.namedtuple(
+    "Point3DColumns",
+    ["ids", "xyz", "rgb", "error", "track_offsets", "track_image_ids", "track_point2D_idxs"],
+)
 
 
 class Image(BaseImage):
@@ -70,6 +79,7 @@ CAMERA_MODELS = {
 }
 CAMERA_MODEL_IDS = dict([(camera_model.model_id, camera_model) for camera_model in CAMERA_MODELS])
 CAMERA_MODEL_NAMES = dict([(camera_model.model_name, camera_model) for camera_model in CAMERA_MODELS])
+_POINT2D_DTYPE = np.dtype([("xy", "<f8", (2,)), ("point3D_id", "<i8")])
 
 
 def read_next_bytes(fid, num_bytes, format_char_sequence, endian_character="<"):
@@ -226,34 +236,72 @@ def read_images_binary(path_to_model_file):
         void Reconstruction::ReadImagesBinary(const std::string& path)
         void Reconstruction::WriteImagesBinary(const std::string& path)
     """
-    images = {}
+    return image_columns_to_images(read_images_binary_columns(path_to_model_file))
+
+
+def read_images_binary_columns(path_to_model_file):
+    """Reads images.bin into an ImageColumns, parsing the 2D points of each image with a single np.frombuffer."""
     with open(path_to_model_file, "rb") as fid:
-        num_reg_images = read_next_bytes(fid, 8, "Q")[0]
-        for _ in range(num_reg_images):
-            binary_image_properties = read_next_bytes(fid, num_bytes=64, format_char_sequence="idddddddi")
-            image_id = binary_image_properties[0]
-            qvec = np.array(binary_image_properties[1:5])
-            tvec = np.array(binary_image_properties[5:8])
-            camera_id = binary_image_properties[8]
-            image_name = b""
-            current_char = read_next_bytes(fid, 1, "c")[0]
-            while current_char != b"\x00":  # look for the ASCII 0 entry
-                image_name += current_char
-                current_char = read_next_bytes(fid, 1, "c")[0]
-            image_name = image_name.decode("utf-8")
-            num_points2D = read_next_bytes(fid, num_bytes=8, format_char_sequence="Q")[0]
-            x_y_id_s = read_next_bytes(fid, num_bytes=24 * num_points2D, format_char_sequence="ddq" * num_points2D)
-            xys = np.column_stack([tuple(map(float, x_y_id_s[0::3])), tuple(map(float, x_y_id_s[1::3]))])
-            point3D_ids = np.array(tuple(map(int, x_y_id_s[2::3])))
-            images[image_id] = Image(
-                id=image_id,
-                qvec=qvec,
-                tvec=tvec,
-                camera_id=camera_id,
-                name=image_name,
-                xys=xys,
-                point3D_ids=point3D_ids,
-            )
+        data = fid.read()
+    num_reg_images = struct.unpack_from("<Q", data, 0)[0]
+    properties = []
+    names = []
+    points2D_offsets = np.zeros(num_reg_images + 1, dtype=np.int64)
+    points2D = []
+    offset = 8
+    for i in range(num_reg_images):
+        properties.append(struct.unpack_from("<idddddddi", data, offset))
+        name_end = data.index(b"\x00", offset + 64)
+        names.append(data[offset + 64 : name_end].decode("utf-8"))
+        num_points2D = struct.unpack_from("<Q", data, name_end + 1)[0]
+        offset = name_end + 9
+        points2D.append(np.frombuffer(data, dtype=_POINT2D_DTYPE, count=num_points2D, offset=offset))
+        offset += _POINT2D_DTYPE.itemsize * num_points2D
+        points2D_offsets[i + 1] = points2D_offsets[i] + num_points2D
+    properties = np.array(properties, dtype=np.float64).reshape(num_reg_images, 9)
+    points2D = np.concatenate(points2D) if points2D else np.zeros(0, dtype=_POINT2D_DTYPE)
+    return ImageColumns(
+        ids=properties[:, 0].astype(np.int64),
+        qvecs=properties[:, 1:5],
+        tvecs=properties[:, 5:8],
+        camera_ids=properties[:, 8].astype(np.int64),
+        names=names,
+        points2D_offsets=points2D_offsets,
+        xys=points2D["xy"].copy(),
+        point3D_ids=points2D["point3D_id"].copy(),
+    )
+
+
+def images_to_image_columns(images):
+    """Converts a dict of Image (e.g. from read_images_text) to an ImageColumns."""
+    images = list(images.values())
+    num_points2D = [len(image.point3D_ids) for image in images]
+    return ImageColumns(
+        ids=np.array([image.id for image in images], dtype=np.int64),
+        qvecs=np.array([image.qvec for image in images], dtype=np.float64).reshape(-1, 4),
+        tvecs=np.array([image.tvec for image in images], dtype=np.float64).reshape(-1, 3),
+        camera_ids=np.array([image.camera_id for image in images], dtype=np.int64),
+        names=[image.name for image in images],
+        points2D_offsets=np.concatenate([[0], np.cumsum(num_points2D, dtype=np.int64)]),
+        xys=np.concatenate([np.reshape(image.xys, (-1, 2)) for image in images] + [np.zeros((0, 2))]),
+        point3D_ids=np.concatenate([image.point3D_ids for image in images] + [np.zeros(0)]).astype(np.int64),
+    )
+
+
+def image_columns_to_images(columns):
+    """Converts an ImageColumns to a dict of Image."""
+    images = {}
+    for i, image_id in enumerate(columns.ids.tolist()):
+        start, end = columns.points2D_offsets[i], columns.points2D_offsets[i + 1]
+        images[image_id] = Image(
+            id=image_id,
+            qvec=columns.qvecs[i],
+            tvec=columns.tvecs[i],
+            camera_id=int(columns.camera_ids[i]),
+            name=columns.names[i],
+            xys=columns.xys[start:end],
+            point3D_ids=columns.point3D_ids[start:end],
+        )
     return images
 
 
@@ -341,22 +389,86 @@ def read_points3D_binary(path_to_model_file):
         void Reconstruction::ReadPoints3DBinary(const std::string& path)
         void Reconstruction::WritePoints3DBinary(const std::string& path)
     """
-    points3D = {}
+    return point3D_columns_to_points3D(read_points3D_binary_columns(path_to_model_file))
+
+
+def _byte_strided_view(data, dtype):
+    """Returns an array whose i-th element is the value of the given dtype starting at byte i of data."""
+    dtype = np.dtype(dtype)
+    return np.ndarray(shape=(max(len(data) - dtype.itemsize + 1, 0),), dtype=dtype, buffer=data, strides=(1,))
+
+
+def read_points3D_binary_columns(path_to_model_file):
+    """Reads points3D.bin into a Point3DColumns.
+
+    Only the record offsets are found with a python loop (records have variable length), all fields and tracks are
+    then gathered with numpy.
+    """
     with open(path_to_model_file, "rb") as fid:
-        num_points = read_next_bytes(fid, 8, "Q")[0]
-        for _ in range(num_points):
-            binary_point_line_properties = read_next_bytes(fid, num_bytes=43, format_char_sequence="QdddBBBd")
-            point3D_id = binary_point_line_properties[0]
-            xyz = np.array(binary_point_line_properties[1:4])
-            rgb = np.array(binary_point_line_properties[4:7])
-            error = np.array(binary_point_line_properties[7])
-            track_length = read_next_bytes(fid, num_bytes=8, format_char_sequence="Q")[0]
-            track_elems = read_next_bytes(fid, num_bytes=8 * track_length, format_char_sequence="ii" * track_length)
-            image_ids = np.array(tuple(map(int, track_elems[0::2])))
-            point2D_idxs = np.array(tuple(map(int, track_elems[1::2])))
-            points3D[point3D_id] = Point3D(
-                id=point3D_id, xyz=xyz, rgb=rgb, error=error, image_ids=image_ids, point2D_idxs=point2D_idxs
-            )
+        data = fid.read()
+    num_points = struct.unpack_from("<Q", data, 0)[0]
+    record_offsets = np.empty(num_points, dtype=np.int64)
+    track_lengths = np.empty(num_points, dtype=np.int64)
+    offset = 8
+    unpack_track_length = struct.Struct("<Q").unpack_from
+    for i in range(num_points):
+        record_offsets[i] = offset
+        track_length = unpack_track_length(data, offset + 43)[0]
+        track_lengths[i] = track_length
+        offset += 51 + 8 * track_length
+
+    # Record layout: id (Q), xyz (ddd), rgb (BBB), error (d), track_length (Q), track (ii * track_length).
+    uint64_view = _byte_strided_view(data, "<u8")
+    float64_view = _byte_strided_view(data, "<f8")
+    uint8_view = np.frombuffer(data, dtype=np.uint8)
+    int32_view = _byte_strided_view(data, "<i4")
+    track_offsets = np.concatenate([[0], np.cumsum(track_lengths)])
+    track_starts = np.repeat(record_offsets + 51 - 8 * track_offsets[:-1], track_lengths)
+    track_starts += 8 * np.arange(track_offsets[-1], dtype=np.int64)
+    return Point3DColumns(
+        ids=uint64_view[record_offsets].astype(np.int64),
+        xyz=float64_view[record_offsets[:, None] + np.array([8, 16, 24])],
+        rgb=uint8_view[record_offsets[:, None] + np.array([32, 33, 34])],
+        error=float64_view[record_offsets + 35],
+        track_offsets=track_offsets,
+        track_image_ids=int32_view[track_starts],
+        track_point2D_idxs=int32_view[track_starts + 4],
+    )
+
+
+def points3D_to_point3D_columns(points3D):
+    """Converts a dict of Point3D (e.g. from read_points3D_text) to a Point3DColumns."""
+    points3D = list(points3D.values())
+    track_lengths = [len(point3D.image_ids) for point3D in points3D]
+    return Point3DColumns(
+        ids=np.array([point3D.id for point3D in points3D], dtype=np.int64),
+        xyz=np.array([point3D.xyz for point3D in points3D], dtype=np.float64).reshape(-1, 3),
+        rgb=np.array([point3D.rgb for point3D in points3D], dtype=np.uint8).reshape(-1, 3),
+        error=np.array([point3D.error for point3D in points3D], dtype=np.float64),
+        track_offsets=np.concatenate([[0], np.cumsum(track_lengths, dtype=np.int64)]),
+        track_image_ids=np.concatenate([point3D.image_ids for point3D in points3D] + [np.zeros(0)]).astype(np.int32),
+        track_point2D_idxs=np.concatenate([point3D.point2D_idxs for point3D in points3D] + [np.zeros(0)]).astype(
+            np.int32
+        ),
+    )
+
+
+def point3D_columns_to_points3D(columns):
+    """Converts a Point3DColumns to a dict of Point3D."""
+    points3D = {}
+    rgb = columns.rgb.astype(np.int64)
+    track_image_ids = columns.track_image_ids.astype(np.int64)
+    track_point2D_idxs = columns.track_point2D_idxs.astype(np.int64)
+    for i, point3D_id in enumerate(columns.ids.tolist()):
+        start, end = columns.track_offsets[i], columns.track_offsets[i + 1]
+        points3D[point3D_id] = Point3D(
+            id=point3D_id,
+            xyz=columns.xyz[i],
+            rgb=rgb[i],
+            error=np.array(columns.error[i]),
+            image_ids=track_image_ids[start:end],
+            point2D_idxs=track_point2D_idxs[start:end],
+        )
     return points3D
 
 
@@ -0,0 +1,155 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact in-memory representations of cached masks, depth images and semantic labels.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Literal
+
+import torch
+from jaxtyping import Bool, Float, UInt8
+from torch import Tensor
+
+_UINT16_OFFSET = 2**15
+
+
+@dataclass
+class CompactStorageConfig:
+    """How datamanagers store the masks, depth images and semantics they cache. Compacted values are expanded back
+    to their usual types only for the pixels (or images) returned in a batch."""
+
+    pack_masks: bool = False
+    """Store masks as packed bits, 8 pixels per byte. Only used by datamanagers caching full images, as pixel
+    samplers need the unpacked masks to pick valid pixels."""
+    depth_dtype: Literal["unchanged", "float16", "uint16"] = "unchanged"
+    """Storage type of depth images. uint16 stores depth in fixed point, see depth_scale."""
+    depth_scale: float = 1000.0
+    """Number of uint16 steps per scene unit, the largest representable depth is 65535 / depth_scale."""
+    uint8_semantics: bool = False
+    """Store semantic labels as uint8 instead of int64, for datasets with at most 256 classes."""
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any of the data is stored compactly."""
+        return self.pack_masks or self.depth_dtype != "unchanged" or self.uint8_semantics
+
+
+def pack_mask(mask: Bool[Tensor, "*batch height width 1"]) -> UInt8[Tensor, "*batch height packed_width 1"]:
+    """Packs a boolean mask into bits along its width, the first pixel of 8 being the least significant bit."""
+    width = mask.shape[-2]
+    padding = (-width) % 8
+    bits = torch.nn.functional.pad(mask[..., 0].to(torch.uint8), (0, padding))
+    bits = bits.reshape(*bits.shape[:-1], -1, 8)
+    weights = torch.tensor([1, 2, 4, 8, 16, 32, 64, 128], dtype=torch.uint8, device=mask.device)
+    return (bits * weights).sum(dim=-1, dtype=torch.uint8)[..., None]
+
+
+def unpack_mask(
+    packed: UInt8[Tensor, "*batch height packed_width 1"], width: int
+) -> Bool[Tensor, "*batch height width 1"]:
+    """Inverse of `pack_mask`.
+
+    Args:
+        packed: Packed mask.
+        width: Width of the unpacked mask.
+    """
+    shifts = torch.arange(8, dtype=torch.uint8, device=packed.device)
+    bits = ((packed[..., 0, None] >> shifts) & 1).bool()
+    return bits.flatten(-2)[..., :width, None]
+
+
+def compact_depth(depth: Float[Tensor, "*batch 1"], config: CompactStorageConfig) -> Tensor:
+    """Converts depth values to their storage type.
+
+    uint16 depth is stored in an int16 tensor offset by 2**15, as older torch versions have no uint16 type.
+    """
+    if config.depth_dtype == "float16":
+        return depth.to(torch.float16)
+    if config.depth_dtype == "uint16":
+        fixed_point = torch.round(depth.to(torch.float32) * config.depth_scale).clamp(0, 2**16 - 1)
+        return (fixed_point.to(torch.int32) - _UINT16_OFFSET).to(torch.int16)
+    return depth
+
+
+def expand_depth(depth: Tensor, config: CompactStorageConfig) -> Float[Tensor, "*batch 1"]:
+    """Inverse of `compact_depth`, returns float32 depth."""
+    if config.depth_dtype == "float16":
+        return depth.to(torch.float32)
+    if config.depth_dtype == "uint16":
+        return (depth.to(torch.float32) + _UINT16_OFFSET) / config.depth_scale
+    return depth
+
+
+def compact_data(data: Dict[str, Any], config: CompactStorageConfig, pack_masks: bool = True) -> Dict[str, Any]:
+    """Returns a copy of a dataset item (or batch) with masks, depth images and semantics in their storage types.
+
+    Args:
+        data: Data of a single image, or a batch of images.
+        config: Storage types.
+        pack_masks: Whether masks may be packed, False for data read by pixel samplers.
+    """
+    data = dict(data)
+    if config.pack_masks and pack_masks and isinstance(data.get("mask"), Tensor):
+        data["mask"] = pack_mask(data["mask"])
+    if isinstance(data.get("depth_image"), Tensor):
+        data["depth_image"] = compact_depth(data["depth_image"], config)
+    if config.uint8_semantics and isinstance(data.get("semantics"), Tensor):
+        assert data["semantics"].max() < 256, "uint8_semantics requires at most 256 semantic classes"
+        data["semantics"] = data["semantics"].to(torch.uint8)
+    return data
+
+
+def expand_data(data: Dict[str, Any], config: CompactStorageConfig) -> Dict[str, Any]:
+    """Inverse of `compact_data`, for full images as well as for the pixels sampled from them.
+
+    Args:
+        data: Compacted data.
+        config: Storage types the data was compacted with.
+    """
+    data = dict(data)
+    mask = data.get("mask")
+    if config.pack_masks and isinstance(mask, Tensor) and mask.dtype == torch.uint8:
+        data["mask"] = unpack_mask(mask, width=data["image"].shape[-2])
+    if isinstance(data.get("depth_image"), Tensor):
+        data["depth_image"] = expand_depth(data["depth_image"], config)
+    if config.uint8_semantics and isinstance(data.get("semantics"), Tensor):
+        data["semantics"] = data["semantics"].to(torch.int64)
+    return data
+
+
+class CompactCollate:
+    """Collate function compacting each dataset item before collating them with `collate_fn`.
+
+    Args:
+        collate_fn: The collate function to wrap.
+        config: Storage types.
+    """
+
+    def __init__(self, collate_fn: Callable[[List[Dict]], Any], config: CompactStorageConfig) -> None:
+        self.collate_fn = collate_fn
+        self.config = config
+
+    def __call__(self, batch_list: List[Dict]) -> Any:
+        return self.collate_fn([compact_data(data, self.config, pack_masks=False) for data in batch_list])
+
+
+def get_compact_collate_fn(collate_fn: Callable[[List[Dict]], Any], config: CompactStorageConfig) -> Callable:
+    """Returns `collate_fn`, wrapped to compact the dataset items if any compact storage is enabled."""
+    if not config.enabled:
+        return collate_fn
+    return CompactCollate(collate_fn, config)
@@ -14,14 +14,168 @@
 
 """Utility functions to allow easy re-use of common operations across dataloaders"""
 
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Union
+from typing import Callable, List, Literal, Optional, Sequence, Tuple, Union
 
 import cv2
 import numpy as np
 import torch
 from PIL import Image
 
+CACHEDIR_TAG_FILENAME = "CACHEDIR.TAG"
+"""Name of the file marking a directory as a cache, see https://bford.info/cachedir/."""
+
+CACHEDIR_TAG_SIGNATURE = "Signature: 8a477f597d28d172789f06886806bc55"
+
+
+def tag_cache_dir(cache_dir: Path) -> None:
+    """Marks a directory as holding caches, so that its files are not mistaken for inputs of a dataset, e.g. by
+    the snapshots of dataparser outputs.
+
+    Args:
+        cache_dir: Existing directory to mark.
+    """
+    tag_path = Path(cache_dir) / CACHEDIR_TAG_FILENAME
+    if not tag_path.exists():
+        tag_path.write_text(f"{CACHEDIR_TAG_SIGNATURE}\n# This directory holds caches written by nerfstudio.\n")
+
+
+def is_cache_dir(path: Path) -> bool:
+    """Returns whether a directory was marked as holding caches with `tag_cache_dir`.
+
+    Args:
+        path: Directory to check.
+    """
+    try:
+        with open(Path(path) / CACHEDIR_TAG_FILENAME, "r", encoding="utf-8") as f:
+            return f.read(len(CACHEDIR_TAG_SIGNATURE)) == CACHEDIR_TAG_SIGNATURE
+    except OSError:
+        return False
+
+
+def resize_image(
+    pil_image: Image.Image,
+    size: Tuple[int, int],
+    resample: Image.Resampling = Image.Resampling.BILINEAR,
+) -> Image.Image:
+    """Resizes a freshly opened image to the given size.
+
+    JPEG images are decoded at the smallest power-of-two reduction (PIL draft mode) that is still at least the
+    target size, so only a fraction of the pixels of a large image are decoded. The result is then resized to the
+    exact target size.
+
+    Args:
+        pil_image: Image returned by `Image.open`, before its pixels are loaded.
+        size: Target (width, height) of the image.
+        resample: Resampling filter of the final resize. Draft mode is only used with smoothing filters.
+    """
+    size = (int(size[0]), int(size[1]))
+    if pil_image.size == size:
+        return pil_image
+    if pil_image.format == "JPEG" and resample != Image.Resampling.NEAREST:
+        pil_image.draft(pil_image.mode, size)
+    return pil_image.resize(size, resample=resample)
+
+
+def get_downscaled_size(
+    size: Tuple[int, int], downscale_factor: int, rounding_mode: Literal["floor", "round", "ceil"] = "floor"
+) -> Tuple[int, int]:
+    """Returns the (width, height) of an image of the given size downscaled by `downscale_factor`.
+
+    Args:
+        size: (width, height) of the full resolution image.
+        downscale_factor: Factor to divide the size by.
+        rounding_mode: How to round fractional sizes.
+    """
+    if rounding_mode == "floor":
+        rounding_fn = math.floor
+    elif rounding_mode == "round":
+        rounding_fn = round
+    elif rounding_mode == "ceil":
+        rounding_fn = math.ceil
+    else:
+        raise ValueError("Invalid mode. Choose from 'floor', 'round', or 'ceil'.")
+    return rounding_fn(size[0] / downscale_factor), rounding_fn(size[1] / downscale_factor)
+
+
+def _is_up_to_date(source_path: Path, output_path: Path, size: Tuple[int, int]) -> bool:
+    if not output_path.exists() or output_path.stat().st_mtime < source_path.stat().st_mtime:
+        return False
+    try:
+        with Image.open(output_path) as output_image:
+            return output_image.size == size
+    except OSError:
+        return False
+
+
+def _downscale_image_file(
+    source_path: Path,
+    get_output_path: Callable[[Path, int], Path],
+    downscale_factors: Sequence[int],
+    resample: Image.Resampling,
+    rounding_mode: Literal["floor", "round", "ceil"],
+) -> int:
+    """Writes the downscaled versions of one image that are missing or stale, and returns how many were written."""
+    pil_image = Image.open(source_path)
+    outputs = []
+    for downscale_factor in downscale_factors:
+        size = get_downscaled_size(pil_image.size, downscale_factor, rounding_mode)
+        output_path = get_output_path(source_path, downscale_factor)
+        if not _is_up_to_date(source_path, output_path, size):
+            outputs.append((output_path, size))
+    if not outputs:
+        return 0
+
+    # Decode once, at the lowest resolution that still covers the largest requested level.
+    largest_size = max((size for _, size in outputs), key=lambda size: size[0] * size[1])
+    if pil_image.format == "JPEG" and resample != Image.Resampling.NEAREST:
+        pil_image.draft(pil_image.mode, largest_size)
+    pil_image.load()
+    for output_path, size in outputs:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write next to the output and rename, so that an interrupted run never leaves a truncated image behind.
+        tmp_path = output_path.with_name(f".{output_path.stem}.tmp{output_path.suffix}")
+        save_kwargs = {"quality": 95} if output_path.suffix.lower() in [".jpg", ".jpeg"] else {}
+        pil_image.resize(size, resample=resample).save(tmp_path, **save_kwargs)
+        os.replace(tmp_path, output_path)
+    return len(outputs)
+
+
+def downscale_image_files(
+    image_paths: Sequence[Path],
+    get_output_path: Callable[[Path, int], Path],
+    downscale_factors: Sequence[int],
+    nearest_neighbor: bool = False,
+    rounding_mode: Literal["floor", "round", "ceil"] = "floor",
+    num_workers: Optional[int] = None,
+) -> int:
+    """Writes downscaled copies of image files, decoding every source image once for all downscale factors.
+
+    Images are processed in parallel threads, PIL releases the GIL while decoding, resizing and encoding. Outputs
+    that already exist with the expected size and are newer than their source are skipped.
+
+    Args:
+        image_paths: Paths of the full resolution images.
+        get_output_path: Function returning the output path of an image for a downscale factor.
+        downscale_factors: Factors to downscale the images by.
+        nearest_neighbor: Use nearest neighbor sampling (for masks and depth images) instead of bicubic filtering.
+        rounding_mode: How to round fractional image sizes.
+        num_workers: Number of threads, defaults to the number of CPUs.
+
+    Returns:
+        The number of downscaled images written.
+    """
+    resample = Image.Resampling.NEAREST if nearest_neighbor else Image.Resampling.BICUBIC
+    with ThreadPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+        num_written = executor.map(
+            lambda path: _downscale_image_file(path, get_output_path, downscale_factors, resample, rounding_mode),
+            image_paths,
+        )
+        return sum(num_written)
+
 
 def get_image_mask_tensor_from_path(filepath: Path, scale_factor: float = 1.0) -> torch.Tensor:
     """
@@ -85,3 +239,27 @@ def get_depth_image_from_path(
         image = image.astype(np.float64) * scale_factor
         image = cv2.resize(image, (width, height), interpolation=interpolation)
     return torch.from_numpy(image[:, :, np.newaxis])
+
+
+def downscale_image_area(image: torch.Tensor, downscale_factor: int) -> torch.Tensor:
+    """Downscales an image by averaging each block of downscale_factor x downscale_factor pixels, like the 'area'
+    interpolation of OpenCV. Trailing rows and columns that don't fill a block are dropped.
+
+    Args:
+        image: Image of shape [H, W, C].
+        downscale_factor: Integer downscale factor.
+
+    Returns:
+        float32 image of shape [H // downscale_factor, W // downscale_factor, C].
+    """
+    image = image.to(torch.float32)
+    d = downscale_factor
+    weight = (1.0 / (d * d)) * torch.ones((1, 1, d, d), dtype=torch.float32, device=image.device)
+    return (
+        torch.nn.functional.conv2d(image.permute(2, 0, 1)[:, None, ...], weight, stride=d).squeeze(1).permute(1, 2, 0)
+    )
+
+
+def get_pyramid_key(key: str, downscale_factor: int) -> str:
+    """Returns the key under which datamanagers store a downscaled copy of an image (or mask) of a batch."""
+    return f"{key}_downscale_{downscale_factor}"
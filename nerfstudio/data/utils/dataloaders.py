@@ -21,7 +21,7 @@ import concurrent.futures
 import multiprocessing
 import random
 from abc import abstractmethod
-from typing import Any, Callable, Dict, List, Optional, Sized, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Sized, Tuple, Union
 
 import torch
 from rich.progress import track
@@ -46,6 +46,7 @@ class CacheDataloader(DataLoader):
         num_times_to_repeat_images: How often to collate new images. -1 to never pick new images.
         device: Device to perform computation.
         collate_fn: The function we will use to collate our training data
+        indices: Indices of the images to sample from, all images of the dataset if None.
     """
 
     def __init__(
@@ -56,6 +57,7 @@ class CacheDataloader(DataLoader):
         device: Union[torch.device, str] = "cpu",
         collate_fn: Callable[[Any], Any] = nerfstudio_collate,
         exclude_batch_keys_from_device: Optional[List[str]] = None,
+        indices: Optional[Sequence[int]] = None,
         **kwargs,
     ):
         if exclude_batch_keys_from_device is None:
@@ -64,9 +66,10 @@ class CacheDataloader(DataLoader):
         assert isinstance(self.dataset, Sized)
 
         super().__init__(dataset=dataset, **kwargs)  # This will set self.dataset
+        self.indices = list(range(len(self.dataset))) if indices is None else list(indices)
         self.num_times_to_repeat_images = num_times_to_repeat_images
-        self.cache_all_images = (num_images_to_sample_from == -1) or (num_images_to_sample_from >= len(self.dataset))
-        self.num_images_to_sample_from = len(self.dataset) if self.cache_all_images else num_images_to_sample_from
+        self.cache_all_images = (num_images_to_sample_from == -1) or (num_images_to_sample_from >= len(self.indices))
+        self.num_images_to_sample_from = len(self.indices) if self.cache_all_images else num_images_to_sample_from
         self.device = device
         self.collate_fn = collate_fn
         self.num_workers = kwargs.get("num_workers", 0)
@@ -77,30 +80,44 @@ class CacheDataloader(DataLoader):
 
         self.cached_collated_batch = None
         if self.cache_all_images:
-            CONSOLE.print(f"Caching all {len(self.dataset)} images.")
-            if len(self.dataset) > 500:
+            CONSOLE.print(f"Caching all {len(self.indices)} images.")
+            if len(self.indices) > 500:
                 CONSOLE.print(
                     "[bold yellow]Warning: If you run out of memory, try reducing the number of images to sample from."
                 )
             self.cached_collated_batch = self._get_collated_batch()
         elif self.num_times_to_repeat_images == -1:
             CONSOLE.print(
-                f"Caching {self.num_images_to_sample_from} out of {len(self.dataset)} images, without resampling."
+                f"Caching {self.num_images_to_sample_from} out of {len(self.indices)} images, without resampling."
             )
         else:
             CONSOLE.print(
-                f"Caching {self.num_images_to_sample_from} out of {len(self.dataset)} images, "
+                f"Caching {self.num_images_to_sample_from} out of {len(self.indices)} images, "
                 f"resampling every {self.num_times_to_repeat_images} iters."
             )
 
     def __getitem__(self, idx):
         return self.dataset.__getitem__(idx)
 
+    def set_indices(self, indices: Sequence[int]) -> None:
+        """Changes the images to sample from. The cached images are replaced by images of the new indices.
+
+        Args:
+            indices: Indices of the images to sample from.
+        """
+        self.indices = list(indices)
+        self.cached_collated_batch = None  # Free the cached images before loading the new ones.
+        if self.cache_all_images:
+            self.num_images_to_sample_from = len(self.indices)
+            self.cached_collated_batch = self._get_collated_batch()
+        else:
+            self.num_images_to_sample_from = min(self.num_images_to_sample_from, len(self.indices))
+            self.first_time = True
+
     def _get_batch_list(self):
         """Returns a list of batches from the dataset attribute."""
 
-        assert isinstance(self.dataset, Sized)
-        indices = random.sample(range(len(self.dataset)), k=self.num_images_to_sample_from)
+        indices = random.sample(self.indices, k=self.num_images_to_sample_from)
         batch_list = []
         results = []
 
@@ -0,0 +1,154 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Snapshots of dataparser outputs, so that parsing a dataset can be skipped when neither the dataparser config nor
+its input files changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import torch
+
+from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
+from nerfstudio.data.utils.data_utils import is_cache_dir
+
+SNAPSHOT_VERSION = 1
+"""Bumped whenever the snapshot format, or what dataparsers store in their outputs, changes."""
+
+METADATA_SUFFIXES = {".json", ".txt", ".bin", ".ply", ".npy", ".npz", ".yaml", ".yml", ".csv", ".xml", ".pkl"}
+"""Files in the data directory with these suffixes are considered inputs of the dataparser."""
+
+
+def get_snapshot_key(dataparser: Any, split: str, kwargs: Dict) -> str:
+    """Returns the key of the snapshot of a dataparser call.
+
+    The key covers the dataparser class, its config and its state before parsing (e.g. a downscale factor set
+    by the datamanager), so any change to them results in a different snapshot.
+
+    Args:
+        dataparser: The dataparser.
+        split: Split of the outputs.
+        kwargs: Extra arguments of the call.
+    """
+    state = {name: value for name, value in vars(dataparser).items() if name != "config"}
+    key = "|".join(
+        [
+            f"{type(dataparser).__module__}.{type(dataparser).__qualname__}",
+            repr(dataparser.config),
+            split,
+            repr(sorted(kwargs.items())),
+            repr(sorted(state.items())),
+        ]
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _referenced_files(outputs: DataparserOutputs) -> Iterator[Path]:
+    yield from outputs.image_filenames
+    yield from outputs.mask_filenames or []
+    for value in outputs.metadata.values():
+        filenames = getattr(value, "filenames", value)  # e.g. Semantics
+        if isinstance(filenames, (list, tuple)):
+            yield from (filename for filename in filenames if isinstance(filename, Path))
+
+
+def get_input_mtimes(data: Path, outputs: DataparserOutputs) -> Dict[str, int]:
+    """Returns the modification times of the files a dataparser read to produce its outputs.
+
+    These are the metadata files (transforms, COLMAP models, point clouds, ...) in the data directory, and every
+    file the outputs refer to. Directories marked as caches with `tag_cache_dir` are skipped. Missing files have a
+    modification time of -1.
+
+    Args:
+        data: Data path of the dataparser config, a directory or a file in the dataset directory.
+        outputs: Outputs of the dataparser.
+    """
+    paths = set(str(path) for path in _referenced_files(outputs))
+    root = data if data.is_dir() else data.parent
+    if root.is_dir():
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Caches written next to the dataset (e.g. pseudodepth) are not inputs of the dataparser.
+            dirnames[:] = [
+                dirname
+                for dirname in dirnames
+                if not dirname.startswith(".") and not is_cache_dir(Path(dirpath) / dirname)
+            ]
+            paths.update(
+                os.path.join(dirpath, filename)
+                for filename in filenames
+                if os.path.splitext(filename)[1].lower() in METADATA_SUFFIXES
+            )
+    if data.is_file():
+        paths.add(str(data))
+
+    mtimes = {}
+    for path in sorted(paths):
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = -1
+    return mtimes
+
+
+def load_snapshot(snapshot_path: Path, data: Path) -> Optional[Tuple[DataparserOutputs, Dict[str, Any]]]:
+    """Loads a snapshot, if it exists and none of its input files changed since it was saved.
+
+    Args:
+        snapshot_path: Path of the snapshot.
+        data: Data path of the dataparser config.
+
+    Returns:
+        The dataparser outputs and the state of the dataparser after parsing, or None.
+    """
+    if not snapshot_path.exists():
+        return None
+    try:
+        snapshot = torch.load(snapshot_path, map_location="cpu", weights_only=False)
+    except Exception:  # pylint: disable=broad-except
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    if snapshot["input_mtimes"] != get_input_mtimes(data, snapshot["outputs"]):
+        return None
+    return snapshot["outputs"], snapshot["state"]
+
+
+def save_snapshot(snapshot_path: Path, data: Path, outputs: DataparserOutputs, state: Dict[str, Any]) -> None:
+    """Saves a snapshot of dataparser outputs.
+
+    Args:
+        snapshot_path: Path of the snapshot.
+        data: Data path of the dataparser config.
+        outputs: Outputs of the dataparser.
+        state: Attributes of the dataparser to restore when the snapshot is loaded.
+    """
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "input_mtimes": get_input_mtimes(data, outputs),
+        "outputs": outputs,
+        "state": state,
+    }
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = snapshot_path.with_name(f"{snapshot_path.name}.{os.getpid()}.tmp")
+    try:
+        torch.save(snapshot, tmp_path)
+        os.replace(tmp_path, snapshot_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
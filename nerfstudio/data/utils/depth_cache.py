@@ -0,0 +1,174 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Resumable on-disk cache of estimated (pseudo) depth maps.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from jaxtyping import Float
+from rich.progress import track
+from torch import Tensor
+
+from nerfstudio.data.utils.data_utils import tag_cache_dir
+
+DepthEstimator = Callable[[Float[Tensor, "height width 3"]], Float[Tensor, "height width 1"]]
+"""Function estimating the depth map of an RGB image with values in [0, 1]."""
+
+
+class PseudoDepthCache:
+    """Depth maps of a list of images, stored in one memory-mapped float32 file.
+
+    A completion bitmap records which depth maps have been written, so that generation can be interrupted and
+    resumed. Depth maps are read lazily from the memory map.
+
+    Args:
+        cache_dir: Directory holding the cache files. Created if it does not exist.
+        image_shapes: (height, width) of each depth map.
+    """
+
+    DATA_FILENAME = "depths.bin"
+    DONE_FILENAME = "done.bin"
+    INDEX_FILENAME = "index.json"
+
+    def __init__(self, cache_dir: Path, image_shapes: Sequence[Tuple[int, int]]):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tag_cache_dir(self.cache_dir)
+        self.image_shapes = [(int(height), int(width)) for height, width in image_shapes]
+        sizes = [height * width for height, width in self.image_shapes]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+
+        index_path = self.cache_dir / self.INDEX_FILENAME
+        index = {"image_shapes": [list(shape) for shape in self.image_shapes]}
+        if not index_path.exists() or json.loads(index_path.read_text(encoding="utf-8")) != index:
+            # New cache, or one laid out for other images: start over.
+            for filename in (self.DATA_FILENAME, self.DONE_FILENAME):
+                (self.cache_dir / filename).unlink(missing_ok=True)
+            index_path.write_text(json.dumps(index), encoding="utf-8")
+
+        num_values = max(int(self.offsets[-1]), 1)
+        self._depths = self._open(self.DATA_FILENAME, np.float32, num_values)
+        self._done = self._open(self.DONE_FILENAME, np.uint8, max(len(self.image_shapes), 1))
+
+    def __getstate__(self) -> Dict:
+        # Send the location of the cache rather than its contents to other processes.
+        return {"cache_dir": self.cache_dir, "image_shapes": self.image_shapes}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__init__(**state)
+
+    def _open(self, filename: str, dtype, num_values: int) -> np.memmap:
+        path = self.cache_dir / filename
+        if not path.exists():
+            # Sparse file, pages of depth maps not generated yet take no space.
+            with open(path, "wb") as f:
+                f.truncate(num_values * np.dtype(dtype).itemsize)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(num_values,))
+
+    def __len__(self) -> int:
+        return len(self.image_shapes)
+
+    @property
+    def missing_indices(self) -> List[int]:
+        """Indices of the depth maps not generated yet."""
+        return np.flatnonzero(self._done[: len(self)] == 0).tolist()
+
+    def is_complete(self) -> bool:
+        """Whether every depth map has been generated."""
+        return len(self.missing_indices) == 0
+
+    def get(self, idx: int) -> Float[Tensor, "height width 1"]:
+        """Returns a depth map, read from the memory map.
+
+        Args:
+            idx: Index of the image.
+        """
+        assert self._done[idx], f"Depth map {idx} has not been generated"
+        height, width = self.image_shapes[idx]
+        depth = self._depths[self.offsets[idx] : self.offsets[idx + 1]]
+        return torch.from_numpy(np.array(depth).reshape(height, width, 1))
+
+    def put(self, idx: int, depth: Float[Tensor, "height width 1"]) -> None:
+        """Writes a depth map and marks it as generated.
+
+        Args:
+            idx: Index of the image.
+            depth: The depth map.
+        """
+        height, width = self.image_shapes[idx]
+        assert depth.shape[:2] == (height, width), f"Expected a {height}x{width} depth map, got {tuple(depth.shape)}"
+        self._depths[self.offsets[idx] : self.offsets[idx + 1]] = depth.detach().cpu().numpy().reshape(-1)
+        self._depths.flush()
+        # Only mark the depth map as done once it is on disk.
+        self._done[idx] = 1
+        self._done.flush()
+
+    def generate(
+        self,
+        load_image: Callable[[int], Float[Tensor, "height width 3"]],
+        estimator: DepthEstimator,
+        num_workers: Optional[int] = None,
+    ) -> None:
+        """Generates the missing depth maps.
+
+        Images are loaded ahead by a pool of threads while the estimator processes the previous ones.
+
+        Args:
+            load_image: Function returning the image of an index.
+            estimator: Depth estimator.
+            num_workers: Number of image loading threads, defaults to the number of CPUs.
+        """
+        missing_indices = self.missing_indices
+        if not missing_indices:
+            return
+        num_workers = num_workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            # Keep a bounded number of images in flight, so that a slow estimator doesn't fill the memory.
+            indices = iter(missing_indices)
+            pending = deque((idx, executor.submit(load_image, idx)) for idx in islice(indices, 2 * num_workers))
+            for _ in track(range(len(missing_indices)), description="Generating depth images"):
+                idx, image = pending.popleft()
+                next_idx = next(indices, None)
+                if next_idx is not None:
+                    pending.append((next_idx, executor.submit(load_image, next_idx)))
+                with torch.no_grad():
+                    self.put(idx, estimator(image.result()))
+
+
+def get_pseudo_depth_cache_dir(root: Path, image_filenames: Sequence[Path], scale_factor: float) -> Path:
+    """Returns the cache directory of the depth maps of a list of images.
+
+    Args:
+        root: Directory the caches are created in.
+        image_filenames: Images the depth maps are estimated from.
+        scale_factor: Scale factor applied to the images.
+    """
+    hasher = hashlib.sha1(f"{float(scale_factor)}".encode("utf-8"))
+    for filename in image_filenames:
+        stat = os.stat(filename)
+        hasher.update(f"|{Path(filename).absolute()}|{stat.st_mtime_ns}|{stat.st_size}".encode("utf-8"))
+    return Path(root) / hasher.hexdigest()
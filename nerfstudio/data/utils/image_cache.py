@@ -0,0 +1,181 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Persistent on-disk cache of decoded images backed by a single memory-mapped file.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from nerfstudio.data.utils.data_utils import tag_cache_dir
+
+
+class DecodedImageCache:
+    """Cache of decoded uint8 images shared between runs (and processes) on one host.
+
+    Decoded frames are appended to a single ``images.bin`` file and located through ``index.json``, which maps a
+    key derived from the source path, its modification time and the scale factor to an offset and a shape. Reads
+    are zero-copy views into a copy-on-write memory map, so the OS page cache is shared by every training that
+    uses the same cache directory.
+
+    Args:
+        cache_dir: Directory holding the cache files. Created if it does not exist.
+        flush_every: Number of newly cached images after which the index is written back to disk.
+    """
+
+    DATA_FILENAME = "images.bin"
+    INDEX_FILENAME = "index.json"
+
+    def __init__(self, cache_dir: Path, flush_every: int = 32):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tag_cache_dir(self.cache_dir)
+        self.data_path = self.cache_dir / self.DATA_FILENAME
+        self.index_path = self.cache_dir / self.INDEX_FILENAME
+        self.flush_every = flush_every
+        self._init_state()
+        self._index.update(self._read_index())
+
+    def _init_state(self) -> None:
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[int, Tuple[int, ...]]] = {}
+        self._num_unflushed = 0
+        self._mmap: Optional[np.memmap] = None
+        atexit.register(self.flush)
+
+    def __getstate__(self) -> Dict:
+        # Memory maps and locks can't be pickled (e.g. when the dataset is sent to a spawned worker process).
+        return {"cache_dir": self.cache_dir, "flush_every": self.flush_every}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__init__(**state)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    @staticmethod
+    def make_key(filepath: Path, scale_factor: float = 1.0) -> str:
+        """Returns the cache key of an image file, invalidated whenever the file is modified.
+
+        Args:
+            filepath: Path to the source image.
+            scale_factor: Scale factor applied to the image after decoding.
+        """
+        stat = os.stat(filepath)
+        key = f"{Path(filepath).absolute()}|{stat.st_mtime_ns}|{stat.st_size}|{float(scale_factor)}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _read_index(self) -> Dict[str, Tuple[int, Tuple[int, ...]]]:
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        return {key: (int(offset), tuple(shape)) for key, (offset, shape) in entries.items()}
+
+    def _view(self, offset: int, shape: Tuple[int, ...]) -> npt.NDArray[np.uint8]:
+        num_bytes = int(np.prod(shape))
+        if self._mmap is None or offset + num_bytes > self._mmap.shape[0]:
+            # The data file has grown since it was mapped, map it again.
+            self._mmap = np.memmap(self.data_path, dtype=np.uint8, mode="c")
+        return self._mmap[offset : offset + num_bytes].reshape(shape)
+
+    def get(self, key: str) -> Optional[npt.NDArray[np.uint8]]:
+        """Returns the cached image for a key, or None if it is not cached.
+
+        Args:
+            key: Cache key, see `make_key`.
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            return self._view(*entry)
+
+    def put(self, key: str, image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        """Appends an image to the cache and returns a view of the cached copy.
+
+        Args:
+            key: Cache key, see `make_key`.
+            image: Decoded uint8 image.
+        """
+        assert image.dtype == np.uint8, f"Only uint8 images can be cached, got {image.dtype}"
+        data = np.ascontiguousarray(image).tobytes()
+        with self._lock:
+            # O_APPEND makes each write land atomically at the end of the file, even with several writers.
+            fd = os.open(self.data_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0))
+            try:
+                num_written = os.write(fd, data)
+                end = os.lseek(fd, 0, os.SEEK_CUR)
+            finally:
+                os.close(fd)
+            if num_written != len(data):
+                raise OSError(f"Short write to {self.data_path}: {num_written} of {len(data)} bytes")
+            offset = end - len(data)
+            self._index[key] = (offset, tuple(image.shape))
+            self._num_unflushed += 1
+            view = self._view(offset, tuple(image.shape))
+        if self._num_unflushed >= self.flush_every:
+            self.flush()
+        return view
+
+    def get_or_load(
+        self,
+        filepath: Path,
+        scale_factor: float,
+        load_fn: Callable[[Path], npt.NDArray[np.uint8]],
+    ) -> npt.NDArray[np.uint8]:
+        """Returns the cached image for a file, decoding and caching it with `load_fn` on a miss.
+
+        Args:
+            filepath: Path to the source image.
+            scale_factor: Scale factor applied by `load_fn`.
+            load_fn: Function decoding the image file into a uint8 array.
+        """
+        key = self.make_key(filepath, scale_factor)
+        image = self.get(key)
+        if image is None:
+            image = self.put(key, load_fn(filepath))
+        return image
+
+    def flush(self) -> None:
+        """Writes the index to disk, merging entries written by other processes in the meantime."""
+        with self._lock:
+            if self._num_unflushed == 0:
+                return
+            entries = self._read_index()
+            entries.update(self._index)
+            serialized: Dict[str, List] = {key: [offset, list(shape)] for key, (offset, shape) in entries.items()}
+            tmp_path = self.index_path.with_name(f"{self.INDEX_FILENAME}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(serialized, f)
+            os.replace(tmp_path, self.index_path)
+            self._index = entries
+            self._num_unflushed = 0
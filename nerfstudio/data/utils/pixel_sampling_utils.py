@@ -15,10 +15,11 @@
 """Pixel sampling utils such as eroding of valid masks that we sample from."""
 
 import math
-from typing import List
+from dataclasses import dataclass
+from typing import List, Optional
 
 import torch
-from jaxtyping import Float
+from jaxtyping import Bool, Float, Int
 from torch import Tensor
 
 
@@ -88,3 +89,62 @@ def divide_rays_per_image(num_rays_per_batch: int, num_images: int) -> List[int]
     num_rays_per_image = num_images_under * [num_rays_per_image_under] + num_images_over * [num_rays_per_image_over]
     num_rays_per_image[-1] += num_rays_per_batch - sum(num_rays_per_image)
     return num_rays_per_image
+
+
+@dataclass
+class PackedImages:
+    """Layout of images of different resolutions in one flat pixel index space, see `pack_images`."""
+
+    offsets: Int[Tensor, "num_images"]
+    """Flat index of the first pixel of each image."""
+    heights: Int[Tensor, "num_images"]
+    """Height of each image."""
+    widths: Int[Tensor, "num_images"]
+    """Width of each image."""
+    valid_pixels: Optional[Int[Tensor, "num_valid_pixels"]] = None
+    """Flat indices of the pixels inside the masks, sorted, if the images have masks."""
+    valid_offsets: Optional[Int[Tensor, "num_images"]] = None
+    """Index of the first valid pixel of each image in valid_pixels."""
+    valid_counts: Optional[Int[Tensor, "num_images"]] = None
+    """Number of valid pixels of each image."""
+
+
+def pack_images(images: List[Tensor], mask: Optional[List[Bool[Tensor, "H W 1"]]] = None) -> PackedImages:
+    """Lays out a list of variable resolution images in one flat pixel index space, so that pixels of every image
+    can be drawn in a single vectorized pass. The images themselves are neither copied nor modified, see
+    `gather_pixels`.
+
+    Args:
+        images: List of images of shape (H, W, C).
+        mask: Optional list of masks of the pixels that may be sampled.
+    """
+    device = images[0].device
+    heights = torch.tensor([image.shape[0] for image in images], dtype=torch.long, device=device)
+    widths = torch.tensor([image.shape[1] for image in images], dtype=torch.long, device=device)
+    sizes = heights * widths
+    offsets = torch.cumsum(sizes, dim=0) - sizes
+    packed = PackedImages(offsets=offsets, heights=heights, widths=widths)
+
+    if mask is not None:
+        flat_mask = torch.cat([m.reshape(-1) for m in mask], dim=0).bool()
+        packed.valid_pixels = torch.nonzero(flat_mask, as_tuple=False)[:, 0]
+        packed.valid_offsets = torch.searchsorted(packed.valid_pixels, offsets)
+        valid_ends = torch.searchsorted(packed.valid_pixels, offsets + sizes)
+        packed.valid_counts = valid_ends - packed.valid_offsets
+    return packed
+
+
+def gather_pixels(
+    images: List[Tensor], num_rays_per_image: List[int], y: Int[Tensor, "num_rays"], x: Int[Tensor, "num_rays"]
+) -> Tensor:
+    """Gathers pixels from a list of images, indexing each image where it is stored (e.g. in shared memory).
+
+    Args:
+        images: List of images of shape (H, W, C).
+        num_rays_per_image: Number of rays of each image, the rays are ordered by image.
+        y: Row of the pixel of each ray.
+        x: Column of the pixel of each ray.
+    """
+    rows = torch.split(y, num_rays_per_image)
+    cols = torch.split(x, num_rays_per_image)
+    return torch.cat([image[row.to(image.device), col.to(image.device)] for image, row, col in zip(images, rows, cols)])
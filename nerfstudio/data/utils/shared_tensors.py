@@ -0,0 +1,165 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tensors backed by memory-mapped files, which can be shared between processes without copying.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import numpy as np
+import torch
+
+
+def _numpy_dtype(dtype: torch.dtype) -> np.dtype:
+    return torch.empty(0, dtype=dtype).numpy().dtype
+
+
+@dataclass(frozen=True)
+class SharedTensorHandle:
+    """Picklable reference to a tensor stored in a memory-mapped file, see `share_tensors`."""
+
+    path: str
+    """Path of the file holding the tensor data."""
+    shape: Tuple[int, ...]
+    """Shape of the tensor."""
+    dtype: torch.dtype
+    """Data type of the tensor."""
+
+    def attach(self, writable: bool = False) -> torch.Tensor:
+        """Maps the file into memory and returns a tensor viewing it.
+
+        Args:
+            writable: If True, writes to the tensor are visible to every process attached to the file. Otherwise,
+                the pages stay shared until (and unless) this process writes to them.
+        """
+        if int(np.prod(self.shape)) == 0:
+            return torch.empty(self.shape, dtype=self.dtype)
+        array = np.memmap(self.path, dtype=_numpy_dtype(self.dtype), mode="r+" if writable else "c", shape=self.shape)
+        return torch.from_numpy(array)
+
+
+def create_shared_tensor(
+    directory: Path, shape: Tuple[int, ...], dtype: torch.dtype, data: Optional[torch.Tensor] = None
+) -> SharedTensorHandle:
+    """Allocates a memory-mapped file for a tensor, optionally initializing it from `data`.
+
+    Args:
+        directory: Directory the file is created in.
+        shape: Shape of the tensor.
+        dtype: Data type of the tensor.
+        data: Optional initial contents of the tensor.
+    """
+    handle = SharedTensorHandle(path=str(Path(directory) / f"{uuid.uuid4().hex}.bin"), shape=tuple(shape), dtype=dtype)
+    if int(np.prod(handle.shape)) == 0:
+        return handle
+    array = np.memmap(handle.path, dtype=_numpy_dtype(dtype), mode="w+", shape=handle.shape)
+    if data is not None:
+        array[...] = data.detach().cpu().numpy()
+    array.flush()
+    del array
+    return handle
+
+
+def share_tensors(data: Any, directory: Path) -> Any:
+    """Moves every tensor in a (nested) dict, list or tuple to a memory-mapped file in `directory`.
+
+    Args:
+        data: The data to share.
+        directory: Directory to create the files in.
+
+    Returns:
+        The same structure with tensors replaced by `SharedTensorHandle`, which can be sent to other processes
+        and turned back into tensors with `attach_tensors`.
+    """
+    if isinstance(data, torch.Tensor):
+        return create_shared_tensor(directory, tuple(data.shape), data.dtype, data=data)
+    if isinstance(data, dict):
+        return {key: share_tensors(value, directory) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return type(data)(share_tensors(value, directory) for value in data)
+    return data
+
+
+def attach_tensors(data: Any, writable: bool = False) -> Any:
+    """Inverse of `share_tensors`, replaces every `SharedTensorHandle` by a tensor viewing its file.
+
+    Args:
+        data: The shared data.
+        writable: Whether the returned tensors write through to the shared files.
+    """
+    if isinstance(data, SharedTensorHandle):
+        return data.attach(writable=writable)
+    if isinstance(data, dict):
+        return {key: attach_tensors(value, writable) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return type(data)(attach_tensors(value, writable) for value in data)
+    return data
+
+
+def get_shared_memory_dir(num_bytes: int = 0) -> Path:
+    """Creates a temporary directory for shared tensors.
+
+    The directory is created in ``/dev/shm`` when it exists and has room for `num_bytes`, so that the tensors are
+    never written back to disk, and in the default temporary directory otherwise. Its name holds the id of this
+    process, so that directories left behind by killed processes are removed by the next call.
+
+    Args:
+        num_bytes: Number of bytes expected to be stored in the directory.
+    """
+    parent = None
+    if os.path.isdir("/dev/shm"):
+        remove_stale_shared_memory_dirs(Path("/dev/shm"))
+        if shutil.disk_usage("/dev/shm").free > num_bytes:
+            parent = "/dev/shm"
+    return Path(tempfile.mkdtemp(prefix=f"nerfstudio_{os.getpid()}_", dir=parent))
+
+
+def remove_stale_shared_memory_dirs(parent: Path) -> None:
+    """Removes the directories created by `get_shared_memory_dir` in `parent` whose process is no longer running,
+    e.g. after it was killed before it could clean up.
+
+    Args:
+        parent: Directory to look for stale directories in.
+    """
+    for directory in Path(parent).glob("nerfstudio_*_*"):
+        pid = directory.name.split("_")[1]
+        if not pid.isdigit() or not directory.is_dir():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            shutil.rmtree(directory, ignore_errors=True)
+        except PermissionError:
+            # The process is running under another user.
+            pass
+
+
+def get_num_bytes(data: Any) -> int:
+    """Returns the total size in bytes of the tensors in a (nested) dict, list or tuple."""
+    if isinstance(data, torch.Tensor):
+        return data.numel() * data.element_size()
+    if isinstance(data, dict):
+        return sum(get_num_bytes(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return sum(get_num_bytes(value) for value in data)
+    return 0
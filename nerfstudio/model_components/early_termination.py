@@ -0,0 +1,78 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Early ray termination, to stop evaluating fields behind opaque surfaces at inference.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import torch
+from jaxtyping import Bool
+from torch import Tensor, nn
+
+from nerfstudio.cameras.rays import RaySamples
+from nerfstudio.field_components.field_heads import FieldHeadNames
+from nerfstudio.model_components.field_evaluation import forward_field_masked
+
+
+def forward_field_with_early_termination(
+    field: nn.Module,
+    ray_samples: RaySamples,
+    transmittance_threshold: float,
+    num_samples_per_segment: int = 8,
+    mask: Optional[Bool[Tensor, "num_rays num_samples"]] = None,
+    **kwargs,
+) -> Dict:
+    """Evaluates a field in segments of samples along the rays, and stops evaluating the rays whose transmittance
+    drops below a threshold. The outputs of the samples that are not evaluated are zero.
+
+    The samples that are not evaluated have weights of at most the transmittance of their ray, and the weights sum
+    to at most 1, so a rendered color changes by at most the threshold times the largest color value.
+
+    Args:
+        field: Field to evaluate.
+        ray_samples: Samples of shape (num_rays, num_samples), sorted along the rays.
+        transmittance_threshold: Rays stop being evaluated once their transmittance drops below this value.
+        num_samples_per_segment: Number of samples along the rays evaluated at once.
+        mask: Samples to evaluate, e.g. the samples in occupied space, all of them if None.
+        kwargs: Extra arguments of the forward of the field.
+    """
+    num_rays, num_samples = ray_samples.shape
+    device = ray_samples.frustums.origins.device
+    if mask is None:
+        mask = torch.ones((num_rays, num_samples), dtype=torch.bool, device=device)
+    assert ray_samples.deltas is not None
+    transmittance = torch.ones((num_rays, 1), device=device)
+    field_outputs: Dict = {}
+    for start in range(0, num_samples, num_samples_per_segment):
+        end = min(start + num_samples_per_segment, num_samples)
+        segment_mask = mask[:, start:end] & (transmittance >= transmittance_threshold)
+        if field_outputs and not segment_mask.any():
+            continue
+        segment_outputs = forward_field_masked(field, ray_samples[:, start:end], segment_mask, **kwargs)
+        if not field_outputs:
+            field_outputs = {
+                name: output.new_zeros((num_rays, num_samples, *output.shape[2:]))
+                for name, output in segment_outputs.items()
+            }
+        for name, output in segment_outputs.items():
+            field_outputs[name][:, start:end] = output
+        delta_density = ray_samples.deltas[:, start:end] * segment_outputs[FieldHeadNames.DENSITY]
+        transmittance = transmittance * torch.exp(-delta_density.sum(dim=-2))
+        if not (transmittance >= transmittance_threshold).any():
+            break
+    return field_outputs
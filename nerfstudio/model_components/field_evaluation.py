@@ -0,0 +1,52 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Evaluation of fields at subsets of ray samples.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+from jaxtyping import Bool
+from torch import Tensor, nn
+
+from nerfstudio.cameras.rays import RaySamples
+
+
+def forward_field_masked(
+    field: nn.Module, ray_samples: RaySamples, mask: Optional[Bool[Tensor, "*bs"]] = None, **kwargs
+) -> Dict:
+    """Evaluates a field only at the masked samples, the outputs are zero elsewhere.
+
+    Args:
+        field: Field to evaluate.
+        ray_samples: Samples to evaluate the field at.
+        mask: Samples to evaluate, all of them if None.
+        kwargs: Extra arguments of the forward of the field.
+    """
+    if mask is None:
+        return field(ray_samples, **kwargs)
+    if not mask.any():
+        # Evaluate a single sample to get the names and shapes of the outputs, its values are discarded.
+        outputs = field(ray_samples.flatten()[:1], **kwargs)
+        return {name: output.new_zeros((*mask.shape, *output.shape[1:])) for name, output in outputs.items()}
+    outputs = field(ray_samples[mask], **kwargs)
+    field_outputs = {}
+    for name, output in outputs.items():
+        field_output = output.new_zeros((*mask.shape, *output.shape[1:]))
+        field_output[mask] = output
+        field_outputs[name] = field_output
+    return field_outputs
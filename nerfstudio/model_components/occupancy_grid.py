@@ -0,0 +1,155 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Occupancy grid distilled from density fields, to skip empty space at inference.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, List, Optional
+
+import torch
+import torch.nn.functional as F
+from jaxtyping import Bool, Float
+from torch import Tensor, nn
+
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+
+
+class OccupancyGrid(nn.Module):
+    """Bitfield of the occupied cells of a scene, distilled from density fields.
+
+    The grid covers the same normalized space as the hash grids of the fields, i.e. the contracted scene for
+    unbounded scenes and the scene box otherwise, so a uniform grid spends its cells where the fields spend their
+    resolution. The bitfield is a buffer and is saved with the checkpoint of the model.
+
+    Args:
+        aabb: Scene box of the fields.
+        resolution: Number of cells along each axis.
+        spatial_distortion: Scene contraction of the fields, None for bounded scenes.
+    """
+
+    occupied: Bool[Tensor, "resolution resolution resolution"]
+    distilled: Bool[Tensor, ""]
+
+    def __init__(
+        self,
+        aabb: Float[Tensor, "2 3"],
+        resolution: int = 128,
+        spatial_distortion: Optional[SceneContraction] = None,
+    ) -> None:
+        super().__init__()
+        if spatial_distortion is not None:
+            assert spatial_distortion.order == float("inf"), "Only the L-inf scene contraction is supported."
+        self.resolution = resolution
+        self.spatial_distortion = spatial_distortion
+        self.register_buffer("aabb", aabb.clone(), persistent=False)
+        self.register_buffer("occupied", torch.ones((resolution,) * 3, dtype=torch.bool))
+        self.register_buffer("distilled", torch.tensor(False))
+
+    def get_normalized_positions(self, positions: Float[Tensor, "*bs 3"]) -> Float[Tensor, "*bs 3"]:
+        """Maps world positions to the [0, 1] cube of the grid."""
+        if self.spatial_distortion is not None:
+            return (self.spatial_distortion(positions) + 2.0) / 4.0
+        return (positions - self.aabb[0]) / (self.aabb[1] - self.aabb[0])
+
+    def get_world_positions(self, normalized: Float[Tensor, "*bs 3"]) -> Float[Tensor, "*bs 3"]:
+        """Maps positions in the [0, 1] cube of the grid back to world positions."""
+        if self.spatial_distortion is None:
+            return normalized * (self.aabb[1] - self.aabb[0]) + self.aabb[0]
+        contracted = normalized * 4.0 - 2.0
+        # Inverse of the L-inf contraction, norms are clamped below 2 as the far boundary is at infinity.
+        mag = torch.linalg.norm(contracted, ord=float("inf"), dim=-1, keepdim=True).clamp(max=2.0 - 1e-4)
+        return torch.where(mag < 1, contracted, contracted / (mag * (2.0 - mag)))
+
+    def get_occupied(self, positions: Float[Tensor, "*bs 3"]) -> Bool[Tensor, "*bs"]:
+        """Returns whether positions are in occupied cells, positions outside of the grid are empty.
+
+        Args:
+            positions: World positions.
+        """
+        normalized = self.get_normalized_positions(positions)
+        inside = ((normalized > 0) & (normalized < 1)).all(dim=-1)
+        indices = (normalized * self.resolution).long().clamp(0, self.resolution - 1)
+        flat_indices = (indices[..., 0] * self.resolution + indices[..., 1]) * self.resolution + indices[..., 2]
+        return self.occupied.view(-1)[flat_indices] & inside
+
+    @torch.no_grad()
+    def distill(
+        self,
+        density_fns: List[Callable[[Tensor], Tensor]],
+        density_threshold: float = 0.01,
+        num_samples_per_cell: int = 4,
+        dilation: int = 1,
+        chunk_size: int = 2**18,
+    ) -> None:
+        """Marks the cells where any of the density functions exceeds a threshold as occupied.
+
+        Args:
+            density_fns: Density functions of world positions, e.g. the proposal networks of nerfacto, which are
+                trained to bound the weights of the final field from above.
+            density_threshold: Cells are occupied when their largest sampled density exceeds this value.
+            num_samples_per_cell: Number of jittered samples per cell.
+            dilation: Number of cells the occupied cells are grown by, to account for densities between samples.
+            chunk_size: Number of samples evaluated at once.
+        """
+        device = self.occupied.device
+        resolution = self.resolution
+        cells = torch.stack(
+            torch.meshgrid(*([torch.arange(resolution, device=device)] * 3), indexing="ij"), dim=-1
+        ).view(-1, 3)
+        max_density = torch.zeros(cells.shape[0], device=device)
+        num_cells_per_chunk = max(chunk_size // num_samples_per_cell, 1)
+        for start in range(0, cells.shape[0], num_cells_per_chunk):
+            chunk = cells[start : start + num_cells_per_chunk]
+            jitter = torch.rand((chunk.shape[0], num_samples_per_cell, 3), device=device)
+            positions = self.get_world_positions((chunk[:, None, :] + jitter) / resolution)
+            for density_fn in density_fns:
+                density = density_fn(positions).view(chunk.shape[0], num_samples_per_cell).float()
+                density = torch.nan_to_num(density, nan=0.0).amax(dim=-1)
+                max_density[start : start + chunk.shape[0]] = torch.maximum(
+                    max_density[start : start + chunk.shape[0]], density
+                )
+        occupied = (max_density > density_threshold).view((resolution,) * 3)
+        if dilation > 0:
+            kernel_size = 2 * dilation + 1
+            occupied = F.max_pool3d(occupied[None, None].float(), kernel_size, stride=1, padding=dilation)[0, 0] > 0
+        self.occupied.copy_(occupied)
+        self.distilled.fill_(True)
+
+    @property
+    def occupied_fraction(self) -> float:
+        """Fraction of the cells that are occupied."""
+        return self.occupied.float().mean().item()
+
+    def get_masked_density_fn(self, density_fn: Callable[..., Tensor]) -> Callable[..., Tensor]:
+        """Wraps a density function to only be evaluated in occupied cells, the density is zero elsewhere.
+
+        Args:
+            density_fn: Density function of world positions.
+        """
+
+        def masked_density_fn(positions: Float[Tensor, "*bs 3"], times: Optional[Tensor] = None) -> Tensor:
+            occupied = self.get_occupied(positions)
+            density = torch.zeros((*positions.shape[:-1], 1), device=positions.device)
+            if occupied.any():
+                if times is None:
+                    occupied_density = density_fn(positions[occupied])
+                else:
+                    occupied_density = density_fn(positions[occupied], times[occupied])
+                density[occupied] = occupied_density.to(density)
+            return density
+
+        return masked_density_fn
@@ -29,13 +29,16 @@ class RayGenerator(nn.Module):
 
     Args:
         cameras: Camera objects containing camera info.
+        use_undistortion_maps: Whether distorted rays are undistorted with precomputed maps, see
+            `Cameras.generate_rays`.
     """
 
     image_coords: Tensor
 
-    def __init__(self, cameras: Cameras) -> None:
+    def __init__(self, cameras: Cameras, use_undistortion_maps: bool = False) -> None:
         super().__init__()
         self.cameras = cameras
+        self.use_undistortion_maps = use_undistortion_maps
         self.register_buffer("image_coords", cameras.get_image_coords(), persistent=False)
 
     def forward(self, ray_indices: Int[Tensor, "num_rays 3"]) -> RayBundle:
@@ -52,5 +55,6 @@ class RayGenerator(nn.Module):
         ray_bundle = self.cameras.generate_rays(
             camera_indices=c.unsqueeze(-1),
             coords=coords,
+            use_undistortion_maps=self.use_undistortion_maps,
         )
         return ray_bundle
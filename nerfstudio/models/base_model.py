@@ -19,7 +19,6 @@ Base Model implementation which takes in RayBundles or Cameras
 from __future__ import annotations
 
 from abc import abstractmethod
-from collections import defaultdict
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple, Type, Union
 
@@ -34,6 +33,7 @@ from nerfstudio.configs.config_utils import to_immutable_dict
 from nerfstudio.data.scene_box import OrientedBox, SceneBox
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.model_components.scene_colliders import NearFarCollider
+from nerfstudio.utils.memory import ChunkSizeTuner, PeakMemoryMonitor
 
 
 # Model related configs
@@ -51,6 +51,9 @@ class ModelConfig(InstantiateConfig):
     """parameters to instantiate density field with"""
     eval_num_rays_per_chunk: int = 4096
     """specifies number of rays per chunk during eval"""
+    eval_memory_budget_mb: Optional[float] = None
+    """If set, the number of rays per chunk during eval starts at eval_num_rays_per_chunk and is tuned so that
+    rendering a chunk allocates at most this many megabytes."""
     prompt: Optional[str] = None
     """A prompt to be used in text to NeRF models"""
 
@@ -66,6 +69,8 @@ class Model(nn.Module):
     """
 
     config: ModelConfig
+    supports_importance_weights: bool = False
+    """Whether the losses of the model apply the "importance_weights" of importance sampled train batches."""
 
     def __init__(
         self,
@@ -82,6 +87,12 @@ class Model(nn.Module):
         self.kwargs = kwargs
         self.collider = None
 
+        self.chunk_size_tuner: Optional[ChunkSizeTuner] = None
+        if self.config.eval_memory_budget_mb is not None:
+            self.chunk_size_tuner = ChunkSizeTuner(
+                self.config.eval_memory_budget_mb * 1024**2, self.config.eval_num_rays_per_chunk
+            )
+
         self.populate_modules()  # populate the modules
         self.callbacks = None
         # to keep track of which device the nn.Module is on
@@ -174,6 +185,37 @@ class Model(nn.Module):
             camera.generate_rays(camera_indices=0, keep_shape=True, obb_box=obb_box)
         )
 
+    @torch.no_grad()
+    def get_outputs_for_cameras(
+        self, cameras: Cameras, obb_box: Optional[OrientedBox] = None
+    ) -> List[Dict[str, torch.Tensor]]:
+        """Computes the outputs of several cameras, possibly of different sizes, batching their rays together.
+        Assumes a ray-based model.
+
+        Args:
+            cameras: 1D cameras to render.
+            obb_box: if not None, rays outside of the box are zeroed.
+
+        Returns:
+            The outputs of each camera, as returned by `get_outputs_for_camera`.
+        """
+        cameras = cameras.flatten()
+        camera_indices = torch.arange(len(cameras), device=cameras.device)[:, None]
+        ray_bundle, offsets = cameras.generate_packed_rays(camera_indices, obb_box=obb_box)
+        # Chunks span image boundaries, so that small images fill the chunks.
+        packed_outputs = self.get_outputs_for_camera_ray_bundle(ray_bundle.reshape((-1, 1)))
+        outputs = []
+        offsets = offsets.tolist()
+        for i in range(len(cameras)):
+            height, width = cameras.height[i].item(), cameras.width[i].item()
+            outputs.append(
+                {
+                    output_name: output[offsets[i] : offsets[i + 1]].view(height, width, -1)
+                    for output_name, output in packed_outputs.items()
+                }
+            )
+        return outputs
+
     @torch.no_grad()
     def get_outputs_for_camera_ray_bundle(self, camera_ray_bundle: RayBundle) -> Dict[str, torch.Tensor]:
         """Takes in camera parameters and computes the output of the model.
@@ -182,27 +224,62 @@ class Model(nn.Module):
             camera_ray_bundle: ray bundle to calculate outputs over
         """
         input_device = camera_ray_bundle.directions.device
-        num_rays_per_chunk = self.config.eval_num_rays_per_chunk
         image_height, image_width = camera_ray_bundle.origins.shape[:2]
         num_rays = len(camera_ray_bundle)
-        outputs_lists = defaultdict(list)
-        for i in range(0, num_rays, num_rays_per_chunk):
-            start_idx = i
-            end_idx = i + num_rays_per_chunk
-            ray_bundle = camera_ray_bundle.get_row_major_sliced_ray_bundle(start_idx, end_idx)
+        flat_ray_bundle = camera_ray_bundle.flatten()
+        # Chunk outputs are copied back to the host without waiting for them, pinned memory lets these copies
+        # overlap with the rendering of the next chunks.
+        model_device = torch.device(self.device)
+        asynchronous = model_device.type == "cuda" and torch.device(input_device).type == "cpu"
+        outputs = {}
+        tuner = self.chunk_size_tuner
+        start_idx = 0
+        while start_idx < num_rays:
+            num_rays_per_chunk = self.config.eval_num_rays_per_chunk if tuner is None else tuner.num_rays_per_chunk
+            end_idx = min(start_idx + num_rays_per_chunk, num_rays)
             # move the chunk inputs to the model device
-            ray_bundle = ray_bundle.to(self.device)
-            outputs = self.forward(ray_bundle=ray_bundle)
-            for output_name, output in outputs.items():  # type: ignore
-                if not isinstance(output, torch.Tensor):
-                    # TODO: handle lists of tensors as well
+            ray_bundle = flat_ray_bundle[start_idx:end_idx].to(self.device, non_blocking=True)
+            if tuner is not None and tuner.is_tuning:
+                try:
+                    with PeakMemoryMonitor(self.device) as monitor:
+                        chunk_outputs = self.forward(ray_bundle=ray_bundle)
+                except torch.cuda.OutOfMemoryError:
+                    if num_rays_per_chunk <= tuner.min_num_rays_per_chunk:
+                        raise
+                    del ray_bundle
+                    torch.cuda.empty_cache()
+                    tuner.shrink()
                     continue
+                tuner.update(end_idx - start_idx, monitor.peak_bytes)
+            else:
+                chunk_outputs = self.forward(ray_bundle=ray_bundle)
+            # TODO: handle lists of tensors as well
+            tensor_outputs = {
+                output_name: output
+                for output_name, output in chunk_outputs.items()  # type: ignore
+                if isinstance(output, torch.Tensor)
+            }
+            if start_idx == 0:
+                # The first chunk gives the shape of the outputs, which are then written in place.
+                for output_name, output in tensor_outputs.items():
+                    outputs[output_name] = torch.empty(
+                        (num_rays, *output.shape[1:]),
+                        dtype=output.dtype,
+                        device=input_device,
+                        pin_memory=asynchronous,
+                    )
+            elif tensor_outputs.keys() != outputs.keys():
+                raise ValueError(
+                    f"Every chunk of rays must have the same outputs, got {sorted(tensor_outputs)} after "
+                    f"{sorted(outputs)}"
+                )
+            for output_name, output in tensor_outputs.items():
                 # move the chunk outputs from the model device back to the device of the inputs.
-                outputs_lists[output_name].append(output.to(input_device))
-        outputs = {}
-        for output_name, outputs_list in outputs_lists.items():
-            outputs[output_name] = torch.cat(outputs_list).view(image_height, image_width, -1)  # type: ignore
-        return outputs
+                outputs[output_name][start_idx:end_idx].copy_(output, non_blocking=asynchronous)
+            start_idx = end_idx
+        if asynchronous:
+            torch.cuda.synchronize(model_device)
+        return {output_name: output.view(image_height, image_width, -1) for output_name, output in outputs.items()}
 
     def get_rgba_image(self, outputs: Dict[str, torch.Tensor], output_name: str = "rgb") -> torch.Tensor:
         """Returns the RGBA image from the outputs of the model.
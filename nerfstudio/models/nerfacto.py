@@ -19,7 +19,7 @@ NeRF implementation that combines many recent advancements.
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Literal, Tuple, Type
+from typing import Dict, List, Literal, Optional, Tuple, Type
 
 import numpy as np
 import torch
@@ -32,6 +32,8 @@ from nerfstudio.field_components.field_heads import FieldHeadNames
 from nerfstudio.field_components.spatial_distortions import SceneContraction
 from nerfstudio.fields.density_fields import HashMLPDensityField
 from nerfstudio.fields.nerfacto_field import NerfactoField
+from nerfstudio.model_components.early_termination import forward_field_with_early_termination
+from nerfstudio.model_components.field_evaluation import forward_field_masked
 from nerfstudio.model_components.losses import (
     MSELoss,
     distortion_loss,
@@ -40,6 +42,7 @@ from nerfstudio.model_components.losses import (
     pred_normal_loss,
     scale_gradients_by_distance_squared,
 )
+from nerfstudio.model_components.occupancy_grid import OccupancyGrid
 from nerfstudio.model_components.ray_samplers import ProposalNetworkSampler, UniformSampler
 from nerfstudio.model_components.renderers import AccumulationRenderer, DepthRenderer, NormalsRenderer, RGBRenderer
 from nerfstudio.model_components.scene_colliders import NearFarCollider
@@ -130,6 +133,20 @@ class NerfactoModelConfig(ModelConfig):
     """Average initial density output from MLP. """
     camera_optimizer: CameraOptimizerConfig = field(default_factory=lambda: CameraOptimizerConfig(mode="SO3xR3"))
     """Config of the camera optimizer to use"""
+    use_occupancy_grid: bool = False
+    """Whether to skip empty space at inference, with an occupancy grid distilled from the proposal networks and
+    saved with the checkpoint. Grids missing from older checkpoints are distilled at the first render."""
+    occupancy_grid_resolution: int = 128
+    """Number of cells of the occupancy grid along each axis."""
+    occupancy_grid_density_threshold: float = 0.01
+    """Cells where the proposal densities stay below this value are empty."""
+    occupancy_grid_update_every: int = 1000
+    """Number of training steps between distillations of the occupancy grid."""
+    early_termination_tolerance: Optional[float] = None
+    """Largest change of a pixel color allowed by early ray termination at inference, which stops evaluating the
+    field along rays whose transmittance drops below this value. None disables early ray termination."""
+    early_termination_num_samples_per_segment: int = 8
+    """Number of samples along the rays evaluated at once by early ray termination."""
 
 
 class NerfactoModel(Model):
@@ -140,6 +157,7 @@ class NerfactoModel(Model):
     """
 
     config: NerfactoModelConfig
+    supports_importance_weights = True
 
     def populate_modules(self):
         """Set the fields and modules."""
@@ -204,6 +222,14 @@ class NerfactoModel(Model):
                 self.proposal_networks.append(network)
             self.density_fns.extend([network.density_fn for network in self.proposal_networks])
 
+        self.occupancy_grid = None
+        if self.config.use_occupancy_grid:
+            self.occupancy_grid = OccupancyGrid(
+                self.scene_box.aabb,
+                resolution=self.config.occupancy_grid_resolution,
+                spatial_distortion=scene_contraction,
+            )
+
         # Samplers
         def update_schedule(step):
             return np.clip(
@@ -293,15 +319,56 @@ class NerfactoModel(Model):
                     func=self.proposal_sampler.step_cb,
                 )
             )
+        if self.occupancy_grid is not None:
+            callbacks.append(
+                TrainingCallback(
+                    where_to_run=[TrainingCallbackLocation.AFTER_TRAIN_ITERATION],
+                    update_every_num_iters=self.config.occupancy_grid_update_every,
+                    func=self.distill_occupancy_grid,
+                )
+            )
         return callbacks
 
+    def distill_occupancy_grid(self, step: Optional[int] = None) -> None:
+        """Distills the occupancy grid from the current proposal networks."""
+        assert self.occupancy_grid is not None
+        self.occupancy_grid.distill(self.density_fns, density_threshold=self.config.occupancy_grid_density_threshold)
+
     def get_outputs(self, ray_bundle: RayBundle):
         # apply the camera optimizer pose tweaks
         if self.training:
             self.camera_optimizer.apply_to_raybundle(ray_bundle)
         ray_samples: RaySamples
-        ray_samples, weights_list, ray_samples_list = self.proposal_sampler(ray_bundle, density_fns=self.density_fns)
-        field_outputs = self.field.forward(ray_samples, compute_normals=self.config.predict_normals)
+        density_fns = self.density_fns
+        if self.occupancy_grid is not None and not self.training:
+            if not self.occupancy_grid.distilled:
+                self.distill_occupancy_grid()
+            # Samples in empty cells get zero density without evaluating the networks.
+            density_fns = [self.occupancy_grid.get_masked_density_fn(fn) for fn in density_fns]
+        ray_samples, weights_list, ray_samples_list = self.proposal_sampler(ray_bundle, density_fns=density_fns)
+        if self.training or (self.occupancy_grid is None and self.config.early_termination_tolerance is None):
+            field_outputs = self.field.forward(ray_samples, compute_normals=self.config.predict_normals)
+        else:
+            mask = None
+            if self.occupancy_grid is not None:
+                # Rays that miss all occupied cells only evaluate the field at their last sample when it gives the
+                # background color.
+                mask = self.occupancy_grid.get_occupied(ray_samples.frustums.get_positions())
+                if self.config.background_color == "last_sample":
+                    mask[..., -1] = True
+            if self.config.early_termination_tolerance is None:
+                field_outputs = forward_field_masked(
+                    self.field, ray_samples, mask, compute_normals=self.config.predict_normals
+                )
+            else:
+                field_outputs = forward_field_with_early_termination(
+                    self.field,
+                    ray_samples,
+                    self.config.early_termination_tolerance,
+                    num_samples_per_segment=self.config.early_termination_num_samples_per_segment,
+                    mask=mask,
+                    compute_normals=self.config.predict_normals,
+                )
         if self.config.use_gradient_scaling:
             field_outputs = scale_gradients_by_distance_squared(field_outputs, ray_samples)
 
@@ -369,7 +436,12 @@ class NerfactoModel(Model):
             gt_image=image,
         )
 
-        loss_dict["rgb_loss"] = self.rgb_loss(gt_rgb, pred_rgb)
+        if "importance_weights" in batch and self.training:
+            # Rays were importance sampled, reweight them so the loss stays an average over all pixels.
+            importance_weights = batch["importance_weights"].to(self.device)
+            loss_dict["rgb_loss"] = torch.mean(importance_weights * (gt_rgb - pred_rgb) ** 2)
+        else:
+            loss_dict["rgb_loss"] = self.rgb_loss(gt_rgb, pred_rgb)
         if self.training:
             loss_dict["interlevel_loss"] = self.config.interlevel_loss_mult * interlevel_loss(
                 outputs["weights_list"], outputs["ray_samples_list"]
@@ -21,7 +21,7 @@ from __future__ import annotations
 
 import math
 from dataclasses import dataclass, field
-from typing import Dict, List, Literal, Optional, Tuple, Type, Union
+from typing import Any, Dict, List, Literal, Optional, Tuple, Type, Union
 
 import numpy as np
 import torch
@@ -38,6 +38,7 @@ from torch.nn import Parameter
 from nerfstudio.cameras.camera_optimizers import CameraOptimizer, CameraOptimizerConfig
 from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.data.scene_box import OrientedBox
+from nerfstudio.data.utils.data_utils import downscale_image_area, get_pyramid_key
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes, TrainingCallbackLocation
 from nerfstudio.engine.optimizers import Optimizers
 from nerfstudio.model_components.lib_bilagrid import BilateralGrid, color_correct, slice, total_variation_loss
@@ -90,11 +91,7 @@ def resize_image(image: torch.Tensor, d: int):
 
     return downscaled image in shape [H//d, W//d, C]
     """
-    import torch.nn.functional as tf
-
-    image = image.to(torch.float32)
-    weight = (1.0 / (d * d)) * torch.ones((1, 1, d, d), dtype=torch.float32, device=image.device)
-    return tf.conv2d(image.permute(2, 0, 1)[:, None, ...], weight, stride=d).squeeze(1).permute(1, 2, 0)
+    return downscale_image_area(image, d)
 
 
 @torch_compile()
@@ -626,6 +623,19 @@ class SplatfactoModel(Model):
     ) -> List[TrainingCallback]:
         cbs = []
         cbs.append(TrainingCallback([TrainingCallbackLocation.BEFORE_TRAIN_ITERATION], self.step_cb))
+        pipeline = training_callback_attributes.pipeline
+        datamanager = getattr(pipeline, "datamanager", None)
+        if (
+            callable(getattr(datamanager, "release_pyramid_levels", None))
+            and getattr(datamanager.config, "cache_pyramid_levels", 0) > 0
+        ):
+            cbs.append(
+                TrainingCallback(
+                    [TrainingCallbackLocation.BEFORE_TRAIN_ITERATION],
+                    self.release_pyramid_levels,
+                    args=[datamanager],
+                )
+            )
         # The order of these matters
         cbs.append(
             TrainingCallback(
@@ -646,6 +656,10 @@ class SplatfactoModel(Model):
     def step_cb(self, step):
         self.step = step
 
+    def release_pyramid_levels(self, datamanager: Any, step: int):
+        """Frees the downscaled train images cached for resolutions the schedule has moved past."""
+        datamanager.release_pyramid_levels(self._get_downscale_factor())
+
     def get_gaussian_param_groups(self) -> Dict[str, List[Parameter]]:
         # Here we explicitly use the means, scales as parameters so that the user can override this function and
         # specify more if they want to add more optimizable params to gaussians.
@@ -675,9 +689,12 @@ class SplatfactoModel(Model):
         else:
             return 1
 
-    def _downscale_if_required(self, image):
+    def _downscale_if_required(self, image, batch: Optional[Dict[str, torch.Tensor]] = None, key: str = "image"):
         d = self._get_downscale_factor()
         if d > 1:
+            # Use the downscaled copy precomputed by the datamanager when there is one.
+            if batch is not None and get_pyramid_key(key, d) in batch:
+                return batch[get_pyramid_key(key, d)]
             return resize_image(image, d)
         return image
 
@@ -843,15 +860,18 @@ class SplatfactoModel(Model):
             "background": background,  # type: ignore
         }  # type: ignore
 
-    def get_gt_img(self, image: torch.Tensor):
+    def get_gt_img(self, image: torch.Tensor, batch: Optional[Dict[str, torch.Tensor]] = None):
         """Compute groundtruth image with iteration dependent downscale factor for evaluation purpose
 
         Args:
             image: tensor.Tensor in type uint8 or float32
+            batch: batch the image comes from, which may hold downscaled copies of it
         """
-        if image.dtype == torch.uint8:
-            image = image.float() / 255.0
-        gt_img = self._downscale_if_required(image)
+        is_uint8 = image.dtype == torch.uint8
+        gt_img = self._downscale_if_required(image, batch)
+        if is_uint8:
+            # Downscaling is linear, so it doesn't matter whether the image is normalized before or after.
+            gt_img = gt_img.float() / 255.0
         return gt_img.to(self.device)
 
     def composite_with_background(self, image, background) -> torch.Tensor:
@@ -874,7 +894,7 @@ class SplatfactoModel(Model):
             outputs: the output to compute loss dict to
             batch: ground truth batch corresponding to outputs
         """
-        gt_rgb = self.composite_with_background(self.get_gt_img(batch["image"]), outputs["background"])
+        gt_rgb = self.composite_with_background(self.get_gt_img(batch["image"], batch), outputs["background"])
         metrics_dict = {}
         predicted_rgb = outputs["rgb"]
 
@@ -896,14 +916,14 @@ class SplatfactoModel(Model):
             batch: ground truth batch corresponding to outputs
             metrics_dict: dictionary of metrics, some of which we can use for loss
         """
-        gt_img = self.composite_with_background(self.get_gt_img(batch["image"]), outputs["background"])
+        gt_img = self.composite_with_background(self.get_gt_img(batch["image"], batch), outputs["background"])
         pred_img = outputs["rgb"]
 
         # Set masked part of both ground-truth and rendered image to black.
         # This is a little bit sketchy for the SSIM loss.
         if "mask" in batch:
             # batch["mask"] : [H, W, 1]
-            mask = self._downscale_if_required(batch["mask"])
+            mask = self._downscale_if_required(batch["mask"], batch, key="mask")
             mask = mask.to(self.device)
             assert mask.shape[:2] == gt_img.shape[:2] == pred_img.shape[:2]
             gt_img = gt_img * mask
@@ -964,7 +984,7 @@ class SplatfactoModel(Model):
         Returns:
             A dictionary of metrics.
         """
-        gt_rgb = self.composite_with_background(self.get_gt_img(batch["image"]), outputs["background"])
+        gt_rgb = self.composite_with_background(self.get_gt_img(batch["image"], batch), outputs["background"])
         predicted_rgb = outputs["rgb"]
         cc_rgb = None
 
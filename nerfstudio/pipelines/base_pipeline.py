@@ -20,7 +20,10 @@ from __future__ import annotations
 
 import typing
 from abc import abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from itertools import islice
 from pathlib import Path
 from time import time
 from typing import Any, Dict, List, Literal, Mapping, Optional, Tuple, Type, Union, cast
@@ -36,9 +39,12 @@ from torch.nn.parallel import DistributedDataParallel as DDP
 
 from nerfstudio.configs.base_config import InstantiateConfig
 from nerfstudio.data.datamanagers.base_datamanager import DataManager, DataManagerConfig
+from nerfstudio.data.pixel_samplers import ImportancePixelSamplerConfig
+from nerfstudio.data.utils.dataloaders import EvalDataloader
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.models.base_model import Model, ModelConfig
 from nerfstudio.utils import profiler
+from nerfstudio.utils.misc import prefetch
 
 
 def module_wrapper(ddp_or_model: Union[DDP, Model]) -> Model:
@@ -138,6 +144,7 @@ class Pipeline(nn.Module):
             self.datamanager.train_sampler.set_epoch(step)
         ray_bundle, batch = self.datamanager.next_train(step)
         model_outputs = self.model(ray_bundle, batch)
+        self.datamanager.process_train_outputs(batch, model_outputs)
         metrics_dict = self.model.get_metrics_dict(model_outputs, batch)
         loss_dict = self.model.get_loss_dict(model_outputs, batch, metrics_dict)
 
@@ -175,7 +182,11 @@ class Pipeline(nn.Module):
     @abstractmethod
     @profiler.time_function
     def get_average_eval_image_metrics(
-        self, step: Optional[int] = None, output_path: Optional[Path] = None, get_std: bool = False
+        self,
+        step: Optional[int] = None,
+        output_path: Optional[Path] = None,
+        get_std: bool = False,
+        num_images_per_batch: int = 1,
     ):
         """Iterate over all the images in the eval dataset and get the average.
 
@@ -183,6 +194,7 @@ class Pipeline(nn.Module):
             step: current training step
             output_path: optional path to save rendered images to
             get_std: Set True if you want to return std with the mean metric.
+            num_images_per_batch: number of images rendered together, see `get_average_image_metrics`.
         """
 
     def load_pipeline(self, loaded_state: Dict[str, Any], step: int) -> None:
@@ -276,6 +288,12 @@ class VanillaPipeline(Pipeline):
             seed_points=seed_pts,
         )
         self.model.to(device)
+        pixel_sampler = getattr(config.datamanager, "pixel_sampler", None)
+        if isinstance(pixel_sampler, ImportancePixelSamplerConfig) and not self.model.supports_importance_weights:
+            raise ValueError(
+                f"{type(self.model).__name__} does not apply the importance weights of the ImportancePixelSampler "
+                "to its losses, which would bias them. Use a different pixel sampler."
+            )
 
         self.world_size = world_size
         if world_size > 1:
@@ -298,6 +316,7 @@ class VanillaPipeline(Pipeline):
         """
         ray_bundle, batch = self.datamanager.next_train(step)
         model_outputs = self._model(ray_bundle)  # train distributed data parallel model if world_size > 1
+        self.datamanager.process_train_outputs(batch, model_outputs)
         metrics_dict = self.model.get_metrics_dict(model_outputs, batch)
         loss_dict = self.model.get_loss_dict(model_outputs, batch, metrics_dict)
 
@@ -351,15 +370,25 @@ class VanillaPipeline(Pipeline):
         step: Optional[int] = None,
         output_path: Optional[Path] = None,
         get_std: bool = False,
+        num_prefetch: int = 2,
+        num_writers: int = 4,
+        num_images_per_batch: int = 1,
     ):
         """Iterate over all the images in the dataset and get the average.
 
+        Images are loaded by a background thread while the model renders the previous ones, and rendered images
+        are saved by a pool of writer threads, so that only rendering and metrics run on the calling thread.
+
         Args:
             data_loader: the data loader to iterate over
             image_prefix: prefix to use for the saved image filenames
             step: current training step
             output_path: optional path to save rendered images to
             get_std: Set True if you want to return std with the mean metric.
+            num_prefetch: number of images loaded ahead of rendering
+            num_writers: number of threads saving rendered images
+            num_images_per_batch: number of images rendered together with `Model.get_outputs_for_cameras`, so that
+                the rays of small images share chunks. Only ray-based models and eval dataloaders are batched.
 
         Returns:
             metrics_dict: dictionary of metrics
@@ -369,37 +398,69 @@ class VanillaPipeline(Pipeline):
         num_images = len(data_loader)
         if output_path is not None:
             output_path.mkdir(exist_ok=True, parents=True)
+        if (
+            not isinstance(data_loader, EvalDataloader)
+            or type(self.model).get_outputs_for_camera is not Model.get_outputs_for_camera
+        ):
+            num_images_per_batch = 1
         with Progress(
             TextColumn("[progress.description]{task.description}"),
             BarColumn(),
             TimeElapsedColumn(),
             MofNCompleteColumn(),
             transient=True,
-        ) as progress:
+        ) as progress, ThreadPoolExecutor(max_workers=num_writers) as writers:
             task = progress.add_task("[green]Evaluating all images...", total=num_images)
             idx = 0
-            for camera, batch in data_loader:
+            saved_images: typing.Deque = deque()
+            images = iter(prefetch(data_loader, num_prefetch))
+            while True:
+                image_batch = list(islice(images, num_images_per_batch))
+                if not image_batch:
+                    break
                 # time this the following line
-                inner_start = time()
-                outputs = self.model.get_outputs_for_camera(camera=camera)
-                height, width = camera.height, camera.width
-                num_rays = height * width
-                metrics_dict, image_dict = self.model.get_image_metrics_and_images(outputs, batch)
-                if output_path is not None:
-                    for key in image_dict.keys():
-                        image = image_dict[key]  # [H, W, C] order
-                        vutils.save_image(
-                            image.permute(2, 0, 1).cpu(), output_path / f"{image_prefix}_{key}_{idx:04d}.png"
-                        )
-
-                assert "num_rays_per_sec" not in metrics_dict
-                metrics_dict["num_rays_per_sec"] = (num_rays / (time() - inner_start)).item()
-                fps_str = "fps"
-                assert fps_str not in metrics_dict
-                metrics_dict[fps_str] = (metrics_dict["num_rays_per_sec"] / (height * width)).item()
-                metrics_dict_list.append(metrics_dict)
-                progress.advance(task)
-                idx = idx + 1
+                render_start = time()
+                if len(image_batch) == 1:
+                    outputs_list = [self.model.get_outputs_for_camera(camera=image_batch[0][0])]
+                else:
+                    assert isinstance(data_loader, EvalDataloader)
+                    image_indices = torch.tensor([batch["image_idx"] for _, batch in image_batch])
+                    cameras = data_loader.cameras[image_indices.to(data_loader.cameras.device)]
+                    outputs_list = self.model.get_outputs_for_cameras(cameras)
+                render_time = time() - render_start
+                num_batch_rays = sum((camera.height * camera.width).item() for camera, _ in image_batch)
+                for (camera, batch), outputs in zip(image_batch, outputs_list):
+                    inner_start = time()
+                    height, width = camera.height, camera.width
+                    num_rays = height * width
+                    metrics_dict, image_dict = self.model.get_image_metrics_and_images(outputs, batch)
+                    if output_path is not None:
+                        for key in image_dict.keys():
+                            image = image_dict[key]  # [H, W, C] order
+                            saved_images.append(
+                                writers.submit(
+                                    vutils.save_image,
+                                    image.permute(2, 0, 1).cpu(),
+                                    output_path / f"{image_prefix}_{key}_{idx:04d}.png",
+                                )
+                            )
+                            # Bound the images waiting to be saved, so that they don't pile up in memory when
+                            # rendering is faster than saving.
+                            while len(saved_images) > 2 * num_writers:
+                                saved_images.popleft().result()
+
+                    assert "num_rays_per_sec" not in metrics_dict
+                    # Images rendered together share the rendering time in proportion to their number of rays.
+                    duration = render_time * num_rays.item() / num_batch_rays + time() - inner_start
+                    metrics_dict["num_rays_per_sec"] = (num_rays / duration).item()
+                    fps_str = "fps"
+                    assert fps_str not in metrics_dict
+                    metrics_dict[fps_str] = (metrics_dict["num_rays_per_sec"] / (height * width)).item()
+                    metrics_dict_list.append(metrics_dict)
+                    progress.advance(task)
+                    idx = idx + 1
+            while saved_images:
+                saved_images.popleft().result()  # Raise errors of the writers, if any.
 
         metrics_dict = {}
         for key in metrics_dict_list[0].keys():
@@ -419,7 +480,11 @@ class VanillaPipeline(Pipeline):
 
     @profiler.time_function
     def get_average_eval_image_metrics(
-        self, step: Optional[int] = None, output_path: Optional[Path] = None, get_std: bool = False
+        self,
+        step: Optional[int] = None,
+        output_path: Optional[Path] = None,
+        get_std: bool = False,
+        num_images_per_batch: int = 1,
     ):
         """Get the average metrics for evaluation images."""
         assert hasattr(
@@ -427,7 +492,12 @@ class VanillaPipeline(Pipeline):
         ), "datamanager must have 'fixed_indices_eval_dataloader' attribute"
         image_prefix = "eval"
         return self.get_average_image_metrics(
-            self.datamanager.fixed_indices_eval_dataloader, image_prefix, step, output_path, get_std
+            self.datamanager.fixed_indices_eval_dataloader,
+            image_prefix,
+            step,
+            output_path,
+            get_std,
+            num_images_per_batch=num_images_per_batch,
         )
 
     def load_pipeline(self, loaded_state: Dict[str, Any], step: int) -> None:
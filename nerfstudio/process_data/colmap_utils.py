@@ -31,10 +31,12 @@ from rich.progress import track
 # TODO(1480) use pycolmap instead of colmap_parsing_utils
 # import pycolmap
 from nerfstudio.data.utils.colmap_parsing_utils import (
+    points3D_to_point3D_columns,
     qvec2rotmat,
     read_cameras_binary,
     read_images_binary,
     read_points3D_binary,
+    read_points3D_binary_columns,
     read_points3D_text,
 )
 from nerfstudio.process_data.process_data_utils import CameraModel
@@ -679,20 +681,20 @@ def create_ply_from_colmap(
         output_dir: Directory to output .ply
     """
     if (recon_dir / "points3D.bin").exists():
-        colmap_points = read_points3D_binary(recon_dir / "points3D.bin")
+        colmap_points = read_points3D_binary_columns(recon_dir / "points3D.bin")
     elif (recon_dir / "points3D.txt").exists():
-        colmap_points = read_points3D_text(recon_dir / "points3D.txt")
+        colmap_points = points3D_to_point3D_columns(read_points3D_text(recon_dir / "points3D.txt"))
     else:
         raise ValueError(f"Could not find points3D.txt or points3D.bin in {recon_dir}")
 
     # Load point Positions
-    points3D = torch.from_numpy(np.array([p.xyz for p in colmap_points.values()], dtype=np.float32))
+    points3D = torch.from_numpy(colmap_points.xyz.astype(np.float32))
     if applied_transform is not None:
         assert applied_transform.shape == (3, 4)
         points3D = torch.einsum("ij,bj->bi", applied_transform[:3, :3], points3D) + applied_transform[:3, 3]
 
     # Load point colours
-    points3D_rgb = torch.from_numpy(np.array([p.rgb for p in colmap_points.values()], dtype=np.uint8))
+    points3D_rgb = torch.from_numpy(colmap_points.rgb.astype(np.uint8))
 
     # write ply
     with open(output_dir / filename, "w") as f:
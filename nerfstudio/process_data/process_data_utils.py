@@ -32,6 +32,7 @@ except ImportError:
 
 import numpy as np
 
+from nerfstudio.data.utils.data_utils import downscale_image_files
 from nerfstudio.utils.rich_utils import CONSOLE, status
 from nerfstudio.utils.scripts import run_command
 
@@ -435,15 +436,17 @@ def downscale_images(
     nearest_neighbor: bool = False,
     verbose: bool = False,
 ) -> str:
-    """(Now deprecated; much faster integrated into copy_images.)
-    Downscales the images in the directory. Uses FFMPEG.
+    """Downscales the images in the directory by 2, 4, ... 2**num_downscales.
+
+    Every image is decoded once for all downscale factors, images are processed in parallel and outputs that are
+    already up to date are skipped.
 
     Args:
         image_dir: Path to the directory containing the images.
         num_downscales: Number of times to downscale the images. Downscales by 2 each time.
         folder_name: Name of the output folder
         nearest_neighbor: Use nearest neighbor sampling (useful for depth images)
-        verbose: If True, logs the output of the command.
+        verbose: If True, logs the number of downscaled images written.
 
     Returns:
         Summary of downscaling.
@@ -458,22 +461,14 @@ def downscale_images(
         verbose=verbose,
     ):
         downscale_factors = [2**i for i in range(num_downscales + 1)[1:]]
-        for downscale_factor in downscale_factors:
-            assert downscale_factor > 1
-            assert isinstance(downscale_factor, int)
-            downscale_dir = image_dir.parent / f"{folder_name}_{downscale_factor}"
-            downscale_dir.mkdir(parents=True, exist_ok=True)
-            # Using %05d ffmpeg commands appears to be unreliable (skips images).
-            for f in list_images(image_dir):
-                filename = f.name
-                nn_flag = "" if not nearest_neighbor else ":flags=neighbor"
-                ffmpeg_cmd = [
-                    f'ffmpeg -y -noautorotate -i "{image_dir / filename}" ',
-                    f"-q:v 2 -vf scale=iw/{downscale_factor}:ih/{downscale_factor}{nn_flag} ",
-                    f'"{downscale_dir / filename}"',
-                ]
-                ffmpeg_cmd = " ".join(ffmpeg_cmd)
-                run_command(ffmpeg_cmd, verbose=verbose)
+        num_written = downscale_image_files(
+            list_images(image_dir),
+            lambda path, downscale_factor: image_dir.parent / f"{folder_name}_{downscale_factor}" / path.name,
+            downscale_factors,
+            nearest_neighbor=nearest_neighbor,
+        )
+        if verbose:
+            CONSOLE.log(f"Wrote {num_written} downscaled images.")
 
     CONSOLE.log("[bold green]:tada: Done downscaling images.")
     downscale_text = [f"[bold blue]{2**(i+1)}x[/bold blue]" for i in range(num_downscales)]
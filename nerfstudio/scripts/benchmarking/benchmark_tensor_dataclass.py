@@ -0,0 +1,123 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+"""
+benchmark_tensor_dataclass.py
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict
+
+import torch
+import tyro
+from rich.markup import escape
+from rich.table import Table
+
+from nerfstudio.cameras.rays import Frustums, RayBundle, RaySamples
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+def _get_ray_bundle(num_rays: int, device: str) -> RayBundle:
+    return RayBundle(
+        origins=torch.rand(num_rays, 3, device=device),
+        directions=torch.rand(num_rays, 3, device=device),
+        pixel_area=torch.rand(num_rays, 1, device=device),
+        camera_indices=torch.zeros(num_rays, 1, dtype=torch.long, device=device),
+        nears=torch.zeros(num_rays, 1, device=device),
+        fars=torch.ones(num_rays, 1, device=device),
+        metadata={"directions_norm": torch.ones(num_rays, 1, device=device)},
+    )
+
+
+def _get_ray_samples(num_rays: int, num_samples: int, device: str) -> RaySamples:
+    shape = (num_rays, num_samples)
+    frustums = Frustums(
+        origins=torch.rand(*shape, 3, device=device),
+        directions=torch.rand(*shape, 3, device=device),
+        starts=torch.rand(*shape, 1, device=device),
+        ends=torch.rand(*shape, 1, device=device),
+        pixel_area=torch.rand(*shape, 1, device=device),
+    )
+    return RaySamples(
+        frustums=frustums,
+        camera_indices=torch.zeros(*shape, 1, dtype=torch.long, device=device),
+        deltas=torch.rand(*shape, 1, device=device),
+        metadata={"directions_norm": torch.ones(*shape, 1, device=device)},
+    )
+
+
+@dataclass
+class BenchmarkTensorDataclass:
+    """Time the per-call overhead of TensorDataclass operations on ray bundles and ray samples."""
+
+    # Number of rays of the ray bundles and ray samples, small enough for the Python overhead to dominate.
+    num_rays: int = 1024
+    # Number of samples per ray of the ray samples.
+    num_samples: int = 48
+    # Number of timed calls per operation.
+    num_iterations: int = 1000
+    # Device of the data, transfers go to this device from the CPU.
+    device: str = "cuda" if torch.cuda.is_available() else "cpu"
+
+    def _time(self, fn: Callable[[], object]) -> float:
+        fn()
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(self.num_iterations):
+            fn()
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        return (time.perf_counter() - start) / self.num_iterations
+
+    def main(self) -> None:
+        """Main function."""
+        ray_bundle = _get_ray_bundle(self.num_rays, self.device)
+        ray_samples = _get_ray_samples(self.num_rays, self.num_samples, self.device)
+        cpu_ray_bundle = _get_ray_bundle(self.num_rays, "cpu")
+        indices = torch.randperm(self.num_rays, device=self.device)[: self.num_rays // 2]
+        image_ray_bundle = _get_ray_bundle(64 * 64, self.device).reshape((64, 64))
+
+        operations: Dict[str, Callable[[], object]] = {
+            "RayBundle[slice]": lambda: ray_bundle[: self.num_rays // 2],
+            "RayBundle[tensor]": lambda: ray_bundle[indices],
+            "RayBundle.reshape": lambda: ray_bundle.reshape((2, -1)),
+            "RayBundle.to": lambda: cpu_ray_bundle.to(self.device),
+            "RayBundle.get_row_major_sliced_ray_bundle": lambda: image_ray_bundle.get_row_major_sliced_ray_bundle(
+                0, self.num_rays
+            ),
+            "RaySamples[..., slice]": lambda: ray_samples[..., : self.num_samples // 2],
+            "RaySamples.flatten": lambda: ray_samples.flatten(),
+            "RaySamples.to": lambda: ray_samples.to(self.device),
+        }
+        table = Table(title=f"TensorDataclass operations ({self.device})")
+        table.add_column("Operation")
+        table.add_column("Time per call (us)", justify="right")
+        for name, fn in operations.items():
+            table.add_row(escape(name), f"{self._time(fn) * 1e6:.1f}")
+        CONSOLE.print(table)
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkTensorDataclass).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
@@ -0,0 +1,134 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+"""
+benchmark_undistortion.py
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+import torch
+import tyro
+from rich.table import Table
+
+from nerfstudio.cameras import camera_utils
+from nerfstudio.cameras.cameras import Cameras, CameraType
+from nerfstudio.utils.rich_utils import CONSOLE
+
+
+def _get_cameras(device: str) -> Dict[str, Cameras]:
+    c2w = torch.eye(4)[None, :3]
+    opencv = Cameras(
+        c2w,
+        fx=1150.0,
+        fy=1150.0,
+        cx=960.0,
+        cy=540.0,
+        width=1920,
+        height=1080,
+        distortion_params=camera_utils.get_distortion_params(k1=-0.12, k2=0.05, k3=-0.01, p1=0.001, p2=-0.0005),
+        camera_type=CameraType.PERSPECTIVE,
+    )
+    # Similar to the RGB camera of Project Aria glasses, see process_project_aria.py.
+    fisheye624_params = torch.tensor([[0.1, 0.01, -0.002, 0.0005, 0.0, 0.0, 1e-4, -2e-4, 1e-4, 0.0, -1e-4, 0.0]])
+    fisheye624 = Cameras(
+        c2w,
+        fx=610.0,
+        fy=610.0,
+        cx=715.0,
+        cy=716.0,
+        width=1408,
+        height=1408,
+        distortion_params=fisheye624_params,
+        camera_type=CameraType.FISHEYE624,
+    )
+    return {"opencv": opencv.to(device), "fisheye624": fisheye624.to(device)}
+
+
+@dataclass
+class BenchmarkUndistortion:
+    """Compare ray generation with undistortion maps against the iterative undistortion solvers."""
+
+    # Number of rays per batch, e.g. the rays of a training batch.
+    num_rays: int = 65536
+    # Number of timed batches.
+    num_iterations: int = 10
+    # Spacing of the grids of the maps in pixels.
+    spacing: float = 8.0
+    # Largest angular error of the maps, in radians.
+    max_angular_error: float = 1e-5
+    # Device to run on.
+    device: str = "cuda" if torch.cuda.is_available() else "cpu"
+
+    def _time(self, camera: Cameras, coords: torch.Tensor, camera_indices: torch.Tensor, use_maps: bool) -> float:
+        # Warm up, builds the maps.
+        camera.generate_rays(camera_indices=camera_indices, coords=coords, use_undistortion_maps=use_maps)
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(self.num_iterations):
+            camera.generate_rays(camera_indices=camera_indices, coords=coords, use_undistortion_maps=use_maps)
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        return (time.perf_counter() - start) / self.num_iterations
+
+    def main(self) -> None:
+        """Main function."""
+        maps = camera_utils.UNDISTORTION_MAPS
+        maps.spacing = self.spacing
+        maps.max_angular_error = self.max_angular_error
+        table = Table(title="Undistortion maps")
+        for column in ["Camera", "Iterative (ms)", "Maps (ms)", "Speedup", "Max angular error (rad)"]:
+            table.add_column(column)
+        for name, camera in _get_cameras(self.device).items():
+            torch.manual_seed(0)
+            size = torch.tensor([camera.height.item(), camera.width.item()], dtype=torch.float32)
+            coords = (torch.rand(self.num_rays, 2) * size).to(self.device)
+            camera_indices = torch.zeros(self.num_rays, 1, dtype=torch.long, device=self.device)
+
+            directions = {}
+            durations = {}
+            for use_maps in (False, True):
+                maps.clear()
+                durations[use_maps] = self._time(camera, coords, camera_indices, use_maps)
+                directions[use_maps] = camera.generate_rays(
+                    camera_indices=camera_indices, coords=coords, use_undistortion_maps=use_maps
+                ).directions
+            # atan2 of the cross and dot products is accurate for small angles, unlike acos of the dot product.
+            cross = torch.linalg.norm(torch.linalg.cross(directions[False], directions[True], dim=-1), dim=-1)
+            error = torch.atan2(cross, torch.sum(directions[False] * directions[True], dim=-1)).max().item()
+            table.add_row(
+                name,
+                f"{durations[False] * 1000:.1f}",
+                f"{durations[True] * 1000:.1f}",
+                f"{durations[False] / durations[True]:.2f}x",
+                f"{error:.2e}",
+            )
+        maps.clear()
+        CONSOLE.print(table)
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkUndistortion).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
@@ -40,6 +40,9 @@ class ComputePSNR:
     output_path: Path = Path("output.json")
     # Optional path to save rendered outputs to.
     render_output_path: Optional[Path] = None
+    # Number of eval images rendered together, so that the rays of small images share chunks. Only ray-based
+    # models render more than one image at a time.
+    num_images_per_batch: int = 1
 
     def main(self) -> None:
         """Main function."""
@@ -47,7 +50,9 @@ class ComputePSNR:
         assert self.output_path.suffix == ".json"
         if self.render_output_path is not None:
             self.render_output_path.mkdir(parents=True, exist_ok=True)
-        metrics_dict = pipeline.get_average_eval_image_metrics(output_path=self.render_output_path, get_std=True)
+        metrics_dict = pipeline.get_average_eval_image_metrics(
+            output_path=self.render_output_path, get_std=True, num_images_per_batch=self.num_images_per_batch
+        )
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
         # Get the output and define the names to save to
         benchmark_info = {
@@ -418,6 +418,9 @@ class BaseRender:
     """Scaling factor to apply to the camera image resolution."""
     eval_num_rays_per_chunk: Optional[int] = None
     """Specifies number of rays per chunk during eval. If None, use the value in the config file."""
+    eval_memory_budget_mb: Optional[float] = None
+    """If set, tune the number of rays per chunk so that rendering a chunk allocates at most this many megabytes.
+    If None, use the value in the config file."""
     rendered_output_names: List[str] = field(default_factory=lambda: ["rgb"])
     """Name of the renderer outputs to use. rgb, depth, etc. concatenates them along y axis"""
     depth_near_plane: Optional[float] = None
@@ -448,6 +451,7 @@ class RenderCameraPath(BaseRender):
         _, pipeline, _, _ = eval_setup(
             self.load_config,
             eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+            eval_memory_budget_mb=self.eval_memory_budget_mb,
             test_mode="inference",
         )
 
@@ -603,6 +607,7 @@ class RenderInterpolated(BaseRender):
         _, pipeline, _, _ = eval_setup(
             self.load_config,
             eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+            eval_memory_budget_mb=self.eval_memory_budget_mb,
             test_mode="test",
         )
 
@@ -660,6 +665,7 @@ class SpiralRender(BaseRender):
         _, pipeline, _, _ = eval_setup(
             self.load_config,
             eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+            eval_memory_budget_mb=self.eval_memory_budget_mb,
             test_mode="test",
         )
 
@@ -747,6 +753,7 @@ class DatasetRender(BaseRender):
         config, pipeline, _, _ = eval_setup(
             self.load_config,
             eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+            eval_memory_budget_mb=self.eval_memory_budget_mb,
             test_mode="inference",
             update_config_callback=update_config,
         )
@@ -70,6 +70,7 @@ def eval_setup(
     eval_num_rays_per_chunk: Optional[int] = None,
     test_mode: Literal["test", "val", "inference"] = "test",
     update_config_callback: Optional[Callable[[TrainerConfig], TrainerConfig]] = None,
+    eval_memory_budget_mb: Optional[float] = None,
 ) -> Tuple[TrainerConfig, Pipeline, Path, int]:
     """Shared setup for loading a saved pipeline for evaluation.
 
@@ -81,6 +82,7 @@ def eval_setup(
             'test': loads train/test dataset into memory
             'inference': does not load any dataset into memory
         update_config_callback: Callback to update the config before loading the pipeline
+        eval_memory_budget_mb: Memory budget in megabytes the number of rays per forward pass is tuned against
 
 
     Returns:
@@ -93,6 +95,8 @@ def eval_setup(
     config.pipeline.datamanager._target = all_methods[config.method_name].pipeline.datamanager._target
     if eval_num_rays_per_chunk:
         config.pipeline.model.eval_num_rays_per_chunk = eval_num_rays_per_chunk
+    if eval_memory_budget_mb:
+        config.pipeline.model.eval_memory_budget_mb = eval_memory_budget_mb
 
     if update_config_callback is not None:
         config = update_config_callback(config)
@@ -106,6 +110,9 @@ def eval_setup(
     pipeline = config.pipeline.setup(device=device, test_mode=test_mode)
     assert isinstance(pipeline, Pipeline)
     pipeline.eval()
+    if pipeline.model.chunk_size_tuner is not None:
+        # Share the tuned chunk size between the eval, render and viewer runs of the model.
+        pipeline.model.chunk_size_tuner.set_cache(config.get_base_dir() / "eval_chunk_sizes.json", device)
 
     # load checkpointed information
     checkpoint_path, step = eval_load_checkpoint(config, pipeline)
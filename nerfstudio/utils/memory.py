@@ -0,0 +1,166 @@
+# Copyright 2022 the Regents of the University of California, Nerfstudio Team and contributors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Peak memory measurements, and eval chunk sizes tuned against a memory budget.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Optional, Union
+
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+
+class PeakMemoryMonitor:
+    """Context manager measuring the peak memory allocated while it is active.
+
+    On CUDA devices, the peak is read from the caching allocator. On CPU, the allocations and frees of tensors are
+    recorded with the PyTorch profiler, as they are neither seen by tracemalloc nor reliably reflected in the
+    resident set size, which the allocator does not shrink after each free.
+
+    Args:
+        device: Device to measure the memory of.
+    """
+
+    def __init__(self, device: Union[torch.device, str]):
+        self.device = torch.device(device)
+        self.peak_bytes = 0
+        """Peak memory allocated while active, over the memory allocated when entering."""
+        self._start = 0
+        self._profiler: Optional[profile] = None
+
+    def __enter__(self) -> PeakMemoryMonitor:
+        self.peak_bytes = 0
+        if self.device.type == "cuda":
+            torch.cuda.reset_peak_memory_stats(self.device)
+            self._start = torch.cuda.memory_allocated(self.device)
+        else:
+            self._profiler = profile(activities=[ProfilerActivity.CPU], profile_memory=True)
+            self._profiler.__enter__()
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self.device.type == "cuda":
+            self.peak_bytes = torch.cuda.max_memory_allocated(self.device) - self._start
+            return
+        assert self._profiler is not None
+        self._profiler.__exit__(*args)
+        # Frees are recorded as events with negative usage, replay them in order.
+        allocated = 0
+        for event in sorted(self._profiler.events(), key=lambda event: event.time_range.start):
+            allocated += event.self_cpu_memory_usage
+            self.peak_bytes = max(self.peak_bytes, allocated)
+        self._profiler = None
+
+
+class ChunkSizeTuner:
+    """Tunes the number of rays rendered per chunk so that the peak memory of a chunk stays within a budget.
+
+    The memory per ray is measured on the first full chunks, and the chunk size grows or shrinks geometrically
+    towards the largest size within the budget. The tuned size is then kept for every later render, and can be
+    saved for later runs with `set_cache`.
+
+    Args:
+        memory_budget: Largest memory a chunk may allocate, in bytes.
+        num_rays_per_chunk: Initial number of rays per chunk.
+        min_num_rays_per_chunk: Smallest number of rays per chunk.
+        max_num_rays_per_chunk: Largest number of rays per chunk.
+        growth: Largest factor the chunk size changes by after a measurement.
+        num_measurements: Number of chunks measured before the chunk size is fixed.
+    """
+
+    def __init__(
+        self,
+        memory_budget: float,
+        num_rays_per_chunk: int,
+        min_num_rays_per_chunk: int = 256,
+        max_num_rays_per_chunk: int = 2**20,
+        growth: float = 2.0,
+        num_measurements: int = 8,
+    ):
+        self.memory_budget = memory_budget
+        self.min_num_rays_per_chunk = min_num_rays_per_chunk
+        self.max_num_rays_per_chunk = max_num_rays_per_chunk
+        self.num_rays_per_chunk = self._clamp(num_rays_per_chunk)
+        self.growth = growth
+        self.num_measurements = num_measurements
+        self._num_measured = 0
+        self._cache_path: Optional[Path] = None
+        self._cache_key = ""
+
+    def set_cache(self, cache_path: Path, device: Union[torch.device, str]) -> None:
+        """Restores the chunk size tuned by an earlier run, and saves the chunk size once tuned.
+
+        Args:
+            cache_path: JSON file of the tuned chunk sizes, e.g. next to the config of a model.
+            device: Device the model runs on, chunk sizes are tuned per device type and memory budget.
+        """
+        device = torch.device(device)
+        device_name = torch.cuda.get_device_name(device) if device.type == "cuda" else device.type
+        self._cache_path = Path(cache_path)
+        self._cache_key = f"{device_name}|{self.memory_budget:.0f}"
+        if self._cache_path.exists():
+            tuned = json.loads(self._cache_path.read_text(encoding="utf-8"))
+            if self._cache_key in tuned:
+                self.num_rays_per_chunk = self._clamp(tuned[self._cache_key])
+                self._num_measured = self.num_measurements
+
+    def _save_cache(self) -> None:
+        if self._cache_path is None:
+            return
+        tuned = {}
+        if self._cache_path.exists():
+            tuned = json.loads(self._cache_path.read_text(encoding="utf-8"))
+        tuned[self._cache_key] = self.num_rays_per_chunk
+        try:
+            self._cache_path.write_text(json.dumps(tuned, indent=2), encoding="utf-8")
+        except OSError:
+            # e.g. a read-only output directory, the chunk size is tuned again next time.
+            pass
+
+    def _clamp(self, num_rays_per_chunk: float) -> int:
+        return int(min(max(num_rays_per_chunk, self.min_num_rays_per_chunk), self.max_num_rays_per_chunk))
+
+    @property
+    def is_tuning(self) -> bool:
+        """Whether chunks are still being measured."""
+        return self._num_measured < self.num_measurements
+
+    def update(self, num_rays: int, peak_bytes: int) -> None:
+        """Updates the chunk size from the peak memory of a chunk.
+
+        Args:
+            num_rays: Number of rays of the chunk. Chunks smaller than the chunk size, e.g. the last chunk of an
+                image, are not representative and are ignored.
+            peak_bytes: Peak memory allocated while rendering the chunk.
+        """
+        if not self.is_tuning or num_rays < self.num_rays_per_chunk or peak_bytes <= 0:
+            return
+        self._num_measured += 1
+        target = self.memory_budget / (peak_bytes / num_rays)
+        target = min(max(target, self.num_rays_per_chunk / self.growth), self.num_rays_per_chunk * self.growth)
+        self.num_rays_per_chunk = self._clamp(target)
+        if not self.is_tuning:
+            self._save_cache()
+
+    def shrink(self) -> None:
+        """Shrinks the chunk size after running out of memory, and keeps tuning from there."""
+        self.num_rays_per_chunk = self._clamp(self.num_rays_per_chunk / self.growth)
+        # Other allocations left less memory than the budget, don't grow back to the size that failed.
+        self.memory_budget /= self.growth
+        self._num_measured = 0
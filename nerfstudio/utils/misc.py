@@ -17,10 +17,12 @@ Miscellaneous helper code.
 """
 
 import platform
+import queue
+import threading
 import typing
 import warnings
 from inspect import currentframe
-from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar, Union
 
 import torch
 
@@ -119,6 +121,54 @@ class IterableWrapper:
         return self
 
 
+def prefetch(iterable: Iterable[T], num_prefetch: int = 2) -> Iterator[T]:
+    """Iterates over an iterable in a background thread, which keeps up to num_prefetch items ready ahead of the
+    consumer. Useful when producing the items (e.g. loading images) is independent from consuming them.
+
+    Exceptions raised while iterating are raised again by the returned iterator. The background thread stops once
+    the returned iterator is exhausted or garbage collected.
+
+    Args:
+        iterable: The iterable to iterate over.
+        num_prefetch: Maximum number of items produced ahead of the consumer.
+    """
+    items: queue.Queue = queue.Queue(maxsize=max(num_prefetch, 1))
+    stop = threading.Event()
+    end = object()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:  # pylint: disable=broad-except
+            put((end, e))
+            return
+        put((end, None))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
 def scale_dict(dictionary: Dict[Any, Any], coefficients: Dict[str, float]) -> Dict[Any, Any]:
     """Scale a dictionary in-place given a coefficients dictionary.
 
@@ -15,6 +15,7 @@
 """Tensor dataclass"""
 
 import dataclasses
+import functools
 from copy import deepcopy
 from typing import Callable, Dict, List, NoReturn, Optional, Tuple, TypeVar, Union
 
@@ -24,6 +25,12 @@ import torch
 TensorDataclassT = TypeVar("TensorDataclassT", bound="TensorDataclass")
 
 
+@functools.lru_cache(maxsize=None)
+def _get_field_names(cls: type) -> Tuple[str, ...]:
+    """Returns the names of the fields of a dataclass type, cached as `dataclasses.fields` is slow."""
+    return tuple(f.name for f in dataclasses.fields(cls))
+
+
 class TensorDataclass:
     """@dataclass of tensors with the same size batch. Allows indexing and standard tensor ops.
     Fields that are not Tensors will not be batched unless they are also a TensorDataclass.
@@ -80,13 +87,14 @@ class TensorDataclass:
         if not dataclasses.is_dataclass(self_dc):
             raise TypeError("TensorDataclass must be a dataclass")
 
-        batch_shapes = self._get_dict_batch_shapes({f.name: getattr(self, f.name) for f in dataclasses.fields(self_dc)})
+        field_names = _get_field_names(type(self_dc))
+        batch_shapes = self._get_dict_batch_shapes({name: getattr(self, name) for name in field_names})
         if len(batch_shapes) == 0:
             raise ValueError("TensorDataclass must have at least one tensor")
         batch_shape = torch.broadcast_shapes(*batch_shapes)
 
         broadcasted_fields = self._broadcast_dict_fields(
-            {f.name: getattr(self, f.name) for f in dataclasses.fields(self_dc)}, batch_shape
+            {name: getattr(self, name) for name in field_names}, batch_shape
         )
         for f, v in broadcasted_fields.items():
             object.__setattr__(self, f, v)
@@ -253,16 +261,17 @@ class TensorDataclass:
             lambda x: x.broadcast_to((*shape, x.shape[-1])), custom_tensor_dims_fn=custom_tensor_dims_fn
         )
 
-    def to(self: TensorDataclassT, device) -> TensorDataclassT:
+    def to(self: TensorDataclassT, device, non_blocking: bool = False) -> TensorDataclassT:
         """Returns a new TensorDataclass with the same data but on the specified device.
 
         Args:
             device: The device to place the tensor dataclass.
+            non_blocking: Whether copies from pinned memory are asynchronous with respect to the host.
 
         Returns:
             A new TensorDataclass with the same data but on the specified device.
         """
-        return self._apply_fn_to_fields(lambda x: x.to(device))
+        return self._apply_fn_to_fields(lambda x: x.to(device, non_blocking=non_blocking))
 
     def pin_memory(self: TensorDataclassT) -> TensorDataclassT:
         """Pins the tensor dataclass memory
@@ -301,13 +310,23 @@ class TensorDataclass:
         assert dataclasses.is_dataclass(self_dc)
 
         new_fields = self._apply_fn_to_dict(
-            {f.name: getattr(self, f.name) for f in dataclasses.fields(self_dc)},
+            {name: getattr(self, name) for name in _get_field_names(type(self_dc))},
             fn,
             dataclass_fn,
             custom_tensor_dims_fn,
         )
 
-        return dataclasses.replace(self_dc, **new_fields)
+        batch_shapes = self._get_dict_batch_shapes(new_fields)
+        if len(batch_shapes) == 0 or any(batch_shape != batch_shapes[0] for batch_shape in batch_shapes[1:]):
+            # The new fields need to be broadcast (or rejected) by __post_init__.
+            return dataclasses.replace(self_dc, **new_fields)
+        # Fast path, the new fields already share a batch shape so there is nothing for __init__ to do. The
+        # attributes that are not fields, e.g. Cameras._field_custom_dimensions, are carried over.
+        new = object.__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new.__dict__.update(new_fields)
+        new.__dict__["_shape"] = batch_shapes[0]
+        return new
 
     def _apply_fn_to_dict(
         self,
@@ -3,11 +3,13 @@ Test the camera classes.
 """
 
 import dataclasses
+import threading
 from itertools import product
 
 import torch
 
-from nerfstudio.cameras.cameras import Cameras, CameraType
+from nerfstudio.cameras import camera_utils
+from nerfstudio.cameras.cameras import RAY_DIRECTIONS_CACHE, Cameras, CameraType, RayDirectionsCache
 from nerfstudio.cameras.rays import RayBundle
 
 BATCH_SIZE = 2
@@ -121,6 +123,137 @@ def test_pinhole_camera():
     pinhole_camera.generate_rays(camera_indices=0, coords=coords)
 
 
+def test_ray_directions_cache():
+    """Test that rays generated from cached directions match rays generated from scratch."""
+    c2w = torch.eye(4)[None, :3, :].repeat(2, 1, 1)
+    c2w[1, :3, :3] = torch.tensor([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+    c2w[1, :3, 3] = 1.0
+    distortion_params = camera_utils.get_distortion_params(k1=0.1, k2=0.01, p1=0.001)
+    cameras = Cameras(
+        camera_to_worlds=c2w,
+        fx=30.0,
+        fy=30.0,
+        cx=32.0,
+        cy=24.0,
+        width=64,
+        height=48,
+        distortion_params=distortion_params,
+    )
+    RAY_DIRECTIONS_CACHE.clear()
+    cameras.generate_rays(camera_indices=0)
+    assert len(RAY_DIRECTIONS_CACHE) == 1
+    cached = cameras.generate_rays(camera_indices=1)
+    assert len(RAY_DIRECTIONS_CACHE) == 1
+
+    RAY_DIRECTIONS_CACHE.clear()
+    max_bytes, RAY_DIRECTIONS_CACHE.max_bytes = RAY_DIRECTIONS_CACHE.max_bytes, 0
+    try:
+        uncached = cameras.generate_rays(camera_indices=1)
+    finally:
+        RAY_DIRECTIONS_CACHE.max_bytes = max_bytes
+    assert len(RAY_DIRECTIONS_CACHE) == 0
+    assert torch.equal(cached.origins, uncached.origins)
+    assert torch.equal(cached.directions, uncached.directions)
+    assert torch.equal(cached.pixel_area, uncached.pixel_area)
+
+
+def test_ray_directions_cache_threads():
+    """Test that the ray directions cache stays consistent when used from several threads."""
+    cache = RayDirectionsCache(max_bytes=10 * 4 * 16)
+
+    def use_cache(thread_idx: int) -> None:
+        for i in range(2000):
+            key = ((thread_idx + i) % 13,)
+            if cache.get(key) is None:
+                cache.put(key, torch.zeros(4, 4))
+
+    threads = [threading.Thread(target=use_cache, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 10
+    assert cache._num_bytes == 10 * 4 * 16
+
+
+def test_undistortion_maps():
+    """Test that rays undistorted with undistortion maps match rays undistorted iteratively."""
+    c2w = torch.eye(4)[None, :3, :].repeat(2, 1, 1)
+    distortion_params = camera_utils.get_distortion_params(k1=-0.2, k2=0.05, p1=0.001, p2=-0.002)
+    cameras = Cameras(
+        camera_to_worlds=c2w,
+        fx=30.0,
+        fy=30.0,
+        cx=32.0,
+        cy=24.0,
+        width=64,
+        height=48,
+        distortion_params=distortion_params,
+    )
+    coords = torch.rand(500, 2) * torch.tensor([48.0, 64.0])
+    camera_indices = torch.randint(0, 2, (500, 1))
+    iterative = cameras.generate_rays(camera_indices=camera_indices, coords=coords)
+
+    camera_utils.UNDISTORTION_MAPS.clear()
+    try:
+        interpolated = cameras.generate_rays(camera_indices=camera_indices, coords=coords, use_undistortion_maps=True)
+        # Both cameras share one model, and so one map.
+        assert len(camera_utils.UNDISTORTION_MAPS._maps) == 1
+    finally:
+        camera_utils.UNDISTORTION_MAPS.clear()
+    cross = torch.linalg.norm(torch.linalg.cross(iterative.directions, interpolated.directions, dim=-1), dim=-1)
+    assert cross.max() <= 2 * camera_utils.UNDISTORTION_MAPS.max_angular_error
+
+
+def test_undistortion_maps_threads():
+    """Test that the undistortion maps cache stays consistent when used from several threads."""
+    maps = camera_utils.UndistortionMaps(max_maps=3)
+    errors = []
+
+    def use_maps(thread_idx: int) -> None:
+        try:
+            for i in range(200):
+                key = ((thread_idx + i) % 5,)
+                maps.get(key, lambda coords: coords, (0.0, 0.0), (16.0, 16.0), (1.0, 1.0), "cpu")
+        except Exception as e:  # pylint: disable=broad-except
+            errors.append(e)
+
+    threads = [threading.Thread(target=use_maps, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(maps._maps) == 3
+
+
+def test_packed_rays():
+    """Test that packed rays of cameras of different sizes match the rays of each camera."""
+    c2w = torch.eye(4)[None, :3, :].repeat(3, 1, 1)
+    c2w[:, :3, 3] = torch.rand(3, 3)
+    cameras = Cameras(
+        camera_to_worlds=c2w,
+        fx=torch.tensor([[10.0], [12.0], [8.0]]),
+        fy=torch.tensor([[10.0], [12.0], [8.0]]),
+        cx=torch.tensor([[5.0], [6.0], [2.0]]),
+        cy=torch.tensor([[4.0], [3.0], [3.0]]),
+        width=torch.tensor([[10], [12], [4]]),
+        height=torch.tensor([[8], [6], [7]]),
+    )
+    camera_indices = torch.tensor([[2], [0], [1]])
+    ray_bundle, offsets = cameras.generate_packed_rays(camera_indices)
+    assert offsets.tolist() == [0, 28, 108, 180]
+    for i, index in enumerate(camera_indices[:, 0].tolist()):
+        rays = cameras.generate_rays(camera_indices=index).flatten()
+        packed = ray_bundle[offsets[i] : offsets[i + 1]]
+        assert torch.allclose(rays.origins, packed.origins)
+        assert torch.allclose(rays.directions, packed.directions)
+        assert torch.all(packed.camera_indices == index)
+
+    # Jagged cameras are packed by generate_rays too.
+    assert torch.allclose(cameras.generate_rays(camera_indices=camera_indices).directions, ray_bundle.directions)
+
+
 def test_orthophoto_camera():
     """Test that the orthographic camera model works."""
     c2w = torch.eye(4)[None, :3, :]
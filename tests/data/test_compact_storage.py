@@ -0,0 +1,39 @@
+"""
+Test the compact storage of masks, depth and semantics
+"""
+
+import torch
+
+from nerfstudio.data.utils.compact_storage import (
+    CompactStorageConfig,
+    compact_data,
+    expand_data,
+    pack_mask,
+    unpack_mask,
+)
+
+
+def test_pack_mask_roundtrip():
+    mask = torch.rand(2, 7, 13, 1) > 0.5
+    packed = pack_mask(mask)
+    assert packed.dtype == torch.uint8
+    assert packed.shape == (2, 7, 2, 1)
+    assert torch.equal(unpack_mask(packed, width=13), mask)
+
+
+def test_compact_data_roundtrip():
+    config = CompactStorageConfig(pack_masks=True, depth_dtype="uint16", depth_scale=1000.0, uint8_semantics=True)
+    data = {
+        "image": torch.rand(7, 13, 3),
+        "mask": torch.rand(7, 13, 1) > 0.5,
+        "depth_image": torch.rand(7, 13, 1, dtype=torch.float64) * 20,
+        "semantics": torch.randint(0, 256, (7, 13, 1)),
+    }
+    compacted = compact_data(data, config)
+    assert compacted["depth_image"].element_size() == 2
+    assert compacted["semantics"].dtype == torch.uint8
+
+    expanded = expand_data(compacted, config)
+    assert torch.equal(expanded["mask"], data["mask"])
+    assert torch.equal(expanded["semantics"], data["semantics"])
+    assert torch.allclose(expanded["depth_image"].double(), data["depth_image"], atol=0.5 / config.depth_scale + 1e-6)
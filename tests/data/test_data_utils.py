@@ -0,0 +1,40 @@
+"""
+Test the data utilities
+"""
+
+import numpy as np
+from PIL import Image
+
+from nerfstudio.data.utils.data_utils import resize_image
+
+
+def test_resize_image(tmp_path):
+    """Test that JPEG images decoded in draft mode match full decodes, and that other paths don't use draft mode"""
+    width, height = 256, 192
+    x, y = np.meshgrid(np.linspace(0, 1, width), np.linspace(0, 1, height))
+    pixels = np.stack([x, y, 0.5 + 0.5 * np.sin(6 * x) * np.cos(4 * y)], axis=-1)
+    pixels = pixels * 255 + np.random.default_rng(0).normal(0, 2, pixels.shape)
+    image = Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+    image.save(tmp_path / "image.jpg", quality=95)
+    image.save(tmp_path / "image.png")
+    size = (width // 4, height // 4)
+
+    jpeg = Image.open(tmp_path / "image.jpg")
+    resized = resize_image(jpeg, size)
+    assert resized.size == size
+    # Draft mode decoded the image at a reduced size.
+    assert jpeg.size != (width, height)
+    expected = Image.open(tmp_path / "image.jpg").resize(size, resample=Image.Resampling.BILINEAR)
+    assert np.abs(np.asarray(resized, dtype=np.float32) - np.asarray(expected)).mean() < 2
+
+    jpeg = Image.open(tmp_path / "image.jpg")
+    resized = resize_image(jpeg, size, resample=Image.Resampling.NEAREST)
+    assert jpeg.size == (width, height)
+    expected = Image.open(tmp_path / "image.jpg").resize(size, resample=Image.Resampling.NEAREST)
+    assert np.array_equal(np.asarray(resized), np.asarray(expected))
+
+    png = Image.open(tmp_path / "image.png")
+    resized = resize_image(png, size)
+    assert png.size == (width, height)
+    expected = Image.open(tmp_path / "image.png").resize(size, resample=Image.Resampling.BILINEAR)
+    assert np.array_equal(np.asarray(resized), np.asarray(expected))
@@ -13,8 +13,11 @@ from nerfstudio.data.datamanagers.base_datamanager import (
     VanillaDataManager,
     VanillaDataManagerConfig,
 )
+from nerfstudio.data.datamanagers.full_images_datamanager import _add_pyramid_level
 from nerfstudio.data.datasets.base_dataset import InputDataset
 from nerfstudio.data.datasets.depth_dataset import DepthDataset
+from nerfstudio.data.utils.data_utils import downscale_image_area, get_pyramid_key
+from nerfstudio.utils import comms
 
 
 class DummyDataParser:
@@ -153,3 +156,31 @@ def test_deserialize_config2():
         config_str = f.read()
     obj = yaml.load(config_str, Loader=yaml.Loader)
     obj.pipeline.datamanager.collate_fn([1, 2, 3])
+
+
+def test_pyramid_levels():
+    data = {"image": torch.randint(0, 256, (50, 37, 3), dtype=torch.uint8), "mask": torch.rand(50, 37, 1) > 0.5}
+    for downscale_factor in (2, 4):
+        _add_pyramid_level(data, downscale_factor)
+        image = data[get_pyramid_key("image", downscale_factor)]
+        assert image.dtype == torch.uint8
+        assert image.shape == (50 // downscale_factor, 37 // downscale_factor, 3)
+        assert (image.float() - downscale_image_area(data["image"], downscale_factor)).abs().max() <= 0.5
+        mask = data[get_pyramid_key("mask", downscale_factor)]
+        assert torch.equal(mask, downscale_image_area(data["mask"], downscale_factor))
+
+
+def test_train_shards(config, monkeypatch):
+    config.shard_train_images = True
+    config.shard_rotation_interval = 100
+    datamanager = VanillaDataManager(config)
+    monkeypatch.setattr(comms, "get_world_size", lambda: 3)
+    for step in (0, 100, 200):
+        shards = []
+        for rank in range(3):
+            monkeypatch.setattr(comms, "get_rank", lambda: rank)
+            shards.append(datamanager.get_train_shard(10, step))
+        assert sorted(sum(shards, [])) == list(range(10))
+        assert shards[0] == list(range(step // 100, 10, 3))
+    assert not datamanager.is_shard_rotation_step(0)
+    assert datamanager.is_shard_rotation_step(200)
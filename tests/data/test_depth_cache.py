@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
+from nerfstudio.data.datasets.depth_dataset import DepthDataset
+from nerfstudio.data.utils.depth_cache import PseudoDepthCache
+
+
+def _stub_estimator(image):
+    return image.mean(dim=-1, keepdim=True) + 1.0
+
+
+def test_pseudo_depth_cache_resumes(tmp_path):
+    images = [torch.rand(4 + i, 5, 3) for i in range(4)]
+    cache = PseudoDepthCache(tmp_path, [image.shape[:2] for image in images])
+    calls = []
+
+    def interrupted_estimator(image):
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        calls.append(image)
+        return _stub_estimator(image)
+
+    with pytest.raises(KeyboardInterrupt):
+        cache.generate(lambda idx: images[idx], interrupted_estimator, num_workers=1)
+    assert cache.missing_indices == [2, 3]
+
+    # A new cache on the same directory only generates the missing depth maps.
+    resumed = PseudoDepthCache(tmp_path, [image.shape[:2] for image in images])
+    assert resumed.missing_indices == [2, 3]
+    resumed.generate(lambda idx: images[idx], _stub_estimator)
+    assert resumed.is_complete()
+    for idx, image in enumerate(images):
+        assert torch.allclose(resumed.get(idx), _stub_estimator(image))
+
+
+def test_depth_dataset_pseudo_depth(tmp_path):
+    class StubDepthDataset(DepthDataset):
+        def get_depth_estimator(self, device):
+            return _stub_estimator
+
+    image_filenames = []
+    for i in range(3):
+        image_filenames.append(tmp_path / f"image_{i}.png")
+        Image.fromarray(np.full((6, 8, 3), 50 * i, dtype=np.uint8)).save(image_filenames[-1])
+    cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3].repeat(3, 1, 1), fx=4.0, fy=4.0, cx=4.0, cy=3.0, width=8, height=6
+    )
+    dataset = StubDepthDataset(DataparserOutputs(image_filenames=image_filenames, cameras=cameras))
+    data = dataset[2]
+    assert data["depth_image"].shape == (6, 8, 1)
+    assert torch.allclose(data["depth_image"], torch.full((6, 8, 1), 100 / 255 + 1.0))
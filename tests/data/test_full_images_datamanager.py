@@ -0,0 +1,155 @@
+"""
+Test the full image datamanager
+"""
+
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from nerfstudio.cameras.cameras import Cameras, CameraType
+from nerfstudio.data.datamanagers.full_images_datamanager import (
+    FullImageDatamanagerConfig,
+    _group_cameras_by_intrinsics,
+    _undistort_image,
+    apply_undistortion_maps,
+    get_undistortion_maps,
+)
+from nerfstudio.data.dataparsers.nerfstudio_dataparser import NerfstudioDataParserConfig
+from nerfstudio.data.datasets.base_dataset import InputDataset
+from nerfstudio.data.utils.data_utils import get_pyramid_key
+
+
+def _write_distorted_dataset(data_dir: Path, num_images: int = 4, width: int = 40, height: int = 30) -> None:
+    data_dir.mkdir(parents=True, exist_ok=True)
+    frames = []
+    for i in range(num_images):
+        image = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+        Image.fromarray(image).save(data_dir / f"frame_{i}.png")
+        c2w = np.eye(4)
+        c2w[0, 3] = i * 0.1
+        frames.append({"file_path": f"frame_{i}.png", "transform_matrix": c2w.tolist()})
+    transforms = {
+        "camera_model": "OPENCV",
+        "fl_x": 35.0,
+        "fl_y": 35.0,
+        "cx": width / 2,
+        "cy": height / 2,
+        "w": width,
+        "h": height,
+        "k1": 0.1,
+        "k2": -0.02,
+        "p1": 0.001,
+        "p2": 0.0,
+        "frames": frames,
+    }
+    (data_dir / "transforms.json").write_text(json.dumps(transforms))
+
+
+def test_undistort_cache(tmp_path, monkeypatch):
+    """Test that warm starts restore the undistorted images and intrinsics without loading the images"""
+    _write_distorted_dataset(tmp_path / "data")
+    config = FullImageDatamanagerConfig(
+        dataparser=NerfstudioDataParserConfig(data=tmp_path / "data"),
+        cache_images="gpu",
+        undistort_cache_dir=tmp_path / "cache",
+    )
+    cold = config.setup(device="cpu")
+    cold_images = cold.cached_train
+    assert len(list((tmp_path / "cache").glob("*.npz"))) == len(cold_images)
+
+    def get_data(*args, **kwargs):
+        raise AssertionError("The images should be restored from the undistortion cache")
+
+    monkeypatch.setattr(InputDataset, "get_data", get_data)
+    warm = config.setup(device="cpu")
+    warm_images = warm.cached_train
+    for cold_data, warm_data in zip(cold_images, warm_images):
+        assert cold_data.keys() == warm_data.keys()
+        assert torch.equal(cold_data["image"], warm_data["image"])
+    for name in ("fx", "fy", "cx", "cy", "width", "height"):
+        assert torch.equal(getattr(cold.train_dataset.cameras, name), getattr(warm.train_dataset.cameras, name))
+
+
+def _get_cameras(camera_type: CameraType, distortion_params: torch.Tensor, num_cameras: int = 2) -> Cameras:
+    return Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3, :].repeat(num_cameras, 1, 1),
+        fx=35.0,
+        fy=36.0,
+        cx=20.0,
+        cy=15.0,
+        width=40,
+        height=30,
+        distortion_params=distortion_params.repeat(num_cameras, 1),
+        camera_type=camera_type,
+    )
+
+
+def test_undistortion_maps():
+    """Test that remap tables shared by the frames of a camera undistort them like per-frame undistortion"""
+    for camera_type, distortion_params in (
+        (CameraType.PERSPECTIVE, torch.tensor([0.1, -0.02, 0.0, 0.0, 0.001, 0.002])),
+        (CameraType.FISHEYE, torch.tensor([0.05, -0.01, 0.002, 0.0, 0.0, 0.0])),
+    ):
+        cameras = _get_cameras(camera_type, distortion_params)
+        assert _group_cameras_by_intrinsics(cameras) == [0, 0]
+        camera = cameras[0].reshape(())
+        K = camera.get_intrinsics_matrices().numpy()
+        maps = get_undistortion_maps(camera, distortion_params.numpy(), K)
+        for _ in range(2):
+            image = np.random.randint(0, 256, (30, 40, 3), dtype=np.uint8)
+            mask = torch.rand(30, 40, 1) > 0.2
+            expected_K, expected_image, expected_mask = _undistort_image(
+                camera, distortion_params.numpy(), {"mask": mask}, image, K.copy()
+            )
+            new_K, new_image, new_mask = apply_undistortion_maps(maps, {"mask": mask}, image)
+            assert np.allclose(new_K, expected_K)
+            assert np.array_equal(new_image, expected_image)
+            assert new_mask is not None and expected_mask is not None
+            assert torch.equal(new_mask, expected_mask)
+            if camera_type == CameraType.PERSPECTIVE:
+                # Same remap tables as cv2.undistort, which the per-frame undistortion used before.
+                params = np.concatenate([distortion_params[[0, 1, 4, 5, 2, 3]].numpy(), np.zeros(2)])
+                cv_K = K.copy()
+                cv_K[:2, 2] -= 0.5
+                cv_new_K = new_K.copy()
+                cv_new_K[:2, 2] -= 0.5
+                assert maps.roi is not None
+                x, y, w, h = maps.roi
+                reference = cv2.undistort(image, cv_K, params, None, cv_new_K)[y : y + h, x : x + w]
+                assert np.abs(new_image.astype(int) - reference.astype(int)).max() <= 1
+
+
+def test_group_cameras_by_fisheye_crop_radius():
+    """Test that fisheye cameras with different crop radii don't share remap tables"""
+    cameras = _get_cameras(CameraType.FISHEYE, torch.zeros(6), num_cameras=3)
+    cameras.metadata = {"fisheye_crop_radius": torch.tensor([12.0, 14.0, 12.0])}
+    assert _group_cameras_by_intrinsics(cameras) == [0, 1, 0]
+    cameras.metadata = {"fisheye_crop_radius": 12.0}
+    assert _group_cameras_by_intrinsics(cameras) == [0, 0, 0]
+
+
+def test_release_pyramid_levels(tmp_path):
+    """Test that the downscaled train images are freed once a resolution schedule no longer uses them"""
+    _write_distorted_dataset(tmp_path / "data")
+    config = FullImageDatamanagerConfig(
+        dataparser=NerfstudioDataParserConfig(data=tmp_path / "data"),
+        cache_images="gpu",
+        cache_pyramid_levels=2,
+    )
+    datamanager = config.setup(device="cpu")
+    pyramid_keys = [get_pyramid_key(key, d) for key in ("image", "mask") for d in (2, 4)]
+    assert all(get_pyramid_key("image", d) in data for data in datamanager.cached_train for d in (2, 4))
+    datamanager.release_pyramid_levels(2)
+    assert all(
+        [key for key in pyramid_keys if key in data] == ["image_downscale_2"] for data in datamanager.cached_train
+    )
+    datamanager.release_pyramid_levels(4)
+    assert all("image_downscale_2" in data for data in datamanager.cached_train)
+    datamanager.release_pyramid_levels(1)
+    assert not any(key in data for key in pyramid_keys for data in datamanager.cached_train)
+    _, batch = datamanager.next_train(0)
+    assert not any(key in batch for key in pyramid_keys)
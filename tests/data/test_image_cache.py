@@ -0,0 +1,52 @@
+import pickle
+
+import numpy as np
+from PIL import Image
+
+from nerfstudio.data.utils.image_cache import DecodedImageCache
+
+
+def _load(filepath):
+    return np.array(Image.open(filepath), dtype="uint8")
+
+
+def test_image_cache_roundtrip(tmp_path):
+    image_path = tmp_path / "image.png"
+    image = np.random.randint(0, 255, (7, 5, 3), dtype=np.uint8)
+    Image.fromarray(image).save(image_path)
+
+    cache = DecodedImageCache(tmp_path / "cache")
+    calls = []
+
+    def load_fn(filepath):
+        calls.append(filepath)
+        return _load(filepath)
+
+    first = cache.get_or_load(image_path, 1.0, load_fn)
+    second = cache.get_or_load(image_path, 1.0, load_fn)
+    assert len(calls) == 1
+    np.testing.assert_array_equal(first, image)
+    np.testing.assert_array_equal(second, image)
+
+    # A different scale factor is a different entry.
+    cache.get_or_load(image_path, 0.5, load_fn)
+    assert len(calls) == 2
+    cache.flush()
+
+    # A new cache (e.g. the next run) reads the index back from disk.
+    reopened = pickle.loads(pickle.dumps(cache))
+    assert len(reopened) == 2
+    np.testing.assert_array_equal(reopened.get_or_load(image_path, 1.0, load_fn), image)
+    assert len(calls) == 2
+
+
+def test_image_cache_invalidated_on_modification(tmp_path):
+    image_path = tmp_path / "image.png"
+    Image.fromarray(np.zeros((4, 4, 3), dtype=np.uint8)).save(image_path)
+    cache = DecodedImageCache(tmp_path / "cache")
+    cache.get_or_load(image_path, 1.0, _load)
+
+    Image.fromarray(np.full((4, 6, 3), 255, dtype=np.uint8)).save(image_path)
+    reloaded = cache.get_or_load(image_path, 1.0, _load)
+    assert reloaded.shape == (4, 6, 3)
+    assert (reloaded == 255).all()
@@ -0,0 +1,118 @@
+"""
+Test the pixel samplers
+"""
+
+import pytest
+import torch
+
+from nerfstudio.data.pixel_samplers import ImportancePixelSamplerConfig, PixelSamplerConfig
+from nerfstudio.data.utils.pixel_sampling_utils import divide_rays_per_image
+
+
+def _get_image_list_batch(with_mask: bool = True) -> dict:
+    sizes = [(12, 20), (30, 8), (16, 16)]
+    batch = {
+        "image_idx": torch.tensor([5, 2, 7]),
+        "image": [torch.rand(h, w, 3) for h, w in sizes],
+        "depth_image": [torch.rand(h, w, 1) for h, w in sizes],
+    }
+    if with_mask:
+        batch["mask"] = [torch.rand(h, w, 1) > 0.5 for h, w in sizes]
+    return batch
+
+
+def test_collate_packed_image_batch_list():
+    """Test that rays are drawn from every image of a list, inside the masks, without touching the images"""
+    for with_mask in (True, False):
+        batch = _get_image_list_batch(with_mask)
+        images = list(batch["image"])
+        image_copies = [image.clone() for image in images]
+        sampler = PixelSamplerConfig(num_rays_per_batch=60).setup()
+        for _ in range(2):
+            pixel_batch = sampler.sample(batch)
+            assert pixel_batch["image"].shape == (60, 3)
+            assert pixel_batch["depth_image"].shape == (60, 1)
+            camera_indices, y, x = pixel_batch["indices"].unbind(-1)
+            local_indices = torch.tensor([batch["image_idx"].tolist().index(c) for c in camera_indices.tolist()])
+            assert torch.bincount(local_indices).tolist() == divide_rays_per_image(60, 3)
+            for ray, i in enumerate(local_indices.tolist()):
+                assert torch.equal(pixel_batch["image"][ray], batch["image"][i][y[ray], x[ray]])
+                assert torch.equal(pixel_batch["depth_image"][ray], batch["depth_image"][i][y[ray], x[ray]])
+                if with_mask:
+                    assert batch["mask"][i][y[ray], x[ray], 0]
+        # The images of the caller are neither replaced nor modified.
+        for image, original, copy in zip(batch["image"], images, image_copies):
+            assert image is original
+            assert torch.equal(image, copy)
+
+
+def test_sample_valid_pixels():
+    """Test that masked sampling draws with replacement inside the mask and follows changes to the mask"""
+    mask = torch.zeros(2, 6, 5, 1, dtype=torch.bool)
+    mask[1, 2, 3] = True
+    mask[0, 4, 1] = True
+    sampler = PixelSamplerConfig(num_rays_per_batch=64).setup()
+    indices = sampler.sample_valid_pixels(64, mask)
+    assert indices.shape == (64, 3)
+    assert {tuple(index) for index in indices.tolist()} == {(1, 2, 3), (0, 4, 1)}
+
+    # A view of the same mask reuses the cached indices.
+    valid_pixels = sampler.get_valid_pixels(mask)
+    assert sampler.get_valid_pixels(mask[:]) is valid_pixels
+
+    # Changing the mask in place invalidates them.
+    mask[0, 4, 1] = False
+    indices = sampler.sample_valid_pixels(16, mask)
+    assert {tuple(index) for index in indices.tolist()} == {(1, 2, 3)}
+
+    # A new mask is never served the indices of a freed one.
+    for _ in range(3):
+        other_mask = torch.zeros(2, 6, 5, 1, dtype=torch.bool)
+        other_mask[0, 0, 0] = True
+        assert sampler.sample_valid_pixels(8, other_mask).tolist() == [[0, 0, 0]] * 8
+        del other_mask
+
+    with pytest.raises(ValueError):
+        sampler.sample_valid_pixels(8, torch.zeros(1, 4, 4, 1, dtype=torch.bool))
+
+
+def test_importance_pixel_sampler():
+    """Test the tile CDF sampling, the importance weights and the error updates of the importance sampler"""
+    torch.manual_seed(0)
+    batch = {"image_idx": torch.tensor([3, 1]), "image": torch.rand(2, 20, 24, 3)}
+    sampler = ImportancePixelSamplerConfig(num_rays_per_batch=4096, tile_size=8, uniform_fraction=0.0).setup()
+    sampler.sample(batch)
+    assert sampler.tile_errors is not None and sampler.tile_errors.shape == (4, 3, 3)
+
+    # All of the error in a single (cropped) tile, every ray is drawn from it.
+    sampler.tile_errors.fill_(0.0)
+    sampler.tile_errors[1, 2, 1] = 1.0
+    sampler._stale_cameras.fill_(True)
+    pixel_batch = sampler.sample(batch)
+    camera_indices, y, x = pixel_batch["indices"].unbind(-1)
+    assert (camera_indices == 1).all()
+    assert ((y >= 16) & (y < 20) & (x >= 8) & (x < 16)).all()
+    assert torch.allclose(pixel_batch["importance_weights"], torch.full((4096, 1), 4 * 8 / (2 * 20 * 24)))
+
+    # With a uniform floor, the weighted average of the sampled pixels is an unbiased estimate of their mean.
+    sampler.config.uniform_fraction = 0.2
+    sampler.config.num_rays_per_batch = sampler.num_rays_per_batch = 2**16
+    pixel_batch = sampler.sample(batch)
+    assert (pixel_batch["importance_weights"] <= 1 / 0.2 + 1e-4).all()
+    estimate = (pixel_batch["importance_weights"] * pixel_batch["image"]).mean(dim=0)
+    assert torch.allclose(estimate, batch["image"].mean(dim=(0, 1, 2)), atol=0.02)
+
+    # Updates only refresh the CDFs of the cameras they touch, and match a full rebuild.
+    tile_cdfs = sampler._tile_cdfs.clone()
+    ray_batch = {key: value[:8] for key, value in pixel_batch.items()}
+    ray_batch["indices"][:, 0] = 3
+    sampler.update(ray_batch, {"rgb": ray_batch["image"] + 0.5})
+    assert sampler._stale_cameras.tolist() == [False, False, False, True]
+    sampler.sample(batch)
+    num_tiles = 3 * 3
+    assert torch.equal(sampler._tile_cdfs[: 3 * num_tiles], tile_cdfs[: 3 * num_tiles])
+    assert not torch.equal(sampler._tile_cdfs[3 * num_tiles :], tile_cdfs[3 * num_tiles :])
+    updated_cdfs = sampler._tile_cdfs.clone()
+    sampler._stale_cameras.fill_(True)
+    sampler._refresh_tile_cdfs()
+    assert torch.allclose(sampler._tile_cdfs, updated_cdfs)
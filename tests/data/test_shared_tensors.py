@@ -0,0 +1,55 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import torch
+
+from nerfstudio.data.utils.shared_tensors import (
+    attach_tensors,
+    create_shared_tensor,
+    remove_stale_shared_memory_dirs,
+    share_tensors,
+)
+
+
+def test_share_and_attach_tensors(tmp_path):
+    data = {
+        "image": torch.rand(2, 4, 5, 3),
+        "mask": torch.rand(2, 4, 5, 1) > 0.5,
+        "image_idx": torch.tensor([0, 1]),
+        "images": [torch.rand(3, 3, 3), torch.rand(2, 2, 3)],
+        "name": "not a tensor",
+    }
+    shared = pickle.loads(pickle.dumps(share_tensors(data, tmp_path)))
+    attached = attach_tensors(shared)
+    for key in ("image", "mask", "image_idx"):
+        assert attached[key].dtype == data[key].dtype
+        assert torch.equal(attached[key], data[key])
+    for image, expected in zip(attached["images"], data["images"]):
+        assert torch.equal(image, expected)
+    assert attached["name"] == "not a tensor"
+
+
+def test_writable_shared_tensor(tmp_path):
+    handle = create_shared_tensor(tmp_path, (4, 3), torch.float32)
+    writer = handle.attach(writable=True)
+    writer[1] = 2.0
+    reader = handle.attach()
+    assert torch.equal(reader[1], torch.full((3,), 2.0))
+    # Copy-on-write views never write back to the file.
+    reader[0] = 1.0
+    assert torch.equal(handle.attach()[0], torch.zeros(3))
+
+
+def test_remove_stale_shared_memory_dirs(tmp_path):
+    dead_process = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead_process.wait()
+    stale = tmp_path / f"nerfstudio_{dead_process.pid}_abc"
+    live = tmp_path / f"nerfstudio_{os.getpid()}_abc"
+    other = tmp_path / "nerfstudio_other"
+    for directory in (stale, live, other):
+        directory.mkdir()
+    remove_stale_shared_memory_dirs(tmp_path)
+    assert not stale.exists()
+    assert live.exists() and other.exists()
@@ -3,13 +3,18 @@ Nerfstudio dataparser
 """
 
 import json
+import os
 from pathlib import Path
 
 import numpy as np
 import pytest
+import torch
 from PIL import Image
 from pytest import fixture
 
+from nerfstudio.data.dataparsers.nerfstudio_dataparser import Nerfstudio, NerfstudioDataParserConfig
+from nerfstudio.data.utils.depth_cache import PseudoDepthCache, get_pseudo_depth_cache_dir
+
 
 @fixture
 def mocked_dataset(tmp_path: Path):
@@ -93,3 +98,43 @@ def test_nerfstudio_dataparser_split_filelist(mocked_dataset):
         mocked_dataset / "images_4/img_4.png",
         mocked_dataset / "images_4/img_5.png",
     ]
+
+
+def test_nerfstudio_dataparser_outputs_cache(mocked_dataset, tmp_path_factory, monkeypatch):
+    """Tests that outputs are loaded from the cache until the transforms change"""
+    config = NerfstudioDataParserConfig(
+        data=mocked_dataset,
+        downscale_factor=4,
+        orientation_method="none",
+        center_method="none",
+        auto_scale_poses=False,
+        outputs_cache_dir=tmp_path_factory.mktemp("cache"),
+    )
+    parser: Nerfstudio = config.setup()
+    out = parser.get_dataparser_outputs("train")
+    assert len(list(config.outputs_cache_dir.iterdir())) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The dataset should not be parsed again")
+
+    monkeypatch.setattr(Nerfstudio, "_generate_dataparser_outputs", fail)
+    cached_parser: Nerfstudio = config.setup()
+    cached_out = cached_parser.get_dataparser_outputs("train")
+    assert cached_out.image_filenames == out.image_filenames
+    assert cached_parser.downscale_factor == 4
+    assert (cached_out.cameras.camera_to_worlds == out.cameras.camera_to_worlds).all()
+
+    # Caches written inside the dataset, e.g. pseudodepth, don't invalidate the snapshot.
+    depth_cache = PseudoDepthCache(
+        get_pseudo_depth_cache_dir(mocked_dataset / "images_4" / "pseudodepth", out.image_filenames, 1.0),
+        image_shapes=[(150, 100)] * len(out.image_filenames),
+    )
+    depth_cache.generate(lambda idx: torch.zeros(150, 100, 3), lambda image: torch.ones(150, 100, 1))
+    assert depth_cache.is_complete()
+    config.setup().get_dataparser_outputs("train")
+
+    # Touching the transforms invalidates the snapshot.
+    stat = os.stat(mocked_dataset / "transforms.json")
+    os.utime(mocked_dataset / "transforms.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(AssertionError):
+        config.setup().get_dataparser_outputs("train")
@@ -0,0 +1,54 @@
+"""
+Test early ray termination
+"""
+
+import torch
+
+from nerfstudio.cameras.rays import Frustums, RaySamples
+from nerfstudio.field_components.field_heads import FieldHeadNames
+from nerfstudio.model_components.early_termination import forward_field_with_early_termination
+from nerfstudio.model_components.renderers import RGBRenderer
+
+
+class _Field(torch.nn.Module):
+    """Opaque ball of radius 0.5, counting the evaluated samples."""
+
+    def __init__(self):
+        super().__init__()
+        self.num_evaluated = 0
+
+    def forward(self, ray_samples: RaySamples):
+        positions = ray_samples.frustums.get_positions()
+        self.num_evaluated += positions[..., 0].numel()
+        density = 100.0 * (positions.norm(dim=-1, keepdim=True) < 0.5).float()
+        return {FieldHeadNames.DENSITY: density, FieldHeadNames.RGB: torch.sigmoid(positions)}
+
+
+def test_early_termination():
+    """Test that saturated rays stop being evaluated and colors stay within the tolerance"""
+    num_rays, num_samples = 64, 64
+    directions = torch.nn.functional.normalize(torch.randn(num_rays, 1, 3) * 0.2 + torch.tensor([1.0, 0, 0]), dim=-1)
+    bins = torch.linspace(0, 4, num_samples + 1)
+    shape = (num_rays, num_samples, 1)
+    ray_samples = RaySamples(
+        frustums=Frustums(
+            origins=torch.tensor([-2.0, 0.0, 0.0]).expand(num_rays, num_samples, 3),
+            directions=directions.expand(-1, num_samples, 3),
+            starts=bins[:-1, None].expand(shape),
+            ends=bins[1:, None].expand(shape),
+            pixel_area=torch.ones(shape),
+        ),
+        deltas=(bins[1:] - bins[:-1])[:, None].expand(shape),
+    )
+    renderer = RGBRenderer(background_color="last_sample")
+
+    field = _Field()
+    expected = field(ray_samples)
+    expected_rgb = renderer(expected[FieldHeadNames.RGB], ray_samples.get_weights(expected[FieldHeadNames.DENSITY]))
+
+    tolerance = 1e-3
+    field = _Field()
+    outputs = forward_field_with_early_termination(field, ray_samples, tolerance, num_samples_per_segment=8)
+    rgb = renderer(outputs[FieldHeadNames.RGB], ray_samples.get_weights(outputs[FieldHeadNames.DENSITY]))
+    assert (rgb - expected_rgb).abs().max() <= tolerance
+    assert field.num_evaluated < 0.75 * num_rays * num_samples
@@ -0,0 +1,76 @@
+"""
+Test the occupancy grid
+"""
+
+import torch
+
+from nerfstudio.cameras.rays import Frustums, RaySamples
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+from nerfstudio.model_components.field_evaluation import forward_field_masked
+from nerfstudio.model_components.occupancy_grid import OccupancyGrid
+
+
+def _density_fn(positions: torch.Tensor) -> torch.Tensor:
+    """Unit density in a ball of radius 0.5."""
+    return (positions.norm(dim=-1, keepdim=True) < 0.5).float()
+
+
+class _Field(torch.nn.Module):
+    def forward(self, ray_samples: RaySamples, compute_normals: bool = False):
+        positions = ray_samples.frustums.get_positions()
+        return {"density": _density_fn(positions), "rgb": torch.sigmoid(positions)}
+
+
+def test_occupancy_grid():
+    """Test distilling the grid and culling the samples in empty cells"""
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    grid = OccupancyGrid(aabb, resolution=32, spatial_distortion=SceneContraction(order=float("inf")))
+
+    positions = torch.randn(1000, 3) * 3
+    round_trip = grid.get_world_positions(grid.get_normalized_positions(positions))
+    assert torch.allclose(round_trip, positions, rtol=1e-4, atol=1e-4)
+
+    grid.distill([_density_fn], density_threshold=0.5)
+    assert grid.distilled
+    assert 0 < grid.occupied_fraction < 0.1
+    # Occupied cells cover the ball, and empty space far from it is culled.
+    inside = torch.rand(1000, 3) - 0.5
+    inside = inside * 0.49 / inside.norm(dim=-1, keepdim=True).clamp(min=0.49)
+    assert grid.get_occupied(inside).all()
+    assert not grid.get_occupied(torch.tensor([[0.9, 0.9, 0.9], [5.0, 0.0, 0.0]])).any()
+
+    masked_density_fn = grid.get_masked_density_fn(_density_fn)
+    assert torch.equal(masked_density_fn(positions), _density_fn(positions))
+
+    num_rays, num_samples = 16, 32
+    starts = torch.linspace(0, 4, num_samples + 1)
+    shape = (num_rays, num_samples, 1)
+    ray_samples = RaySamples(
+        frustums=Frustums(
+            origins=torch.tensor([-2.0, 0.0, 0.0]).expand(num_rays, num_samples, 3),
+            directions=torch.nn.functional.normalize(
+                torch.randn(num_rays, 1, 3) * 0.3 + torch.tensor([1.0, 0.0, 0.0]), dim=-1
+            ).expand(-1, num_samples, 3),
+            starts=starts[:-1, None].expand(shape),
+            ends=starts[1:, None].expand(shape),
+            pixel_area=torch.ones(shape),
+        ),
+        deltas=(starts[1:] - starts[:-1])[:, None].expand(shape),
+    )
+    mask = grid.get_occupied(ray_samples.frustums.get_positions())
+    assert not mask.all()
+    field_outputs = forward_field_masked(_Field(), ray_samples, mask)
+    expected = _Field()(ray_samples)
+    weights = ray_samples.get_weights(field_outputs["density"])
+    assert torch.allclose(weights, ray_samples.get_weights(expected["density"]))
+    assert torch.allclose(weights * field_outputs["rgb"], weights * expected["rgb"])
+    # Without samples to evaluate, every output is zero.
+    field_outputs = forward_field_masked(_Field(), ray_samples, torch.zeros_like(mask))
+    assert not field_outputs["density"].any() and not field_outputs["rgb"].any()
+    assert field_outputs["rgb"].shape == expected["rgb"].shape
+
+    # The grid is saved with the checkpoint.
+    restored = OccupancyGrid(aabb, resolution=32, spatial_distortion=SceneContraction(order=float("inf")))
+    restored.load_state_dict(grid.state_dict())
+    assert restored.distilled
+    assert torch.equal(restored.occupied, grid.occupied)
@@ -4,12 +4,16 @@ Test pipeline
 
 from pathlib import Path
 
+import numpy as np
+import pytest
 import torch
+from PIL import Image
 from torch import nn
 
 from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.data.datamanagers.base_datamanager import VanillaDataManagerConfig
 from nerfstudio.data.datasets.base_dataset import DataparserOutputs, InputDataset
+from nerfstudio.data.utils.dataloaders import FixedIndicesEvalDataloader
 from nerfstudio.pipelines.base_pipeline import Model, ModelConfig, VanillaPipeline, VanillaPipelineConfig
 
 
@@ -88,3 +92,135 @@ def test_load_state_dict():
     pipeline.load_pipeline(ddp_state_dict, 0)
     assert was_called
     assert getattr(pipeline.model, "param")[0].item() == 4
+
+
+class MockedRayModel(Model):
+    """Mocked ray-based model, whose outputs only depend on the rays"""
+
+    def get_outputs(self, ray_bundle):
+        return {
+            "rgb": torch.sigmoid(ray_bundle.directions + ray_bundle.origins),
+            "depth": ray_bundle.directions[..., 2:],
+        }
+
+    def get_image_metrics_and_images(self, outputs, batch):
+        rgb = outputs["rgb"]
+        assert rgb.shape == batch["image"].shape
+        return {"mse": float(torch.mean((rgb - batch["image"]) ** 2))}, {"img": rgb}
+
+
+def test_get_outputs_for_cameras(tmp_path, monkeypatch):
+    """Test that cameras of different sizes rendered together match cameras rendered one at a time"""
+    sizes = [(5, 7), (4, 3), (6, 6)]
+    c2w = torch.eye(4)[None, :3, :].repeat(len(sizes), 1, 1)
+    c2w[:, :3, 3] = torch.rand(len(sizes), 3)
+    cameras = Cameras(
+        camera_to_worlds=c2w,
+        fx=torch.tensor([[4.0], [3.0], [5.0]]),
+        fy=torch.tensor([[4.0], [3.0], [5.0]]),
+        cx=torch.tensor([[w / 2] for _, w in sizes]),
+        cy=torch.tensor([[h / 2] for h, _ in sizes]),
+        width=torch.tensor([[w] for _, w in sizes]),
+        height=torch.tensor([[h] for h, _ in sizes]),
+    )
+    config = VanillaPipelineConfig(
+        datamanager=VanillaDataManagerConfig(_target=MockedDataManager),
+        model=ModelConfig(_target=MockedRayModel, enable_collider=False, eval_num_rays_per_chunk=8),
+    )
+    pipeline = VanillaPipeline(config, "cpu")
+    model = pipeline.model
+    outputs_list = model.get_outputs_for_cameras(cameras)
+    assert len(outputs_list) == len(sizes)
+    for i, outputs in enumerate(outputs_list):
+        expected = model.get_outputs_for_camera(cameras[i : i + 1])
+        assert outputs.keys() == expected.keys()
+        for name, output in outputs.items():
+            assert output.shape == expected[name].shape == sizes[i] + output.shape[-1:]
+            assert torch.allclose(output, expected[name])
+
+    # Eval renders the images in batches, with the same metrics.
+    image_filenames = []
+    for i, (height, width) in enumerate(sizes):
+        image_filenames.append(tmp_path / f"image_{i}.png")
+        Image.fromarray(np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)).save(image_filenames[-1])
+    dataset = InputDataset(DataparserOutputs(image_filenames=image_filenames, cameras=cameras))
+    batch_sizes = []
+    get_outputs_for_cameras = model.get_outputs_for_cameras
+
+    def counted_get_outputs_for_cameras(cameras):
+        batch_sizes.append(len(cameras))
+        return get_outputs_for_cameras(cameras)
+
+    monkeypatch.setattr(model, "get_outputs_for_cameras", counted_get_outputs_for_cameras)
+    metrics = [
+        pipeline.get_average_image_metrics(FixedIndicesEvalDataloader(dataset), "eval", num_images_per_batch=n)
+        for n in (1, 2)
+    ]
+    assert batch_sizes == [2]
+    assert metrics[0]["mse"] == pytest.approx(metrics[1]["mse"])
+
+
+def test_get_average_image_metrics_output_path(tmp_path):
+    """Test that eval saves the rendered images, with fewer writers than images"""
+    num_images, height, width = 6, 4, 5
+    cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3, :].repeat(num_images, 1, 1),
+        fx=4.0,
+        fy=4.0,
+        cx=width / 2,
+        cy=height / 2,
+        width=width,
+        height=height,
+    )
+    image_filenames = []
+    for i in range(num_images):
+        image_filenames.append(tmp_path / f"image_{i}.png")
+        Image.fromarray(np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)).save(image_filenames[-1])
+    dataset = InputDataset(DataparserOutputs(image_filenames=image_filenames, cameras=cameras))
+    config = VanillaPipelineConfig(
+        datamanager=VanillaDataManagerConfig(_target=MockedDataManager),
+        model=ModelConfig(_target=MockedRayModel, enable_collider=False, eval_num_rays_per_chunk=8),
+    )
+    pipeline = VanillaPipeline(config, "cpu")
+    output_path = tmp_path / "renders"
+    pipeline.get_average_image_metrics(
+        FixedIndicesEvalDataloader(dataset), "eval", output_path=output_path, num_writers=1
+    )
+
+    expected = pipeline.model.get_outputs_for_camera(cameras[0:1])["rgb"]
+    for i in range(num_images):
+        saved = np.array(Image.open(output_path / f"eval_img_{i:04d}.png"))
+        assert saved.shape == (height, width, 3)
+        assert np.abs(saved / 255.0 - expected.numpy()).max() <= 1 / 255
+
+
+def test_get_outputs_for_camera_ray_bundle():
+    """Test that chunked outputs written in place match concatenated chunk outputs, and that chunks must agree"""
+    cameras = Cameras(camera_to_worlds=torch.eye(4)[None, :3, :], fx=4.0, fy=4.0, cx=3.5, cy=2.5, width=7, height=5)
+    config = VanillaPipelineConfig(
+        datamanager=VanillaDataManagerConfig(_target=MockedDataManager),
+        model=ModelConfig(_target=MockedRayModel, enable_collider=False, eval_num_rays_per_chunk=8),
+    )
+    model = VanillaPipeline(config, "cpu").model
+    ray_bundle = cameras.generate_rays(camera_indices=0, keep_shape=True)
+    outputs = model.get_outputs_for_camera_ray_bundle(ray_bundle)
+
+    # 35 rays, the last chunk has 3.
+    flat_ray_bundle = ray_bundle.flatten()
+    chunk_outputs = [model(flat_ray_bundle[start : start + 8]) for start in range(0, 35, 8)]
+    assert outputs.keys() == chunk_outputs[0].keys()
+    for name, output in outputs.items():
+        expected = torch.cat([chunk[name] for chunk in chunk_outputs]).view(5, 7, -1)
+        assert torch.equal(output, expected)
+
+    get_outputs = model.get_outputs
+
+    def get_outputs_missing_depth(ray_bundle):
+        chunk_outputs = get_outputs(ray_bundle)
+        if len(ray_bundle) < 8:
+            del chunk_outputs["depth"]
+        return chunk_outputs
+
+    model.get_outputs = get_outputs_missing_depth
+    with pytest.raises(ValueError):
+        model.get_outputs_for_camera_ray_bundle(ray_bundle)
@@ -8,6 +8,7 @@ from scipy.spatial.transform import Rotation
 
 # TODO(1480) use pycolmap instead of colmap_parsing_utils
 # import pycolmap
+from nerfstudio.data.utils import colmap_parsing_utils as colmap_utils
 from nerfstudio.data.utils.colmap_parsing_utils import qvec2rotmat
 
 
@@ -61,3 +62,68 @@ def test_scalar_first_scalar_last_quaternions():
     # R = pycolmap.qvec_to_rotmat(wxyz)
     R = qvec2rotmat(wxyz)
     assert np.allclose(R, R_expected)
+
+
+def test_read_points3D_binary_columns(tmp_path):
+    """The columnar reader should match the per-point dict API."""
+    rng = np.random.default_rng(0)
+    points3D = {}
+    for point3D_id in [1, 5, 6]:
+        track_length = int(rng.integers(0, 4))
+        points3D[point3D_id] = colmap_utils.Point3D(
+            id=point3D_id,
+            xyz=rng.normal(size=3),
+            rgb=rng.integers(0, 255, size=3),
+            error=rng.random(),
+            image_ids=rng.integers(1, 10, size=track_length),
+            point2D_idxs=rng.integers(0, 100, size=track_length),
+        )
+    colmap_utils.write_points3D_binary(points3D, tmp_path / "points3D.bin")
+
+    columns = colmap_utils.read_points3D_binary_columns(tmp_path / "points3D.bin")
+    assert columns.ids.tolist() == [1, 5, 6]
+    assert columns.track_offsets[-1] == sum(len(p.image_ids) for p in points3D.values())
+    read_points3D = colmap_utils.read_points3D_binary(tmp_path / "points3D.bin")
+    for point3D_id, point3D in points3D.items():
+        read_point3D = read_points3D[point3D_id]
+        assert np.allclose(read_point3D.xyz, point3D.xyz)
+        assert np.array_equal(read_point3D.rgb, point3D.rgb)
+        assert np.isclose(read_point3D.error, point3D.error)
+        assert np.array_equal(read_point3D.image_ids, point3D.image_ids)
+        assert np.array_equal(read_point3D.point2D_idxs, point3D.point2D_idxs)
+
+
+def test_read_images_binary_columns(tmp_path):
+    """The columnar images reader should match the per-image dict API."""
+    rng = np.random.default_rng(0)
+    images = {}
+    for image_id, num_points2D in [(2, 3), (7, 0), (3, 5)]:
+        images[image_id] = colmap_utils.Image(
+            id=image_id,
+            qvec=rng.normal(size=4),
+            tvec=rng.normal(size=3),
+            camera_id=int(rng.integers(1, 4)),
+            name=f"frame_{image_id:05d}.png",
+            xys=rng.random((num_points2D, 2)) * 100,
+            point3D_ids=rng.integers(-1, 50, size=num_points2D),
+        )
+    colmap_utils.write_images_binary(images, tmp_path / "images.bin")
+
+    columns = colmap_utils.read_images_binary_columns(tmp_path / "images.bin")
+    expected = colmap_utils.images_to_image_columns(images)
+    assert columns.ids.tolist() == [2, 7, 3]
+    assert columns.names == expected.names
+    assert np.array_equal(columns.camera_ids, expected.camera_ids)
+    assert np.array_equal(columns.points2D_offsets, expected.points2D_offsets)
+    assert np.allclose(columns.qvecs, expected.qvecs)
+    assert np.allclose(columns.tvecs, expected.tvecs)
+    assert np.allclose(columns.xys, expected.xys)
+    assert np.array_equal(columns.point3D_ids, expected.point3D_ids)
+    read_images = colmap_utils.read_images_binary(tmp_path / "images.bin")
+    for image_id, image in images.items():
+        read_image = read_images[image_id]
+        assert read_image.name == image.name
+        assert read_image.camera_id == image.camera_id
+        assert np.allclose(read_image.qvec, image.qvec)
+        assert np.allclose(read_image.xys, image.xys)
+        assert np.array_equal(read_image.point3D_ids, image.point3D_ids)
@@ -19,6 +19,7 @@ from nerfstudio.data.utils.colmap_parsing_utils import (
     write_images_binary,
     write_points3D_binary,
 )
+from nerfstudio.process_data import process_data_utils
 from nerfstudio.process_data.images_to_nerfstudio_dataset import ImagesToNerfstudioDataset
 
 
@@ -209,3 +210,24 @@ def test_process_images_recursively_skip_colmap(tmp_path: Path):
     )
     dataparser_poses = np.linalg.inv(dataparser_poses)
     np.testing.assert_allclose(original_poses, dataparser_poses, rtol=0, atol=1e-5)
+
+
+def test_downscale_images(tmp_path: Path):
+    """
+    Test downscaling writes every level once and skips up-to-date outputs.
+    """
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    for i in range(3):
+        Image.fromarray(np.random.randint(0, 255, (61, 80, 3), dtype=np.uint8)).save(image_dir / f"frame_{i}.jpg")
+
+    process_data_utils.downscale_images(image_dir, num_downscales=2)
+    for downscale_factor in [2, 4]:
+        for i in range(3):
+            image = Image.open(tmp_path / f"images_{downscale_factor}" / f"frame_{i}.jpg")
+            assert image.size == (80 // downscale_factor, 61 // downscale_factor)
+
+    output_path = tmp_path / "images_4" / "frame_0.jpg"
+    mtime = output_path.stat().st_mtime_ns
+    process_data_utils.downscale_images(image_dir, num_downscales=2)
+    assert output_path.stat().st_mtime_ns == mtime
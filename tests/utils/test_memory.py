@@ -0,0 +1,39 @@
+"""
+Test memory measurements and chunk size tuning
+"""
+
+import torch
+
+from nerfstudio.utils.memory import ChunkSizeTuner, PeakMemoryMonitor
+
+
+def _render(num_rays: int) -> torch.Tensor:
+    features = torch.rand(num_rays, 64) @ torch.rand(64, 256)
+    return torch.relu(features).sum(-1)
+
+
+def test_chunk_size_tuner(tmp_path):
+    """Test that the chunk size converges to the memory budget and is restored from the cache"""
+    with PeakMemoryMonitor("cpu") as monitor:
+        _render(1000)
+    bytes_per_ray = monitor.peak_bytes / 1000
+    assert bytes_per_ray >= 256 * 4
+
+    memory_budget = 20000 * bytes_per_ray
+    tuner = ChunkSizeTuner(memory_budget, num_rays_per_chunk=1024)
+    tuner.set_cache(tmp_path / "eval_chunk_sizes.json", "cpu")
+    sizes = []
+    while tuner.is_tuning:
+        num_rays = tuner.num_rays_per_chunk
+        sizes.append(num_rays)
+        with PeakMemoryMonitor("cpu") as monitor:
+            _render(num_rays)
+        tuner.update(num_rays, monitor.peak_bytes)
+    # Geometric growth, then the largest chunk within the budget.
+    assert sizes[:3] == [1024, 2048, 4096]
+    assert 0.9 * 20000 <= tuner.num_rays_per_chunk <= 20000
+
+    restored = ChunkSizeTuner(memory_budget, num_rays_per_chunk=1024)
+    restored.set_cache(tmp_path / "eval_chunk_sizes.json", "cpu")
+    assert not restored.is_tuning
+    assert restored.num_rays_per_chunk == tuner.num_rays_per_chunk
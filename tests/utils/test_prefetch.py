@@ -0,0 +1,16 @@
+import pytest
+
+from nerfstudio.utils.misc import prefetch
+
+
+def test_prefetch():
+    assert list(prefetch(range(10), num_prefetch=3)) == list(range(10))
+
+    def failing():
+        yield 1
+        raise ValueError("failed")
+
+    items = prefetch(failing())
+    assert next(items) == 1
+    with pytest.raises(ValueError):
+        next(items)
@@ -8,6 +8,7 @@ from typing import Generic, Optional, TypeVar
 import pytest
 import torch
 
+from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.utils.tensor_dataclass import TensorDataclass
 
 
@@ -186,6 +187,18 @@ def test_non_tensor():
     assert DummyTensorDataclass(a=torch.ones((3, 10)), b={"k": 2}, c=None).b == {"k": 2}  # type: ignore
 
 
+def test_custom_dimensions_ops():
+    """Test that operations keep the custom dimensions and the other attributes of instances"""
+    c2w = torch.eye(4)[None, :3, :].repeat(4, 1, 1)
+    cameras = Cameras(camera_to_worlds=c2w, fx=1.0, fy=1.0, cx=1.0, cy=1.0, width=2, height=2)
+    for result in (cameras[1:3], cameras[torch.tensor([0, 2])], cameras.reshape((2, 2))[0], cameras.to("cpu")):
+        assert result.camera_to_worlds.shape == result.shape + (3, 4)
+        assert result._field_custom_dimensions == {"camera_to_worlds": 2}
+        assert isinstance(result, Cameras)
+    assert cameras.reshape((2, 2)).shape == (2, 2)
+    assert cameras.to("cpu", non_blocking=True).fx.shape == (4, 1)
+
+
 if __name__ == "__main__":
     test_init()
     test_broadcasting()